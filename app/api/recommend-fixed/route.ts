@@ -1,9 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { Movie, RecommendationRequest, RecommendationResponse } from '@/lib/types'
-import { exec } from 'child_process'
-import { promisify } from 'util'
-
-const execAsync = promisify(exec)
+import { runRecommendation } from '@/lib/recommendationWorker'
 
 export async function POST(request: NextRequest) {
   try {
@@ -21,29 +18,15 @@ export async function POST(request: NextRequest) {
     console.log(`📝 Sinopse: ${synopsis.substring(0, 100)}...`)
 
     try {
-      // Executar modelo Python diretamente
-      const pythonCommand = `python3 lib/run_recommendation.py "${JSON.stringify({
+      // Executar modelo Python no worker persistente
+      const result = await runRecommendation({
         synopsis,
         method,
         year: year || 2000,
         rating: rating || 8.0,
         genre: genre || 'Drama'
-      })}"`
-      
-      console.log('🐍 Executando comando Python:', pythonCommand)
-      
-      const { stdout, stderr } = await execAsync(pythonCommand, {
-        cwd: process.cwd(),
-        timeout: 10000 // 10 segundos timeout
       })
       
-      console.log('🐍 Python stdout:', stdout)
-      console.log('🐍 Python stdout length:', stdout.length)
-      if (stderr) console.log('🐍 Python stderr:', stderr)
-      
-      // Parse do resultado
-      const result = JSON.parse(stdout)
-      
       if (result && result.recommendations && result.recommendations.length > 0) {
         console.log(`✅ Recomendações geradas: ${result.recommendations.length} filmes`)
         console.log(`🎯 Cluster: ${result.cluster}, Confiança: ${result.confidence?.toFixed(2)}`)
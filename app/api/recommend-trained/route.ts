@@ -1,6 +1,6 @@
 import { NextRequest, NextResponse } from 'next/server'
 import { Movie, RecommendationRequest, RecommendationResponse } from '@/lib/types'
-import { spawn } from 'child_process'
+import { runRecommendation } from '@/lib/recommendationWorker'
 import path from 'path'
 import fs from 'fs'
 
@@ -78,60 +78,21 @@ export async function POST(request: NextRequest) {
 }
 
 async function runPythonModel(synopsis: string, method: string, year?: number, rating?: number, genre?: string) {
-  return new Promise((resolve, reject) => {
-    console.log('🐍 Iniciando processo Python...')
-    console.log('🐍 Diretório:', process.cwd())
-    console.log('🐍 Script:', path.join(process.cwd(), 'lib', 'run_recommendation.py'))
-    
-    const pythonProcess = spawn('python3', [
-      path.join(process.cwd(), 'lib', 'run_recommendation.py'),
-      JSON.stringify({
-        synopsis,
-        method,
-        year: year || 2000,
-        rating: rating || 8.0,
-        genre: genre || 'Drama'
-      })
-    ], {
-      cwd: process.cwd()
-    })
-
-    let output = ''
-    let errorOutput = ''
-
-    pythonProcess.stdout.on('data', (data) => {
-      const dataStr = data.toString()
-      console.log('🐍 Python stdout:', dataStr)
-      output += dataStr
-    })
+  console.log('🐍 Enviando requisição ao worker Python...')
+
+  const result = await runRecommendation({
+    synopsis,
+    method,
+    year: year || 2000,
+    rating: rating || 8.0,
+    genre: genre || 'Drama'
+  })
 
-    pythonProcess.stderr.on('data', (data) => {
-      const dataStr = data.toString()
-      console.log('🐍 Python stderr:', dataStr)
-      errorOutput += dataStr
-    })
+  if (result && result.error && !result.recommendations) {
+    throw new Error(result.error)
+  }
 
-    pythonProcess.on('close', (code) => {
-      console.log('🐍 Python processo finalizado com código:', code)
-      console.log('🐍 Output completo:', output)
-      console.log('🐍 Error output:', errorOutput)
-      
-      if (code === 0) {
-        try {
-          const result = JSON.parse(output)
-          console.log('🐍 Resultado parseado:', result)
-          resolve(result)
-        } catch (parseError) {
-          console.error('❌ Erro ao fazer parse do resultado Python:', parseError)
-          console.error('❌ Output que causou erro:', output)
-          reject(parseError)
-        }
-      } else {
-        console.error('❌ Erro no processo Python:', errorOutput)
-        reject(new Error(errorOutput))
-      }
-    })
-  })
+  return result
 }
 
 function getFallbackRecommendations(synopsis: string, method: string): NextResponse {
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Servidor local que imita o endpoint de chat completions da OpenAI
+
+Responde a cada requisição após uma latência fixa, ecoando o início do
+prompt, para medir o enriquecimento de sinopses sem chamar a API real.
+GET /stats devolve a quantidade de requisições atendidas.
+
+Uso:
+    python3 benchmarks/mock_openai_server.py [--port 8765] [--latency-ms 50]
+
+Com o servidor no ar:
+    AISynopsisEnhancer(api_key='mock', base_url='http://127.0.0.1:8765/v1/chat/completions')
+"""
+
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    """Atende POST de chat completions e GET /stats"""
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.05
+    requests_served = 0
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request = json.loads(self.rfile.read(length) or b'{}')
+        prompt = request.get('messages', [{}])[0].get('content', '')
+
+        with MockOpenAIHandler.lock:
+            MockOpenAIHandler.requests_served += 1
+
+        time.sleep(self.latency)
+        self._send_json({
+            'model': request.get('model'),
+            'choices': [
+                {'message': {'role': 'assistant', 'content': f"Sinopse enriquecida: {prompt.strip()[:200]}"}}
+            ],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': 50}
+        })
+
+    def do_GET(self):
+        self._send_json({'requests': MockOpenAIHandler.requests_served})
+
+def serve(port=8765, latency_ms=50.0):
+    """Sobe o servidor (bloqueia até ser interrompido)"""
+    MockOpenAIHandler.latency = latency_ms / 1000.0
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockOpenAIHandler)
+    server.daemon_threads = True
+    print(f"🧪 Mock da API OpenAI em http://127.0.0.1:{server.server_port}/v1/chat/completions", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock local da API de chat completions')
+    parser.add_argument('--port', type=int, default=8765, help='Porta (0: escolhe uma livre)')
+    parser.add_argument('--latency-ms', type=float, default=50.0, help='Latência de cada resposta')
+    args = parser.parse_args()
+    serve(args.port, args.latency_ms)
+
+if __name__ == "__main__":
+    main()
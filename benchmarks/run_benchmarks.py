@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Benchmarks dos caminhos críticos de recomendação e enriquecimento
+
+Mede, e grava em JSON para comparar versões:
+    - cold start: import de ml_model_trained + load_models (e do artefato
+      compacto), em processos novos
+    - por tamanho de catálogo sintético: tempo de carga, latência de
+      get_recommendations (tfidf e all_features, com cache frio e quente),
+      vazão de get_recommendations_batch e latência de get_cluster_analysis
+    - enhance_dataset: enriquecimento local e via mock HTTP da API
+
+Uso:
+    python3 benchmarks/run_benchmarks.py [--sizes 100,10000,1000000] [--output resultados.json]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.append(str(ROOT_DIR / 'lib'))
+sys.path.append(str(Path(__file__).resolve().parent))
+
+from synthetic_catalog import generate_catalog
+
+# Tamanhos de catálogo medidos por padrão (1000000 é opcional: --sizes)
+DEFAULT_SIZES = [100, 10000]
+
+def summarize(samples):
+    """Estatísticas (ms) de uma lista de durações em segundos"""
+    if not samples:
+        return {'n': 0}
+
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100.0 * (len(ordered) - 1))))] * 1000
+
+    return {
+        'n': len(samples),
+        'mean_ms': sum(samples) / len(samples) * 1000,
+        'p50_ms': percentile(50),
+        'p95_ms': percentile(95),
+        'p99_ms': percentile(99),
+        'min_ms': ordered[0] * 1000,
+        'max_ms': ordered[-1] * 1000
+    }
+
+def current_rss_mb():
+    """Memória residente do processo (Linux), em MB"""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError):
+        return None
+
+def environment_info():
+    """Versões e commit, para comparar resultados entre execuções"""
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'timestamp': time.time()
+    }
+    for module in ('numpy', 'pandas', 'sklearn', 'scipy'):
+        try:
+            info[module] = __import__(module).__version__
+        except ImportError:
+            info[module] = None
+    try:
+        info['git_commit'] = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['git_commit'] = None
+    return info
+
+# Script executado em um processo novo para medir o cold start
+COLD_START_SCRIPT = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, 'lib')
+if sys.argv[1] == 'compact':
+    from compact_model import CompactRecommender
+    loaded = CompactRecommender().models_loaded
+else:
+    import ml_model_trained
+    loaded = ml_model_trained.movie_system.models_loaded
+print(json.dumps({'load_s': time.perf_counter() - start, 'loaded': loaded}))
+'''
+
+def bench_cold_start(repeat):
+    """Import + carga dos modelos em processos novos (full e compacto)"""
+    results = {}
+    for backend in ('full', 'compact'):
+        load_times, wall_times = [], []
+        loaded = True
+        for _ in range(repeat):
+            start = time.perf_counter()
+            completed = subprocess.run(
+                [sys.executable, '-c', COLD_START_SCRIPT, backend],
+                cwd=ROOT_DIR, capture_output=True, text=True
+            )
+            wall_times.append(time.perf_counter() - start)
+            try:
+                measured = json.loads(completed.stdout.strip().splitlines()[-1])
+                load_times.append(measured['load_s'])
+                loaded = loaded and measured['loaded']
+            except (IndexError, ValueError, KeyError):
+                loaded = False
+
+        results[backend] = {
+            'import_and_load': summarize(load_times),
+            'process_wall': summarize(wall_times),
+            'models_loaded': loaded
+        }
+    return results
+
+def sample_queries(system, n_queries, seed=42):
+    """
+    Sinopses de consulta distintas, derivadas das sinopses do catálogo
+    """
+    rng = random.Random(seed)
+    synopses = system.movies.texts_of('sinopse')
+    words = ' '.join(synopses[:500]).split()
+    return [
+        f"{rng.choice(synopses)} {' '.join(rng.sample(words, min(5, len(words))))}"
+        for _ in range(n_queries)
+    ]
+
+def time_queries(fn, queries):
+    """Duração (s) de fn(query) para cada consulta e quantidade de erros"""
+    samples, errors = [], 0
+    for query in queries:
+        start = time.perf_counter()
+        result = fn(query)
+        samples.append(time.perf_counter() - start)
+        if isinstance(result, dict) and result.get('error'):
+            errors += 1
+    return samples, errors
+
+def probe_error(system, method, query):
+    """Erro de uma consulta de teste com o método (None se respondeu)"""
+    result = system.get_recommendations(query, method=method)
+    return result.get('error') if isinstance(result, dict) else None
+
+def bench_recommender(system, n_queries, batch_size):
+    """
+    Latência e vazão das consultas em um sistema já carregado
+
+    Métodos cuja consulta de teste falha não são medidos (só falhariam):
+    suas seções ficam como {'skipped': erro}.
+    """
+    queries = sample_queries(system, n_queries)
+    results = {}
+
+    failing = {}
+    for method in ('tfidf', 'all_features', 'hybrid'):
+        error = probe_error(system, method, queries[0])
+        if error:
+            failing[method] = error
+
+    for method in ('tfidf', 'all_features', 'hybrid'):
+        if method in failing:
+            results[f'single_{method}'] = {'skipped': failing[method]}
+            continue
+
+        def query_fn(synopsis):
+            return system.get_recommendations(synopsis, method=method)
+
+        system.query_cache.clear()
+        cold, cold_errors = time_queries(query_fn, queries)
+        warm, _ = time_queries(query_fn, queries)
+        results[f'single_{method}'] = {
+            'cold': summarize(cold),
+            'warm': summarize(warm),
+            'errors': cold_errors
+        }
+
+    for method in ('tfidf', 'hybrid'):
+        if method in failing:
+            results[f'batch_{method}'] = {'skipped': failing[method]}
+            continue
+        batch = [{'synopsis': synopsis, 'method': method} for synopsis in queries[:batch_size]]
+        system.query_cache.clear()
+        start = time.perf_counter()
+        batch_results = system.get_recommendations_batch(batch)
+        elapsed = time.perf_counter() - start
+        results[f'batch_{method}'] = {
+            'batch_size': len(batch),
+            'seconds': elapsed,
+            'queries_per_s': len(batch) / elapsed if elapsed else None,
+            'errors': sum(1 for result in batch_results if result.get('error'))
+        }
+
+    clusters = sorted(system.cluster_index.keys())
+    samples = []
+    for _ in range(max(1, n_queries // max(1, len(clusters)))):
+        for method, cluster in clusters:
+            start = time.perf_counter()
+            system.get_cluster_analysis(cluster, method)
+            samples.append(time.perf_counter() - start)
+    results['cluster_analysis'] = summarize(samples)
+
+    return results
+
+def bench_catalog(n_rows, n_queries, batch_size):
+    """Carga e consultas em um catálogo sintético de n_rows filmes"""
+    from ml_model_trained import MovieRecommendationSystem
+
+    start = time.perf_counter()
+    path = generate_catalog(n_rows)
+    generate_s = time.perf_counter() - start
+
+    rss_before = current_rss_mb()
+    start = time.perf_counter()
+    system = MovieRecommendationSystem(dataset_path=str(path))
+    load_s = time.perf_counter() - start
+    rss_after = current_rss_mb()
+
+    result = {
+        'rows': n_rows,
+        'catalog_generate_s': generate_s,
+        'load_s': load_s,
+        'models_loaded': system.models_loaded,
+        'rss_delta_mb': rss_after - rss_before if rss_before is not None else None
+    }
+    if system.models_loaded:
+        result.update(bench_recommender(system, n_queries, batch_size))
+    return result
+
+def sample_movies(n_movies):
+    """Filmes do catálogo sintético no formato de enhance_dataset"""
+    import pandas as pd
+
+    df = pd.read_csv(generate_catalog(max(100, n_movies)), sep=';', nrows=n_movies)
+    return [
+        {'id': str(row.id), 'title_pt': row.title_pt, 'year': int(row.year),
+         'genre': row.genre, 'synopsis_pt': row.sinopse}
+        for row in df.itertuples(index=False)
+    ]
+
+@contextlib.contextmanager
+def mock_openai_server(latency_ms):
+    """Sobe o mock da API em um processo separado e devolve a URL"""
+    process = subprocess.Popen(
+        [sys.executable, str(Path(__file__).resolve().parent / 'mock_openai_server.py'),
+         '--port', '0', '--latency-ms', str(latency_ms)],
+        stdout=subprocess.PIPE, text=True
+    )
+    try:
+        url = process.stdout.readline().strip().split()[-1]
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+def bench_enhancement(n_local, n_http, latency_ms, workers):
+    """enhance_dataset local e contra o mock HTTP"""
+    import requests
+    from ai_synopsis_enhancer import AISynopsisEnhancer
+
+    results = {}
+
+    enhancer = AISynopsisEnhancer(cache_path=None)
+    enhancer.api_key = None
+    movies = sample_movies(n_local)
+    start = time.perf_counter()
+    enhancer.enhance_dataset(movies)
+    elapsed = time.perf_counter() - start
+    results['local'] = {
+        'movies': len(movies),
+        'seconds': elapsed,
+        'movies_per_s': len(movies) / elapsed if elapsed else None
+    }
+
+    with mock_openai_server(latency_ms) as url:
+        movies = sample_movies(n_http)
+        enhancer = AISynopsisEnhancer(api_key='mock', base_url=url, cache_path=None)
+        start = time.perf_counter()
+        enhanced = enhancer.enhance_dataset(movies, max_workers=workers, delay=0)
+        elapsed = time.perf_counter() - start
+
+        stats_url = url.split('/v1/')[0] + '/stats'
+        results['mock_http'] = {
+            'movies': len(movies),
+            'workers': workers,
+            'latency_ms': latency_ms,
+            'seconds': elapsed,
+            'movies_per_s': len(movies) / elapsed if elapsed else None,
+            'requests': requests.get(stats_url, timeout=5).json()['requests'],
+            'api_results': sum(1 for movie in enhanced if movie.get('synopsis_enhancement_method') == 'openai_api')
+        }
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmarks de recomendação e enriquecimento')
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES),
+                        help='Tamanhos dos catálogos sintéticos (ex.: 100,10000,1000000)')
+    parser.add_argument('--queries', type=int, default=200, help='Consultas por medição de latência')
+    parser.add_argument('--batch-size', type=int, default=256, help='Consultas no benchmark em lote')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetições do cold start')
+    parser.add_argument('--enhance-local', type=int, default=10000, help='Filmes no enriquecimento local')
+    parser.add_argument('--enhance-http', type=int, default=200, help='Filmes no enriquecimento via mock HTTP')
+    parser.add_argument('--mock-latency-ms', type=float, default=50.0, help='Latência do mock da API')
+    parser.add_argument('--workers', type=int, default=8, help='Chamadas simultâneas ao mock')
+    parser.add_argument('--skip', default='', help='Grupos a pular: cold_start,catalogs,enhancement')
+    parser.add_argument('--output', help='Arquivo JSON de saída (padrão: stdout)')
+    args = parser.parse_args()
+
+    os.chdir(ROOT_DIR)
+    skip = {name.strip() for name in args.skip.split(',') if name.strip()}
+    results = {'environment': environment_info()}
+
+    # Mensagens de progresso dos módulos não podem se misturar ao JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        if 'cold_start' not in skip:
+            print("⏱️ Cold start...")
+            results['cold_start'] = bench_cold_start(args.repeat)
+
+        if 'catalogs' not in skip:
+            results['catalogs'] = {}
+            for size in (int(size) for size in args.sizes.split(',') if size.strip()):
+                print(f"⏱️ Catálogo com {size} filmes...")
+                results['catalogs'][str(size)] = bench_catalog(size, args.queries, args.batch_size)
+
+        if 'enhancement' not in skip:
+            print("⏱️ Enriquecimento de sinopses...")
+            results['enhancement'] = bench_enhancement(
+                args.enhance_local, args.enhance_http, args.mock_latency_ms, args.workers
+            )
+
+    output = json.dumps(results, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(output + '\n')
+        print(f"💾 Resultados salvos em {args.output}", file=sys.stderr)
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
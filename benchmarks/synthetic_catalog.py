@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Catálogos sintéticos para benchmarks
+
+Gera catálogos de qualquer tamanho a partir de imdb_100plus_with_clusters.csv:
+cada linha copia um filme real (sinopse, gênero e clusters) com id/rank
+novos, título numerado e pequenas variações de ano e rating, mantendo o
+formato do CSV original (separador ';').
+
+Uso:
+    python3 benchmarks/synthetic_catalog.py 10000 [--output benchmarks/data/catalog_10000.csv]
+"""
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Catálogo real usado como base
+BASE_CATALOG = ROOT_DIR / 'imdb_100plus_with_clusters.csv'
+
+# Diretório padrão dos catálogos gerados
+DATA_DIR = Path(__file__).resolve().parent / 'data'
+
+def catalog_path(n_rows, data_dir=DATA_DIR):
+    """Caminho padrão do catálogo sintético com n_rows filmes"""
+    return Path(data_dir) / f'catalog_{n_rows}.csv'
+
+def generate_catalog(n_rows, output_path=None, base_path=BASE_CATALOG, seed=42):
+    """
+    Gera (ou reaproveita, se já existir) um catálogo sintético
+
+    Args:
+        n_rows: Quantidade de filmes
+        output_path: CSV de saída (padrão: benchmarks/data/catalog_<n>.csv)
+        base_path: Catálogo real usado como base
+        seed: Semente do gerador (catálogos reprodutíveis)
+
+    Returns:
+        Caminho do CSV gerado
+    """
+    output_path = Path(output_path or catalog_path(n_rows))
+    if output_path.exists():
+        return output_path
+
+    base = pd.read_csv(base_path, sep=';')
+    rng = np.random.default_rng(seed)
+
+    # Primeiras linhas = catálogo base na ordem original, depois amostras
+    sources = np.concatenate([
+        np.arange(min(n_rows, len(base))),
+        rng.integers(0, len(base), max(0, n_rows - len(base)))
+    ])
+    df = base.iloc[sources].reset_index(drop=True)
+
+    copies = np.arange(n_rows) // len(base)
+    df['id'] = np.arange(1, n_rows + 1)
+    df['rank'] = df['id']
+    suffix = pd.Series(np.where(copies > 0, ' #' + copies.astype(str), ''))
+    df['title_en'] = df['title_en'].astype(str) + suffix
+    df['title_pt'] = df['title_pt'].astype(str) + suffix
+
+    # Variações de ano e rating nas cópias
+    varied = copies > 0
+    df.loc[varied, 'year'] = np.clip(
+        df.loc[varied, 'year'] + rng.integers(-5, 6, varied.sum()), 1900, 2025
+    ).astype(float)
+    df.loc[varied, 'rating'] = np.round(np.clip(
+        df.loc[varied, 'rating'] + rng.normal(0, 0.2, varied.sum()), 1.0, 10.0
+    ), 2)
+
+    os.makedirs(output_path.parent, exist_ok=True)
+    tmp_path = output_path.with_suffix('.tmp')
+    df.to_csv(tmp_path, sep=';', index=False)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def main():
+    """Gera um catálogo sintético pela linha de comando"""
+    parser = argparse.ArgumentParser(description='Gera catálogos sintéticos para benchmarks')
+    parser.add_argument('n_rows', type=int, help='Quantidade de filmes')
+    parser.add_argument('--output', help='CSV de saída')
+    parser.add_argument('--seed', type=int, default=42, help='Semente do gerador')
+    args = parser.parse_args()
+
+    path = generate_catalog(args.n_rows, args.output, seed=args.seed)
+    print(f"✅ Catálogo com {args.n_rows} filmes em {path}")
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,27 +4,319 @@ Sistema de Enriquecimento de Sinopses com IA Generativa
 Desenvolvido por: Alan de Souza Maximiano (RM: 557088)
 """
 
+import argparse
 import json
 import requests
+import sqlite3
+import sys
+import threading
 import time
-from typing import Dict, List, Optional
+from collections import deque
+from functools import lru_cache
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Iterable, Iterator, List, Optional
 import os
 
+from enhancement_cache import EnhancementCache, enhancement_key
+from movie_stream import count_checkpoint_records, iter_movies, truncate_partial_line
+
+# Endpoint e modelo padrão da API OpenAI
+DEFAULT_BASE_URL = "https://api.openai.com/v1/chat/completions"
+DEFAULT_MODEL = 'gpt-3.5-turbo'
+
+# Máximo de tokens gerados por sinopse
+MAX_COMPLETION_TOKENS = 500
+
+# Máximo de tokens de resposta que o modelo aceita por requisição (limita
+# quantos filmes cabem em um prompt em lote)
+MAX_OUTPUT_TOKENS = 4096
+
+# Versão do template de _create_prompt (incrementar ao alterar o prompt
+# invalida o cache de sinopses enriquecidas)
+PROMPT_TEMPLATE_VERSION = 1
+
+# Versão do template de _create_batch_prompt: sinopses geradas em lote vêm
+# de outro prompt e ficam em chaves próprias no cache
+BATCH_PROMPT_TEMPLATE_VERSION = 'batch-1'
+
+# Tokens estimados por caractere de prompt (~4 caracteres por token)
+CHARS_PER_TOKEN = 4
+
+# Cache persistente de sinopses enriquecidas (opcional): caminho sugerido
+# e variável de ambiente que o ativa quando cache_path não é informado
+DEFAULT_CACHE_PATH = '.cache/enhanced_synopses.sqlite3'
+ENHANCEMENT_CACHE_ENV = 'FIAPFLIX_ENHANCEMENT_CACHE'
+
+# Respostas da API que valem nova tentativa (rate limit e erros do servidor)
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+# Templates do enriquecimento local por gênero ("Em {ano}, {intro}.")
+GENRE_TEMPLATES = {
+    'Drama': {
+        'intro': "uma história comovente se desenrola",
+        'middle': "Os personagens enfrentam desafios profundos",
+        'end': "Uma jornada emocional que toca o coração"
+    },
+    'Action': {
+        'intro': "a ação explode na tela",
+        'middle': "Sequências de ação espetaculares",
+        'end': "Uma aventura repleta de adrenalina"
+    },
+    'Comedy': {
+        'intro': "o humor toma conta",
+        'middle': "Situações hilárias se sucedem",
+        'end': "Uma comédia que diverte do início ao fim"
+    },
+    'Thriller': {
+        'intro': "o suspense domina",
+        'middle': "Tensões se acumulam a cada momento",
+        'end': "Um thriller que prende até o último segundo"
+    },
+    'Sci-Fi': {
+        'intro': "o futuro se torna presente",
+        'middle': "Tecnologia e imaginação se encontram",
+        'end': "Uma visão fascinante do que está por vir"
+    },
+    'Crime': {
+        'intro': "o crime cobra o seu preço",
+        'middle': "Lealdades são postas à prova",
+        'end': "Uma trama de poder e consequências"
+    }
+}
+
+# Gênero usado quando nenhum gênero do filme tem template
+DEFAULT_TEMPLATE_GENRE = 'Drama'
+
+# Prefixo do enriquecimento local por estilo
+STYLE_PREFIXES = {
+    'cinematic': "Uma experiência cinematográfica única: ",
+    'dramatic': "Uma narrativa dramática envolvente: ",
+    'action': "Uma aventura repleta de ação: "
+}
+
+# Filmes enriquecidos localmente por bloco no enhance_dataset/enhance_stream
+LOCAL_CHUNK_SIZE = 4096
+
+@lru_cache(maxsize=4096)
+def resolve_template_genre(genre) -> str:
+    """
+    Gênero do template para o gênero do filme: o primeiro gênero com
+    template em listas como "Crime, Drama" (padrão: Drama)
+    """
+    if not isinstance(genre, str):
+        return DEFAULT_TEMPLATE_GENRE
+    if genre in GENRE_TEMPLATES:
+        return genre
+    for part in genre.replace('/', ',').replace('|', ',').split(','):
+        part = part.strip()
+        if part in GENRE_TEMPLATES:
+            return part
+    return DEFAULT_TEMPLATE_GENRE
+
+def format_year(year) -> str:
+    """
+    Ano como texto do template: anos lidos como float (pandas com valores
+    ausentes) ou texto ("1994.0") saem como inteiros ("1994")
+    """
+    try:
+        value = float(year)
+    except (TypeError, ValueError):
+        return str(year)
+    return str(int(value)) if value.is_integer() else str(year)
+
+@lru_cache(maxsize=None)
+def _template_parts(template_genre: str, style: str) -> tuple:
+    """
+    Partes fixas do texto local para (gênero do template, estilo):
+    prefixo + ano + meio + sinopse + final
+    """
+    template = GENRE_TEMPLATES[template_genre]
+    return (
+        f"{STYLE_PREFIXES.get(style, '')}Em ",
+        f", {template['intro']}. ",
+        f". {template['middle']}. {template['end']}."
+    )
+
+def local_enhance_columns(years: Iterable, genres: Iterable, synopses: Iterable,
+                          style: str = "cinematic") -> List[str]:
+    """
+    Enriquecimento local em massa a partir de colunas (listas, arrays ou
+    Series do pandas), com o mesmo texto de _local_enhancement
+    
+    Os templates são resolvidos uma vez por gênero distinto e o texto é
+    montado com as partes fixas pré-formatadas.
+    """
+    parts = {}
+    enhanced = []
+    append = enhanced.append
+    for year, genre, synopsis in zip(years, genres, synopses):
+        try:
+            head, middle, tail = parts[genre]
+        except KeyError:
+            head, middle, tail = parts.setdefault(genre, _template_parts(resolve_template_genre(genre), style))
+        except TypeError:
+            # Gênero não hashable (não é texto): template padrão
+            head, middle, tail = _template_parts(DEFAULT_TEMPLATE_GENRE, style)
+        append(f"{head}{format_year(year)}{middle}{synopsis}{tail}")
+    return enhanced
+
+def _chunks(items: Iterable, size: int) -> Iterator[List]:
+    """Agrupa um iterável em listas de até `size` itens"""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+class TokenBucket:
+    """
+    Balde de fichas: comporta até `capacity` fichas e é reabastecido a
+    `rate` fichas por segundo
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+    
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self, amount: float, now: float) -> float:
+        """Segundos até haver `amount` fichas (0 se já houver)"""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+    
+    def consume(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+class RateLimiter:
+    """
+    Limita as chamadas à API por requisições e tokens por minuto
+    (thread-safe); acquire bloqueia até haver capacidade nos dois baldes
+    """
+    
+    def __init__(self, 
+                 requests_per_minute: Optional[float] = None, 
+                 tokens_per_minute: Optional[float] = None,
+                 min_interval: float = 0.0):
+        """
+        Args:
+            requests_per_minute: Limite de requisições por minuto (None: sem limite)
+            tokens_per_minute: Limite de tokens por minuto (None: sem limite)
+            min_interval: Intervalo mínimo entre requisições (segundos)
+        """
+        self.request_bucket = TokenBucket(requests_per_minute / 60.0, requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute) if tokens_per_minute else None
+        self.interval_bucket = None
+        self.min_interval = 0.0
+        self._lock = threading.Lock()
+        self.set_min_interval(min_interval)
+    
+    def set_min_interval(self, min_interval: float):
+        """Altera o intervalo mínimo entre requisições (0 desativa)"""
+        with self._lock:
+            self.min_interval = min_interval
+            self.interval_bucket = TokenBucket(1.0 / min_interval, 1) if min_interval > 0 else None
+    
+    def acquire(self, tokens: int = 0):
+        """Bloqueia até a requisição (com `tokens` tokens estimados) ser permitida"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                demands = [(self.request_bucket, 1), (self.interval_bucket, 1), (self.token_bucket, tokens)]
+                demands = [(bucket, amount) for bucket, amount in demands if bucket is not None]
+                
+                wait = max([bucket.wait_time(amount, now) for bucket, amount in demands] + [0.0])
+                if wait <= 0:
+                    for bucket, amount in demands:
+                        bucket.consume(amount)
+                    return
+            time.sleep(wait)
+
 class AISynopsisEnhancer:
     """
     Classe para enriquecimento de sinopses usando IA Generativa
     """
     
-    def __init__(self, api_key: Optional[str] = None):
+    def __init__(self, api_key: Optional[str] = None,
+                 base_url: Optional[str] = None,
+                 model: str = DEFAULT_MODEL,
+                 requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None,
+                 max_retries: int = 5,
+                 backoff_base: float = 1.0,
+                 max_backoff: float = 60.0,
+                 pool_size: int = 10,
+                 connect_timeout: float = 5.0,
+                 read_timeout: float = 30.0,
+                 cache_path: Optional[str] = None,
+                 cache_ttl: Optional[float] = None,
+                 cache_max_entries: Optional[int] = None,
+                 prompt_batch_tokens: Optional[int] = None,
+                 max_output_tokens: int = MAX_OUTPUT_TOKENS):
         """
         Inicializa o enriquecedor de sinopses
         
         Args:
             api_key: Chave da API OpenAI (opcional)
+            base_url: Endpoint de chat completions (ex.: servidor local de testes)
+            model: Modelo usado nas chamadas à API
+            requests_per_minute: Limite de requisições por minuto
+            tokens_per_minute: Limite de tokens por minuto
+            max_retries: Novas tentativas em respostas 429/5xx e erros de conexão
+            backoff_base: Espera da primeira nova tentativa (dobra a cada tentativa)
+            max_backoff: Espera máxima entre tentativas (segundos)
+            pool_size: Conexões mantidas abertas com a API
+            connect_timeout: Timeout de conexão (segundos)
+            read_timeout: Timeout de leitura da resposta (segundos)
+            cache_path: Arquivo do cache persistente (None: o de
+                FIAPFLIX_ENHANCEMENT_CACHE, ou sem cache); se não puder ser
+                aberto, segue sem cache
+            cache_ttl: Validade das sinopses em cache (segundos)
+            cache_max_entries: Quantidade máxima de sinopses em cache
+            prompt_batch_tokens: Orçamento de tokens (prompt + resposta) por
+                requisição em lote no enhance_dataset/enhance_stream; vários
+                filmes vão em um único prompt (None: um filme por requisição)
+            max_output_tokens: Limite de tokens de resposta do modelo; cada
+                prompt em lote leva no máximo
+                max_output_tokens // MAX_COMPLETION_TOKENS filmes
         """
         self.api_key = api_key or os.getenv('OPENAI_API_KEY')
-        self.base_url = "https://api.openai.com/v1/chat/completions"
+        self.base_url = base_url or os.getenv('OPENAI_BASE_URL') or DEFAULT_BASE_URL
+        self.model = model
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.rate_limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.pool_size = pool_size
+        self.session = self._create_session(pool_size)
+        
+        # Sinopses enriquecidas pela API: em memória e em disco
         self.enhanced_synopses = {}
+        self.cache = None
+        cache_path = cache_path or os.getenv(ENHANCEMENT_CACHE_ENV)
+        if cache_path:
+            try:
+                self.cache = EnhancementCache(cache_path, cache_ttl, cache_max_entries)
+            except (OSError, sqlite3.Error) as e:
+                # Ex.: diretório somente leitura
+                print(f"⚠️ Cache de sinopses indisponível ({cache_path}): {e}", file=sys.stderr)
+        self.prompt_batch_tokens = prompt_batch_tokens
+        self.max_output_tokens = max_output_tokens
         
     def enhance_synopsis(self, 
                         title: str, 
@@ -46,6 +338,13 @@ class AISynopsisEnhancer:
             Dict com sinopse enriquecida e metadados
         """
         
+        # Resultado já calculado para o mesmo conteúdo
+        key = enhancement_key(title, year, genre, original_synopsis, style,
+                              self.model, PROMPT_TEMPLATE_VERSION)
+        cached = self._cached_enhancement(key)
+        if cached is not None:
+            return cached
+        
         # Se não há API key, usar enriquecimento local
         if not self.api_key:
             return self._local_enhancement(title, year, genre, original_synopsis, style)
@@ -60,7 +359,7 @@ class AISynopsisEnhancer:
             if response:
                 enhanced_synopsis = response.get('choices', [{}])[0].get('message', {}).get('content', '')
                 
-                return {
+                result = {
                     'title': title,
                     'year': year,
                     'genre': genre,
@@ -70,6 +369,9 @@ class AISynopsisEnhancer:
                     'method': 'openai_api',
                     'timestamp': time.time()
                 }
+                if enhanced_synopsis:
+                    self._store_enhancement(key, result)
+                return result
             else:
                 # Fallback para enriquecimento local
                 return self._local_enhancement(title, year, genre, original_synopsis, style)
@@ -79,6 +381,32 @@ class AISynopsisEnhancer:
             # Fallback para enriquecimento local
             return self._local_enhancement(title, year, genre, original_synopsis, style)
     
+    def _cached_enhancement(self, key: str) -> Optional[Dict]:
+        """
+        Sinopse enriquecida em cache (memória, depois disco) ou None
+        """
+        result = self.enhanced_synopses.get(key)
+        if result is None and self.cache is not None:
+            try:
+                result = self.cache.get(key)
+            except sqlite3.Error as e:
+                print(f"❌ Erro ao ler o cache de sinopses: {e}")
+            if result is not None:
+                self.enhanced_synopses[key] = result
+        
+        return dict(result) if result is not None else None
+    
+    def _store_enhancement(self, key: str, result: Dict):
+        """
+        Guarda uma sinopse enriquecida pela API nos caches
+        """
+        self.enhanced_synopses[key] = dict(result)
+        if self.cache is not None:
+            try:
+                self.cache.put(key, result)
+            except sqlite3.Error as e:
+                print(f"❌ Erro ao gravar o cache de sinopses: {e}")
+    
     def _create_prompt(self, title: str, year: int, genre: str, 
                       original_synopsis: str, style: str) -> str:
         """
@@ -104,80 +432,158 @@ class AISynopsisEnhancer:
         Sinopse Enriquecida:
         """
     
-    def _call_openai_api(self, prompt: str) -> Optional[Dict]:
+    def _create_batch_prompt(self, movies: List[Dict], style: str) -> str:
         """
-        Chama a API OpenAI
+        Cria um prompt para vários filmes, pedindo um array JSON de volta
+        
+        Args:
+            movies: Dicts com 'i', 'titulo', 'ano', 'genero' e 'sinopse'
         """
-        headers = {
-            'Authorization': f'Bearer {self.api_key}',
-            'Content-Type': 'application/json'
-        }
+        movies_json = json.dumps(movies, ensure_ascii=False, indent=1)
+        return f"""
+        Enriqueça as sinopses de filme abaixo de forma mais envolvente e cinematográfica.
+        
+        Filmes (JSON):
+        {movies_json}
+        
+        Instruções:
+        1. Mantenha a essência da história original de cada filme
+        2. Adicione detalhes visuais e emocionais
+        3. Use linguagem cinematográfica e envolvente
+        4. Mantenha o gênero de cada filme
+        5. Estilo: {style}
+        6. Tamanho: 2-3 parágrafos por filme
+        7. Idioma: Português brasileiro
+        
+        Responda somente com um array JSON, um objeto por filme, no formato
+        [{{"i": <i do filme>, "sinopse_enriquecida": "<texto>"}}]
+        """
+    
+    def _parse_batch_response(self, content: str, n_movies: int) -> Dict[int, str]:
+        """
+        Valida a resposta de um prompt em lote
+        
+        Returns:
+            Dict i -> sinopse enriquecida, só com os itens válidos
+        """
+        start, end = content.find('['), content.rfind(']')
+        if start < 0 or end <= start:
+            return {}
+        
+        try:
+            items = json.loads(content[start:end + 1])
+        except json.JSONDecodeError:
+            return {}
         
+        if not isinstance(items, list):
+            return {}
+        
+        parsed = {}
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            i, text = item.get('i'), item.get('sinopse_enriquecida')
+            if isinstance(i, int) and 0 <= i < n_movies and isinstance(text, str) and text.strip():
+                parsed[i] = text.strip()
+        return parsed
+    
+    def _call_openai_api(self, prompt: str, max_tokens: int = MAX_COMPLETION_TOKENS) -> Optional[Dict]:
+        """
+        Chama a API OpenAI
+        
+        A sessão reaproveita conexões (keep-alive). Respostas 429/5xx são
+        refeitas aqui, com backoff exponencial (ou o Retry-After do
+        servidor), e cada tentativa passa de novo pelo rate limiter.
+        """
         data = {
-            'model': 'gpt-3.5-turbo',
+            'model': self.model,
             'messages': [
                 {'role': 'user', 'content': prompt}
             ],
-            'max_tokens': 500,
+            'max_tokens': max_tokens,
             'temperature': 0.7
         }
         
+        # Estimativa de tokens da requisição
+        tokens = len(prompt) // CHARS_PER_TOKEN + max_tokens
+        
         try:
-            response = requests.post(self.base_url, headers=headers, json=data, timeout=30)
+            for attempt in range(self.max_retries + 1):
+                self.rate_limiter.acquire(tokens)
+                response = self.session.post(self.base_url, json=data,
+                                             timeout=(self.connect_timeout, self.read_timeout))
+                if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                    break
+                time.sleep(self._retry_wait(response, attempt))
             response.raise_for_status()
             return response.json()
         except Exception as e:
             print(f"❌ Erro na chamada da API: {e}")
             return None
     
+    def _retry_wait(self, response: requests.Response, attempt: int) -> float:
+        """Espera antes da próxima tentativa: Retry-After (segundos) ou backoff exponencial"""
+        try:
+            wait = float(response.headers.get('Retry-After', ''))
+        except ValueError:
+            wait = self.backoff_base * (2 ** attempt)
+        return min(max(wait, 0.0), self.max_backoff)
+    
+    def _create_session(self, pool_size: int) -> requests.Session:
+        """
+        Cria a sessão HTTP com pool de conexões
+        
+        O adaptador só refaz falhas de conexão (a requisição não chegou à
+        API); respostas 429/5xx são refeitas em _call_openai_api, que passa
+        pelo rate limiter a cada tentativa.
+        """
+        retry_options = dict(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=0,
+            status=0,
+            backoff_factor=self.backoff_base,
+            allowed_methods=frozenset(['POST']),
+            raise_on_status=False
+        )
+        try:
+            retry = Retry(backoff_max=self.max_backoff, **retry_options)
+        except TypeError:
+            # urllib3 < 2 não aceita backoff_max (usa o máximo padrão)
+            retry = Retry(**retry_options)
+        
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+        
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update({
+            'Authorization': f'Bearer {self.api_key}',
+            'Content-Type': 'application/json'
+        })
+        return session
+    
+    def close(self):
+        """Fecha as conexões HTTP e o cache em disco"""
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
     def _local_enhancement(self, title: str, year: int, genre: str, 
                           original_synopsis: str, style: str) -> Dict:
         """
         Enriquecimento local usando templates e regras
         """
         
-        # Templates por gênero
-        genre_templates = {
-            'Drama': {
-                'intro': f"Em {year}, uma história comovente se desenrola",
-                'middle': "Os personagens enfrentam desafios profundos",
-                'end': "Uma jornada emocional que toca o coração"
-            },
-            'Action': {
-                'intro': f"Em {year}, a ação explode na tela",
-                'middle': "Sequências de ação espetaculares",
-                'end': "Uma aventura repleta de adrenalina"
-            },
-            'Comedy': {
-                'intro': f"Em {year}, o humor toma conta",
-                'middle': "Situações hilárias se sucedem",
-                'end': "Uma comédia que diverte do início ao fim"
-            },
-            'Thriller': {
-                'intro': f"Em {year}, o suspense domina",
-                'middle': "Tensões se acumulam a cada momento",
-                'end': "Um thriller que prende até o último segundo"
-            },
-            'Sci-Fi': {
-                'intro': f"Em {year}, o futuro se torna presente",
-                'middle': "Tecnologia e imaginação se encontram",
-                'end': "Uma visão fascinante do que está por vir"
-            }
-        }
-        
-        # Obter template do gênero
-        template = genre_templates.get(genre, genre_templates['Drama'])
-        
-        # Enriquecer sinopse
-        enhanced = f"{template['intro']}. {original_synopsis}. {template['middle']}. {template['end']}."
-        
-        # Adicionar elementos cinematográficos
-        if style == "cinematic":
-            enhanced = f"Uma experiência cinematográfica única: {enhanced}"
-        elif style == "dramatic":
-            enhanced = f"Uma narrativa dramática envolvente: {enhanced}"
-        elif style == "action":
-            enhanced = f"Uma aventura repleta de ação: {enhanced}"
+        # Template do gênero (ou do primeiro gênero com template) + estilo
+        head, middle, tail = _template_parts(resolve_template_genre(genre), style)
+        enhanced = f"{head}{format_year(year)}{middle}{original_synopsis}{tail}"
         
         return {
             'title': title,
@@ -190,59 +596,336 @@ class AISynopsisEnhancer:
             'timestamp': time.time()
         }
     
+    def enhance_local_bulk(self, data, style: str = "cinematic") -> List[str]:
+        """
+        Enriquecimento local de muitos filmes de uma vez
+        
+        Args:
+            data: DataFrame ou dict de colunas com 'year', 'genre' e
+                'synopsis_pt' (ou 'sinopse')
+            style: Estilo da sinopse
+            
+        Returns:
+            Lista de sinopses enriquecidas, na ordem das linhas
+        """
+        synopsis_column = 'synopsis_pt' if 'synopsis_pt' in data else 'sinopse'
+        return local_enhance_columns(data['year'], data['genre'], data[synopsis_column], style)
+    
     def enhance_dataset(self, movies: List[Dict], 
                        batch_size: int = 5, 
-                       delay: float = 1.0) -> List[Dict]:
+                       delay: float = 0.0,
+                       max_workers: Optional[int] = None) -> List[Dict]:
         """
         Enriquece um dataset completo de filmes
         
+        Com chave da API, as chamadas são feitas em paralelo (até max_workers
+        simultâneas) respeitando o limite de requisições/tokens por minuto.
+        Sem chave, o enriquecimento local é feito em sequência, sem esperas.
+        
         Args:
             movies: Lista de filmes
-            batch_size: Tamanho do lote
-            delay: Delay entre requisições (segundos)
+            batch_size: Chamadas simultâneas à API (se max_workers não for informado)
+            delay: Intervalo mínimo entre chamadas à API (segundos); 0 (padrão)
+                deixa o ritmo só para os limites por minuto do rate limiter
+            max_workers: Chamadas simultâneas à API
             
         Returns:
-            Lista de filmes com sinopses enriquecidas
+            Lista de filmes com sinopses enriquecidas, na ordem de entrada
         """
         
-        enhanced_movies = []
-        
         print(f"🤖 Iniciando enriquecimento de {len(movies)} filmes...")
         
-        for i, movie in enumerate(movies):
-            try:
-                print(f"📝 Processando {i+1}/{len(movies)}: {movie.get('title_pt', 'N/A')}")
-                
-                # Enriquecer sinopse
-                enhanced = self.enhance_synopsis(
-                    title=movie.get('title_pt', ''),
-                    year=movie.get('year', 2020),
-                    genre=movie.get('genre', 'Drama'),
-                    original_synopsis=movie.get('synopsis_pt', ''),
-                    style='cinematic'
-                )
-                
-                # Adicionar sinopse enriquecida ao filme
-                movie['synopsis_enhanced'] = enhanced['enhanced_synopsis']
-                movie['synopsis_enhancement_method'] = enhanced['method']
-                movie['synopsis_enhancement_timestamp'] = enhanced['timestamp']
-                
-                enhanced_movies.append(movie)
-                
-                # Delay para evitar rate limiting
-                if i < len(movies) - 1:
-                    time.sleep(delay)
-                    
-            except Exception as e:
-                print(f"❌ Erro ao processar filme {i+1}: {e}")
-                # Adicionar filme sem enriquecimento
-                movie['synopsis_enhanced'] = movie.get('synopsis_pt', '')
-                movie['synopsis_enhancement_method'] = 'error'
-                enhanced_movies.append(movie)
+        enhanced_movies = []
+        for movie in self._enhance_iter(movies, max_workers or batch_size, delay):
+            enhanced_movies.append(movie)
+            if self.api_key:
+                print(f"📝 Processado {len(enhanced_movies)}/{len(movies)}: {movie.get('title_pt', 'N/A')}")
         
         print(f"✅ Enriquecimento concluído: {len(enhanced_movies)} filmes processados")
+        self._print_cache_stats()
         return enhanced_movies
     
+    def enhance_stream(self, movies: Iterable[Dict],
+                       checkpoint_path: Optional[str] = None,
+                       max_workers: int = 5,
+                       delay: float = 0.0) -> Iterator[Dict]:
+        """
+        Enriquece filmes sob demanda (gerador), na ordem de entrada
+        
+        Os filmes são lidos do iterável à medida que há vagas (no máximo
+        2 * max_workers em andamento), então a memória não cresce com o
+        tamanho do catálogo. Cada filme enriquecido é anexado ao checkpoint
+        JSONL assim que termina, na ordem de entrada; ao reiniciar com o
+        mesmo checkpoint (e a mesma entrada), os N filmes já gravados são os
+        N primeiros da entrada, que são pulados por posição. Filmes com ids
+        repetidos são todos processados e nada cresce com o checkpoint.
+        
+        Args:
+            movies: Iterável de filmes (ex.: movie_stream.iter_movies(path))
+            checkpoint_path: Arquivo JSONL de checkpoint (None: sem checkpoint)
+            max_workers: Chamadas simultâneas à API
+            delay: Intervalo mínimo entre chamadas à API (segundos); 0 (padrão)
+                deixa o ritmo só para os limites por minuto do rate limiter
+            
+        Yields:
+            Filmes enriquecidos ainda não presentes no checkpoint
+        """
+        completed = 0
+        checkpoint = None
+        if checkpoint_path:
+            truncate_partial_line(checkpoint_path)
+            completed = count_checkpoint_records(checkpoint_path)
+            checkpoint = open(checkpoint_path, 'a', encoding='utf-8')
+        
+        pending = islice(movies, completed, None)
+        
+        try:
+            for movie in self._enhance_iter(pending, max_workers, delay):
+                if checkpoint is not None:
+                    checkpoint.write(json.dumps(movie, ensure_ascii=False) + '\n')
+                    checkpoint.flush()
+                yield movie
+        finally:
+            if checkpoint is not None:
+                checkpoint.close()
+    
+    def enhance_file(self, input_path: str, checkpoint_path: str,
+                     max_workers: int = 5, delay: float = 0.0) -> int:
+        """
+        Enriquece um catálogo JSON/CSV/JSONL em streaming para um JSONL
+        (retomável, ver enhance_stream)
+        
+        Returns:
+            Quantidade de filmes enriquecidos nesta execução
+        """
+        already_done = count_checkpoint_records(checkpoint_path)
+        if already_done:
+            print(f"↩️ Retomando: {already_done} filmes já no checkpoint {checkpoint_path}")
+        
+        count = 0
+        for movie in self.enhance_stream(iter_movies(input_path), checkpoint_path, max_workers, delay):
+            count += 1
+            if count % 100 == 0:
+                print(f"📝 {count} filmes enriquecidos...")
+        
+        print(f"✅ Enriquecimento concluído: {count} filmes novos em {checkpoint_path}")
+        self._print_cache_stats()
+        return count
+    
+    def _enhance_iter(self, movies: Iterable[Dict], max_workers: int, delay: float) -> Iterator[Dict]:
+        """
+        Enriquece os filmes do iterável, na ordem de entrada
+        
+        Sem chave da API, em sequência e sem esperas. Com chave, em uma pool
+        de threads com até 2 * max_workers tarefas em andamento (filmes ou,
+        com prompt_batch_tokens, lotes de filmes), respeitando o rate
+        limiter e o intervalo mínimo entre chamadas.
+        """
+        if not self.api_key:
+            if self._has_cached_enhancements():
+                # Sinopses da API já em cache têm preferência sobre os templates
+                for movie in movies:
+                    yield self._enhance_movie(movie)
+            else:
+                for chunk in _chunks(movies, LOCAL_CHUNK_SIZE):
+                    yield from self._enhance_movies_local(chunk)
+            return
+        
+        # Espaçamento mínimo entre chamadas reais à API
+        previous_interval = self.rate_limiter.min_interval
+        self.rate_limiter.set_min_interval(max(delay, previous_interval))
+        
+        workers = max(1, max_workers)
+        if workers > self.pool_size:
+            # Uma conexão por chamada simultânea (as conexões da sessão
+            # anterior são fechadas)
+            self.pool_size = workers
+            previous_session, self.session = self.session, self._create_session(workers)
+            previous_session.close()
+        
+        # Tarefas: um filme por requisição ou lotes de filmes por prompt
+        if self.prompt_batch_tokens:
+            tasks = self._prompt_batches(movies)
+            run_task = self._enhance_movies_batch
+        else:
+            tasks = ([movie] for movie in movies)
+            run_task = lambda batch: [self._enhance_movie(batch[0])]
+        
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                in_flight = deque()
+                for task in tasks:
+                    in_flight.append(executor.submit(run_task, task))
+                    if len(in_flight) >= 2 * workers:
+                        yield from in_flight.popleft().result()
+                
+                while in_flight:
+                    yield from in_flight.popleft().result()
+        finally:
+            self.rate_limiter.set_min_interval(previous_interval)
+    
+    def _has_cached_enhancements(self) -> bool:
+        """Se há alguma sinopse enriquecida em cache (memória ou disco)"""
+        if self.enhanced_synopses:
+            return True
+        try:
+            return self.cache is not None and len(self.cache) > 0
+        except sqlite3.Error:
+            return False
+    
+    def _enhance_movies_local(self, movies: List[Dict]) -> List[Dict]:
+        """
+        Enriquecimento local de um bloco de filmes (local_enhance_columns)
+        """
+        fields = [self._movie_fields(movie) for movie in movies]
+        enhanced = local_enhance_columns(
+            [f['year'] for f in fields], [f['genre'] for f in fields],
+            [f['original_synopsis'] for f in fields], 'cinematic'
+        )
+        
+        timestamp = time.time()
+        for movie, text in zip(movies, enhanced):
+            movie['synopsis_enhanced'] = text
+            movie['synopsis_enhancement_method'] = 'local_enhancement'
+            movie['synopsis_enhancement_timestamp'] = timestamp
+        return movies
+    
+    def _print_cache_stats(self):
+        """Resumo do cache de sinopses"""
+        if self.cache is not None:
+            stats = self.cache.stats()
+            print(f"💾 Cache de sinopses: {stats['hits']} acertos, {stats['misses']} chamadas "
+                  f"({stats['hit_rate']:.0%} de acerto)")
+    
+    def _movie_fields(self, movie: Dict) -> Dict:
+        """
+        Argumentos de enhance_synopsis para um filme do dataset
+        """
+        return {
+            'title': movie.get('title_pt', ''),
+            'year': movie.get('year', 2020),
+            'genre': movie.get('genre', 'Drama'),
+            'original_synopsis': movie.get('synopsis_pt', movie.get('sinopse', '')),
+            'style': 'cinematic'
+        }
+    
+    def _apply_enhancement(self, movie: Dict, enhanced: Dict) -> Dict:
+        """
+        Adiciona a sinopse enriquecida ao filme
+        """
+        movie['synopsis_enhanced'] = enhanced['enhanced_synopsis']
+        movie['synopsis_enhancement_method'] = enhanced['method']
+        movie['synopsis_enhancement_timestamp'] = enhanced['timestamp']
+        return movie
+    
+    def _enhance_movie(self, movie: Dict) -> Dict:
+        """
+        Enriquece um filme do dataset (adiciona os campos synopsis_enhanced*)
+        """
+        try:
+            return self._apply_enhancement(movie, self.enhance_synopsis(**self._movie_fields(movie)))
+            
+        except Exception as e:
+            print(f"❌ Erro ao processar filme {movie.get('title_pt', 'N/A')}: {e}")
+            # Adicionar filme sem enriquecimento
+            movie['synopsis_enhanced'] = movie.get('synopsis_pt', movie.get('sinopse', ''))
+            movie['synopsis_enhancement_method'] = 'error'
+        
+        return movie
+    
+    def _movie_prompt_tokens(self, movie: Dict) -> int:
+        """
+        Tokens estimados de um filme em um prompt em lote (entrada + resposta)
+        """
+        fields = self._movie_fields(movie)
+        chars = len(str(fields['title'])) + len(str(fields['genre'])) + len(str(fields['original_synopsis'])) + 60
+        return chars // CHARS_PER_TOKEN + MAX_COMPLETION_TOKENS
+    
+    def _batch_size_limit(self) -> int:
+        """Filmes por prompt em lote cujas respostas cabem em max_output_tokens"""
+        return max(1, self.max_output_tokens // MAX_COMPLETION_TOKENS)
+    
+    def _prompt_batches(self, movies: Iterable[Dict]) -> Iterator[List[Dict]]:
+        """
+        Agrupa os filmes em lotes que cabem em prompt_batch_tokens e no
+        limite de resposta do modelo
+        """
+        batch = []
+        batch_tokens = 0
+        limit = self._batch_size_limit()
+        for movie in movies:
+            tokens = self._movie_prompt_tokens(movie)
+            if batch and (batch_tokens + tokens > self.prompt_batch_tokens or len(batch) >= limit):
+                yield batch
+                batch, batch_tokens = [], 0
+            batch.append(movie)
+            batch_tokens += tokens
+        
+        if batch:
+            yield batch
+    
+    def _enhance_movies_batch(self, movies: List[Dict]) -> List[Dict]:
+        """
+        Enriquece vários filmes com um único prompt
+        
+        Filmes já em cache (sob BATCH_PROMPT_TEMPLATE_VERSION) não entram
+        no prompt. Filmes ausentes ou com resposta inválida no array
+        devolvido voltam para chamadas individuais (_enhance_movie), que
+        usam as chaves do prompt de um filme.
+        """
+        pending = []
+        for movie in movies:
+            fields = self._movie_fields(movie)
+            key = enhancement_key(fields['title'], fields['year'], fields['genre'],
+                                  fields['original_synopsis'], fields['style'],
+                                  self.model, BATCH_PROMPT_TEMPLATE_VERSION)
+            cached = self._cached_enhancement(key)
+            if cached is not None:
+                self._apply_enhancement(movie, cached)
+            else:
+                pending.append((movie, fields, key))
+        
+        # Lotes maiores que o limite de resposta do modelo seriam recusados
+        for chunk in _chunks(pending, self._batch_size_limit()):
+            self._enhance_pending_batch(chunk)
+        return movies
+    
+    def _enhance_pending_batch(self, pending: List) -> None:
+        """
+        Um prompt para os filmes de pending (tuplas (filme, campos, chave)),
+        com max_tokens dentro do limite de resposta do modelo
+        """
+        if len(pending) == 1:
+            self._enhance_movie(pending[0][0])
+            return
+        
+        prompt = self._create_batch_prompt([
+            {
+                'i': i,
+                'titulo': fields['title'],
+                'ano': fields['year'],
+                'genero': fields['genre'],
+                'sinopse': fields['original_synopsis']
+            }
+            for i, (_, fields, _) in enumerate(pending)
+        ], 'cinematic')
+        
+        parsed = {}
+        max_tokens = min(MAX_COMPLETION_TOKENS * len(pending), self.max_output_tokens)
+        response = self._call_openai_api(prompt, max_tokens=max_tokens)
+        if response:
+            content = response.get('choices', [{}])[0].get('message', {}).get('content', '') or ''
+            parsed = self._parse_batch_response(content, len(pending))
+        
+        for i, (movie, fields, key) in enumerate(pending):
+            if i not in parsed:
+                self._enhance_movie(movie)
+                continue
+            
+            result = dict(fields, enhanced_synopsis=parsed[i], method='openai_api', timestamp=time.time())
+            self._store_enhancement(key, result)
+            self._apply_enhancement(movie, result)
+    
     def save_enhanced_dataset(self, enhanced_movies: List[Dict], 
                              filename: str = 'movies_enhanced.json'):
         """
@@ -276,12 +959,35 @@ class AISynopsisEnhancer:
 def main():
     """
     Função principal para teste
+    
+    Com --input, enriquece um catálogo (JSON, CSV ou JSONL) em streaming
+    para o checkpoint JSONL, retomando de onde parou:
+        python3 lib/ai_synopsis_enhancer.py --input catalogo.json --checkpoint enhanced.jsonl
     """
+    parser = argparse.ArgumentParser(description='Enriquecimento de sinopses com IA Generativa')
+    parser.add_argument('--input', help='Catálogo de filmes (JSON, CSV ou JSONL)')
+    parser.add_argument('--checkpoint', default='movies_enhanced.jsonl', help='Checkpoint JSONL de saída')
+    parser.add_argument('--workers', type=int, default=5, help='Chamadas simultâneas à API')
+    parser.add_argument('--delay', type=float, default=0.0,
+                        help='Intervalo mínimo entre chamadas à API (padrão: 0, só os limites por minuto)')
+    parser.add_argument('--requests-per-minute', type=float, help='Limite de requisições por minuto da API')
+    parser.add_argument('--tokens-per-minute', type=float, help='Limite de tokens por minuto da API')
+    parser.add_argument('--cache', metavar='SQLITE',
+                        help=f'Cache persistente de sinopses (ex.: {DEFAULT_CACHE_PATH}; padrão: sem cache)')
+    args = parser.parse_args()
+    
     print("🤖 Sistema de Enriquecimento de Sinopses com IA Generativa")
     print("=" * 60)
     
+    if args.input:
+        with AISynopsisEnhancer(requests_per_minute=args.requests_per_minute,
+                                tokens_per_minute=args.tokens_per_minute,
+                                cache_path=args.cache) as enhancer:
+            enhancer.enhance_file(args.input, args.checkpoint, args.workers, args.delay)
+        return
+    
     # Exemplo de uso
-    enhancer = AISynopsisEnhancer()
+    enhancer = AISynopsisEnhancer(cache_path=args.cache)
     
     # Exemplo de filme
     sample_movie = {
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Índice de vizinhos mais próximos aproximado (ANN) para o catálogo de filmes
+
+O índice é do tipo IVF (inverted file): cada filme fica na lista do seu
+centroide do KMeans TF-IDF e, na busca, só as listas dos centroides mais
+próximos da consulta são varridas. Opcionalmente os vetores TF-IDF são
+reduzidos com TruncatedSVD para embeddings densos menores.
+
+O índice é construído offline e salvo em models/ann_index/ como arquivos
+.npy, carregados com memory-map na inicialização. O meta.json guarda a
+impressão digital (sha256 do conteúdo) do dataset, do vetorizador e do
+KMeans TF-IDF usados na construção; um índice cuja impressão digital não corresponde aos arquivos
+carregados é ignorado (busca exata) até ser reconstruído.
+
+Uso:
+    python3 lib/ann_index.py [--components 128] [--output models/ann_index]
+"""
+
+import sys
+import json
+import os
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+# Diretório padrão do índice, ao lado dos demais modelos
+ANN_INDEX_DIR = 'models/ann_index'
+
+# Arquivos do índice dentro do diretório
+ANN_INDEX_FILES = ('embeddings.npy', 'row_ids.npy', 'offsets.npy', 'centroids.npy',
+                   'components.npy', 'meta.json')
+
+def index_paths(index_dir=ANN_INDEX_DIR):
+    """Caminhos dos arquivos do índice (entram na impressão digital dos caches)"""
+    return [os.path.join(index_dir, name) for name in ANN_INDEX_FILES]
+
+def source_fingerprint(system):
+    """
+    Impressão digital do conteúdo dos arquivos dos quais o índice depende:
+    dataset, vetorizador e KMeans TF-IDF
+
+    Por conteúdo (não por data de modificação) para que o índice versionado
+    no repositório continue válido em um checkout novo.
+    """
+    from result_cache import content_fingerprint
+    return content_fingerprint([system.dataset_path, system.model_files['vectorizer'],
+                             system.model_files['kmeans_tfidf']])
+
+def _normalize_rows(matrix):
+    """Normaliza as linhas (L2) para que produto escalar seja cosseno"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+class AnnIndex:
+    """
+    Índice IVF sobre os embeddings do catálogo
+
+    Atributos:
+        embeddings: Embeddings (float32, normalizados) agrupados por lista
+        row_ids: Posição no catálogo de cada linha de embeddings
+        offsets: Início de cada lista em embeddings (tamanho n_lists + 1)
+        centroids: Centroides das listas no espaço dos embeddings
+        components: Matriz de projeção do SVD (None se não houver redução)
+    """
+
+    def __init__(self, embeddings, row_ids, offsets, centroids, components=None, meta=None):
+        self.embeddings = embeddings
+        self.row_ids = row_ids
+        self.offsets = offsets
+        self.centroids = centroids
+        self.components = components
+        self.meta = meta or {}
+
+    @property
+    def n_rows(self):
+        return len(self.row_ids)
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def embed(self, X):
+        """
+        Converte linhas TF-IDF (esparsas) em embeddings normalizados
+        """
+        if self.components is not None:
+            embedded = np.asarray(X @ self.components.T, dtype=np.float32)
+        else:
+            embedded = np.asarray(X.toarray(), dtype=np.float32)
+        return _normalize_rows(embedded)
+
+    def search(self, query_vector, n_results=5, nprobe=2):
+        """
+        Busca os filmes mais próximos de uma consulta
+
+        Args:
+            query_vector: Linha TF-IDF da consulta (matriz esparsa 1 x V)
+            n_results: Quantidade de filmes retornados
+            nprobe: Quantidade de listas (centroides) varridas
+
+        Returns:
+            Tupla (posições no catálogo, similaridades, candidatos varridos)
+        """
+        query = self.embed(query_vector)[0]
+
+        # Listas mais próximas da consulta
+        nprobe = max(1, min(nprobe, self.n_lists))
+        centroid_scores = self.centroids @ query
+        probe = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+
+        candidate_ids = []
+        candidate_scores = []
+        for list_id in probe:
+            start, end = int(self.offsets[list_id]), int(self.offsets[list_id + 1])
+            if start == end:
+                continue
+            candidate_ids.append(self.row_ids[start:end])
+            candidate_scores.append(self.embeddings[start:end] @ query)
+
+        if not candidate_ids:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float32), 0
+
+        candidate_ids = np.concatenate(candidate_ids)
+        candidate_scores = np.concatenate(candidate_scores)
+
+        n = min(n_results, len(candidate_scores))
+        top = np.argpartition(-candidate_scores, n - 1)[:n]
+        top = top[np.argsort(-candidate_scores[top], kind='stable')]
+
+        return candidate_ids[top], candidate_scores[top], len(candidate_scores)
+
+    def save(self, output_dir=ANN_INDEX_DIR):
+        """
+        Salva o índice como arquivos .npy (compatíveis com memory-map)
+
+        Os arquivos são gravados em um diretório temporário, que então toma o
+        lugar de output_dir; nada do índice anterior (ex.: components.npy de
+        um índice com SVD) sobra no novo.
+        """
+        import shutil
+
+        output_dir = output_dir.rstrip(os.sep)
+        tmp_dir = f'{output_dir}.{os.getpid()}.tmp'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        np.save(os.path.join(tmp_dir, 'embeddings.npy'), self.embeddings)
+        np.save(os.path.join(tmp_dir, 'row_ids.npy'), self.row_ids)
+        np.save(os.path.join(tmp_dir, 'offsets.npy'), self.offsets)
+        np.save(os.path.join(tmp_dir, 'centroids.npy'), self.centroids)
+        if self.components is not None:
+            np.save(os.path.join(tmp_dir, 'components.npy'), self.components)
+
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f, ensure_ascii=False, indent=2)
+
+        # Um diretório não vazio não pode ser substituído por os.replace:
+        # o anterior sai do caminho e o novo entra logo em seguida
+        old_dir = f'{output_dir}.{os.getpid()}.old'
+        if os.path.exists(output_dir):
+            os.rename(output_dir, old_dir)
+        os.rename(tmp_dir, output_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+    @classmethod
+    def load(cls, index_dir=ANN_INDEX_DIR):
+        """
+        Carrega o índice com memory-map (as páginas são lidas sob demanda)
+        """
+        def load_array(name):
+            return np.load(os.path.join(index_dir, f'{name}.npy'), mmap_mode='r')
+
+        with open(os.path.join(index_dir, 'meta.json'), encoding='utf-8') as f:
+            meta = json.load(f)
+
+        # Só índices construídos com SVD usam a projeção
+        components = load_array('components') if meta.get('n_components') else None
+
+        return cls(
+            embeddings=load_array('embeddings'),
+            row_ids=load_array('row_ids'),
+            offsets=load_array('offsets'),
+            centroids=load_array('centroids'),
+            components=components,
+            meta=meta
+        )
+
+def build_ann_index(system, n_components=128):
+    """
+    Constrói o índice a partir do catálogo e dos modelos carregados
+
+    As listas reaproveitam os centroides do KMeans TF-IDF: cada filme vai
+    para a lista do cluster predito pelo modelo.
+
+    Args:
+        system: MovieRecommendationSystem com modelos carregados
+        n_components: Dimensão do SVD (None ou >= vocabulário: sem redução)
+    """
+    X = system.tfidf_matrix
+    centers = system.kmeans_tfidf.cluster_centers_
+
+    components = None
+    if n_components and n_components < X.shape[1] - 1 and n_components < X.shape[0]:
+        from sklearn.decomposition import TruncatedSVD
+
+        svd = TruncatedSVD(n_components=n_components, random_state=42)
+        embeddings = svd.fit_transform(X)
+        components = svd.components_.astype(np.float32)
+        centroids = centers @ svd.components_.T
+    else:
+        embeddings = X.toarray()
+        centroids = centers
+
+    embeddings = _normalize_rows(np.asarray(embeddings, dtype=np.float32))
+    centroids = _normalize_rows(np.asarray(centroids, dtype=np.float32))
+
+    # Agrupar as linhas por lista (cluster)
+    labels = system.kmeans_tfidf.predict(X)
+    order = np.argsort(labels, kind='stable')
+    counts = np.bincount(labels, minlength=len(centers))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+
+    meta = {
+        'n_rows': int(X.shape[0]),
+        'n_lists': int(len(centers)),
+        'n_features': int(X.shape[1]),
+        'n_components': int(components.shape[0]) if components is not None else None,
+        'dataset_path': system.dataset_path,
+        'source_fingerprint': source_fingerprint(system)
+    }
+
+    return AnnIndex(
+        embeddings=np.ascontiguousarray(embeddings[order]),
+        row_ids=order.astype(np.int64),
+        offsets=offsets,
+        centroids=np.ascontiguousarray(centroids),
+        components=components,
+        meta=meta
+    )
+
+def main():
+    """Constrói e salva o índice ANN do catálogo atual"""
+    parser = argparse.ArgumentParser(description='Constrói o índice ANN do catálogo')
+    parser.add_argument('--components', type=int, default=128,
+                        help='Dimensão do TruncatedSVD (0 para não reduzir)')
+    parser.add_argument('--output', default=ANN_INDEX_DIR, help='Diretório de saída')
+    args = parser.parse_args()
+
+    sys.path.append(str(Path(__file__).parent))
+    from ml_model_trained import movie_system as system
+
+    if not system.models_loaded:
+        print("❌ Modelos não carregados")
+        sys.exit(1)
+
+    index = build_ann_index(system, n_components=args.components or None)
+    index.save(args.output)
+
+    print(f"✅ Índice ANN salvo em {args.output}")
+    print(f"📊 Filmes: {index.n_rows} | Listas: {index.n_lists} | "
+          f"Dimensão: {index.embeddings.shape[1]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Agendador de micro-lotes para consultas concorrentes
+
+Consultas enviadas por várias threads (ex.: conexões do modo socket) entram
+em uma fila; uma thread do agendador junta as que chegam dentro de uma
+janela de alguns milissegundos, até um tamanho máximo de lote, e as executa
+de uma só vez (uma vetorização e uma predição por método, em
+get_recommendations_batch). Cada chamador recebe o seu resultado por um
+concurrent.futures.Future (ou um awaitable do asyncio, com submit_async).
+
+A janela só é aplicada quando há tráfego concorrente (o lote anterior teve
+mais de uma consulta): uma consulta isolada é executada assim que chega,
+sem esperar a janela. Enquanto um lote é executado, as consultas que
+chegam esperam na fila e formam o próximo lote.
+
+Métricas (ver instrumentation.py): profundidade da fila
+(batch_queue_depth), tamanho dos lotes (batch_size), espera de cada
+consulta na fila (batch_queue_wait_seconds) e quantidade de lotes
+(batches_total).
+"""
+
+import asyncio
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# Janela (ms) para juntar consultas em um lote
+DEFAULT_WINDOW_MS = 2.0
+
+# Quantidade máxima de consultas por lote
+DEFAULT_MAX_BATCH_SIZE = 32
+
+# Limites do histograma de tamanho dos lotes
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+# Marcador de encerramento na fila
+_STOP = object()
+
+class MicroBatchScheduler:
+    """
+    Junta consultas concorrentes em lotes executados por uma única thread
+    """
+
+    def __init__(self, process_batch, window_ms=DEFAULT_WINDOW_MS,
+                 max_batch_size=DEFAULT_MAX_BATCH_SIZE, metrics=None):
+        """
+        Args:
+            process_batch: Função lista de consultas -> lista de resultados,
+                na mesma ordem
+            window_ms: Janela para juntar consultas sob carga
+            max_batch_size: Quantidade máxima de consultas por lote
+            metrics: Metrics que recebe as métricas da fila e dos lotes
+        """
+        self.process_batch = process_batch
+        self.window = window_ms / 1000.0
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._last_batch_size = 0
+        self._closed = False
+
+        if metrics is not None:
+            metrics.set_buckets('batch_size', BATCH_SIZE_BUCKETS)
+            metrics.add_collector(lambda: {'batch_queue_depth': self._queue.qsize()})
+
+        self._thread = threading.Thread(target=self._run, name='micro-batch', daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        """
+        Enfileira uma consulta
+
+        Returns:
+            Future com o resultado da consulta
+        """
+        if self._closed:
+            raise RuntimeError('Agendador encerrado')
+
+        future = Future()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def submit_async(self, item):
+        """Como submit, mas devolve um awaitable do asyncio"""
+        return asyncio.wrap_future(self.submit(item))
+
+    def __call__(self, item, timeout=None):
+        """Executa a consulta no próximo lote e espera o resultado"""
+        return self.submit(item).result(timeout)
+
+    def close(self):
+        """Executa as consultas já enfileiradas e encerra a thread"""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(_STOP)
+            self._thread.join()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = self._collect()
+            if batch:
+                self._dispatch(batch)
+
+    def _collect(self):
+        """
+        Próximo lote: a primeira consulta da fila e as que chegarem até o
+        fim da janela (ou já estiverem na fila, sem carga)
+
+        Returns:
+            Tupla (lote, se o agendador foi encerrado)
+        """
+        entry = self._queue.get()
+        if entry is _STOP:
+            return [], True
+
+        batch = [entry]
+        deadline = time.perf_counter() + self.window if self._last_batch_size > 1 else None
+        while len(batch) < self.max_batch_size:
+            try:
+                remaining = deadline - time.perf_counter() if deadline is not None else 0.0
+                if remaining > 0:
+                    entry = self._queue.get(timeout=remaining)
+                else:
+                    entry = self._queue.get_nowait()
+            except queue.Empty:
+                break
+
+            if entry is _STOP:
+                return batch, True
+            batch.append(entry)
+
+        return batch, False
+
+    def _dispatch(self, batch):
+        """Executa o lote e entrega os resultados aos Futures"""
+        now = time.perf_counter()
+        active = []
+        for item, future, enqueued in batch:
+            # Futures cancelados pelo chamador não entram no lote
+            if future.set_running_or_notify_cancel():
+                active.append((item, future))
+                if self.metrics is not None:
+                    self.metrics.observe('batch_queue_wait_seconds', now - enqueued)
+
+        if not active:
+            return
+
+        if self.metrics is not None:
+            self.metrics.inc('batches_total')
+            self.metrics.observe('batch_size', len(active))
+        self._last_batch_size = len(active)
+
+        try:
+            results = self.process_batch([item for item, _ in active])
+            if len(results) != len(active):
+                raise ValueError(f'Lote com {len(active)} consultas retornou {len(results)} resultados')
+        except Exception as e:
+            for _, future in active:
+                future.set_exception(e)
+            return
+
+        for (_, future), result in zip(active, results):
+            future.set_result(result)
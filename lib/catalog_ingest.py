@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Inclusão incremental de filmes no catálogo, sem retreinar os modelos
+
+Os filmes novos são vetorizados e atribuídos aos clusters dos modelos
+existentes em lote (uma chamada ao vetorizador e uma predição por método),
+acrescentados ao fim de system.movies e da matriz TF-IDF, e só as entradas
+afetadas do índice de clusters e das análises são recalculadas.
+
+Opcionalmente os centroides são atualizados como no partial_fit do
+MiniBatchKMeans (os filmes já no catálogo mantêm seus clusters) e as linhas
+novas são acrescentadas ao CSV do dataset, sem reescrevê-lo.
+
+Uso (acrescenta ao CSV; servidores em execução pegam a mudança com
+{"command": "reload"}):
+    python3 lib/catalog_ingest.py novos_filmes.jsonl [--update-centroids]
+"""
+
+import sys
+import os
+import json
+import time
+import hashlib
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from movie_store import MovieStore, UNASSIGNED_CLUSTER
+from result_cache import file_fingerprint
+
+# Modelo KMeans de cada método: (coluna de cluster, preditor, estimador)
+CLUSTER_MODELS = {
+    'tfidf': ('cluster_tfidf', 'tfidf_predictor', 'kmeans_tfidf'),
+    'all_features': ('cluster_all', 'all_predictor', 'kmeans_all')
+}
+
+# Filmes por chamada a ingest_movies na linha de comando
+DEFAULT_BATCH_SIZE = 1000
+
+def _to_int(value):
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def prepare_movies(system, movies):
+    """
+    Normaliza os filmes recebidos em um DataFrame no formato do CSV
+
+    Filmes sem sinopse são descartados; filmes sem rank recebem ranks
+    seguintes ao maior do catálogo.
+
+    Returns:
+        Tupla (DataFrame, quantidade de filmes descartados)
+    """
+    import pandas as pd
+
+    next_rank = int(system.movies.rank.max()) + 1 if len(system.movies) else 1
+
+    rows = []
+    skipped = 0
+    for movie in movies:
+        # Campos vazios (ex.: vindos de CSV) contam como ausentes
+        movie = {key: value for key, value in movie.items() if value not in (None, '')}
+
+        sinopse = str(movie.get('sinopse', '')).strip()
+        rank = _to_int(movie.get('rank', movie.get('id')))
+        if not sinopse:
+            skipped += 1
+            continue
+
+        if rank is None:
+            rank = next_rank
+        next_rank = max(next_rank, rank + 1)
+
+        movie.update({
+            'rank': rank,
+            'sinopse': sinopse,
+            'sinopse_clean': system.preprocess_text(sinopse)
+        })
+        rows.append(movie)
+
+    frame = pd.DataFrame(rows)
+    for column in ('year', 'rating'):
+        if column in frame.columns:
+            frame[column] = pd.to_numeric(frame[column], errors='coerce')
+
+    return frame, skipped
+
+def assign_clusters(system, frame, new_movies):
+    """
+    Atribui os clusters dos dois modelos aos filmes novos, em lote
+
+    Returns:
+        Tupla (matriz TF-IDF dos filmes, {método: (entrada do modelo,
+        clusters)}); filmes que o modelo não consegue atribuir ficam com
+        UNASSIGNED_CLUSTER e sem entrada
+    """
+    X_tfidf = system.vectorize_synopses(frame['sinopse_clean'].tolist())
+    assignments = {'tfidf': (X_tfidf, system.tfidf_predictor.predict(X_tfidf)[0])}
+
+    synopses = frame['sinopse'].tolist()
+    queries = [
+        (synopses[row], float(new_movies.year[row]), float(new_movies.rating[row]), new_movies.genre(row))
+        for row in range(len(new_movies))
+    ]
+    try:
+        X_all = system.all_features_rows(queries)
+        assignments['all_features'] = (X_all, system.all_predictor.predict(X_all)[0])
+    except ValueError as e:
+        print(f"⚠️ Filmes sem cluster do modelo com todas as features: {str(e)}", file=sys.stderr)
+        assignments['all_features'] = (None, np.full(len(frame), UNASSIGNED_CLUSTER))
+
+    return X_tfidf, assignments
+
+def append_to_csv(system, frame, new_movies):
+    """
+    Acrescenta os filmes ao fim do CSV do dataset (uma única escrita, sem
+    reescrever as linhas existentes)
+
+    Colunas derivadas (year_norm, rating_norm, genre_encoded) usam os
+    mínimos e máximos do catálogo carregado.
+    """
+    import pandas as pd
+
+    path = system.dataset_path
+    columns = pd.read_csv(path, sep=';', nrows=0).columns
+    movies = system.movies
+
+    rows = frame.copy()
+    rows['id'] = rows['rank']
+    rows['year'] = new_movies.year
+    rows['rating'] = new_movies.rating
+    rows['genre'] = [new_movies.genre(row) for row in range(len(new_movies))]
+    for column, values in new_movies.clusters.items():
+        rows[column] = values
+    rows['cluster'] = rows['cluster_tfidf']
+
+    for column, current in (('year', movies.year), ('rating', movies.rating)):
+        low, high = float(current.min()), float(current.max())
+        rows[f'{column}_norm'] = (rows[column] - low) / (high - low) if high > low else 0.0
+    rows['genre_encoded'] = [system.genre_codes.get(genre, 0) for genre in rows['genre']]
+
+    text = rows.reindex(columns=columns).to_csv(sep=';', header=False, index=False)
+
+    with open(path, 'rb+') as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() > 0:
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b'\n':
+                text = '\n' + text
+        f.write(text.encode('utf-8'))
+
+def refresh_indexes(system, touched):
+    """
+    Recalcula o catálogo ordenado e as entradas (método, cluster) afetadas
+    do índice de clusters e das análises
+    """
+    from ml_model_trained import CLUSTER_COLUMNS
+
+    movies = system.movies
+    system.build_catalog_index()
+
+    for method, cluster in touched:
+        column = CLUSTER_COLUMNS[method]
+        positions = np.flatnonzero(movies.clusters[column] == cluster)
+        ordered = movies.rating_order(positions)
+        system.cluster_index[(method, cluster)] = {
+            'positions': ordered,
+            'tfidf': system.tfidf_matrix[ordered]
+        }
+        system._cluster_analysis_cache[(column, cluster)] = system._analyze_cluster(cluster, positions)
+
+def partial_fit_centroids(system, assignments, counts):
+    """
+    Atualiza os centroides dos modelos com os filmes novos (partial_fit)
+
+    Returns:
+        Lista dos métodos cujos centroides foram atualizados
+    """
+    updated = []
+    for method, (X, clusters) in assignments.items():
+        if X is None:
+            continue
+
+        _, predictor_name, estimator_name = CLUSTER_MODELS[method]
+        predictor = getattr(system, predictor_name)
+        predictor.partial_fit(X, clusters, counts[method])
+
+        # O estimador (usado por ann_index.py e compact_model.py) segue os preditores
+        getattr(system, estimator_name).cluster_centers_ = predictor.centers64.copy()
+        updated.append(method)
+
+    if updated:
+        # Clusters das consultas em cache foram preditos com os centroides antigos
+        system.query_cache.clear()
+    return updated
+
+def save_cluster_models(system, methods):
+    """
+    Grava os KMeans com centroides atualizados (escrita atômica)
+    """
+    import joblib
+
+    for method in methods:
+        estimator_name = CLUSTER_MODELS[method][2]
+        path = system.model_files[estimator_name]
+        tmp_path = path + '.tmp'
+        joblib.dump(getattr(system, estimator_name), tmp_path)
+        os.replace(tmp_path, path)
+
+def ingest_movies(system, movies, update_centroids=False, append_csv=False):
+    """
+    Inclui filmes novos no catálogo carregado
+
+    Args:
+        system: MovieRecommendationSystem com modelos carregados
+        movies: Filmes (dicts no formato do CSV/API; 'sinopse' obrigatória)
+        update_centroids: Atualiza os centroides com os filmes novos (só
+            em memória; ver save_cluster_models)
+        append_csv: Acrescenta os filmes ao CSV do dataset
+
+    Returns:
+        Resumo com filmes incluídos e descartados, clusters atribuídos e
+        tempo gasto
+    """
+    if not system.models_loaded:
+        raise RuntimeError('Modelos não carregados')
+    if append_csv and system.featurizer == 'hashing':
+        # cluster_tfidf do CSV é o do KMeans TF-IDF, não o do modo hashing
+        raise ValueError('append_csv não é suportado no modo hashing')
+
+    start = time.perf_counter()
+    with system.metrics.stage('ingest'):
+        frame, skipped = prepare_movies(system, movies)
+        summary = {
+            'added': len(frame),
+            'skipped': skipped,
+            'clusters': {},
+            'centroids_updated': [],
+            'csv_appended': False
+        }
+        if not len(frame):
+            summary['elapsed_ms'] = (time.perf_counter() - start) * 1000
+            return summary
+
+        new_movies = MovieStore.from_dataframe(frame, cluster_columns=())
+        X_tfidf, assignments = assign_clusters(system, frame, new_movies)
+        new_movies.clusters = {
+            CLUSTER_MODELS[method][0]: clusters.astype(np.int32)
+            for method, (_, clusters) in assignments.items()
+            if CLUSTER_MODELS[method][0] in system.movies.clusters
+        }
+
+        # Filmes já representados por cada centroide (antes da inclusão)
+        counts = {
+            method: np.bincount(
+                system.movies.clusters[column][system.movies.clusters[column] != UNASSIGNED_CLUSTER],
+                minlength=getattr(system, predictor_name).n_clusters
+            ).astype(np.float64)
+            for method, (column, predictor_name, _) in CLUSTER_MODELS.items()
+            if column in system.movies.clusters
+        }
+
+        # O CSV é gravado antes de alterar o estado em memória
+        if append_csv:
+            append_to_csv(system, frame, new_movies)
+            summary['csv_appended'] = True
+
+        import scipy.sparse as sp
+        system.movies.extend(new_movies)
+        system.tfidf_matrix = sp.vstack([system.tfidf_matrix, X_tfidf], format='csr')
+
+        touched = set()
+        for method, (_, clusters) in assignments.items():
+            if CLUSTER_MODELS[method][0] not in new_movies.clusters:
+                continue
+            assigned = clusters[clusters != UNASSIGNED_CLUSTER]
+            values, sizes = np.unique(assigned, return_counts=True)
+            summary['clusters'][method] = {int(value): int(size) for value, size in zip(values, sizes)}
+            touched.update((method, int(value)) for value in values)
+
+        if update_centroids:
+            summary['centroids_updated'] = partial_fit_centroids(
+                system, {method: assignments[method] for method in counts}, counts
+            )
+
+        refresh_indexes(system, touched)
+
+        # O índice ANN não cobre os filmes novos: busca exata até reconstruí-lo
+        if system.ann_index is not None and system.ann_index.n_rows != len(system.movies):
+            print("ℹ️ Índice ANN desatualizado após a inclusão; usando busca exata "
+                  "(reconstrua com lib/ann_index.py)", file=sys.stderr)
+            system.ann_index = None
+
+        # Nova impressão digital: respostas em cache não valem mais
+        if append_csv:
+            system.files_fingerprint = file_fingerprint(system.fingerprint_paths())
+            system.dataset_fingerprint = system.files_fingerprint
+            system.result_cache.set_manifest(system.manifest_name, system.fingerprint_paths(), system.dataset_fingerprint)
+        else:
+            digest = hashlib.sha1(system.dataset_fingerprint.encode('utf-8'))
+            digest.update(json.dumps([frame['rank'].tolist(), frame['sinopse'].tolist()],
+                                     ensure_ascii=False).encode('utf-8'))
+            system.dataset_fingerprint = digest.hexdigest()
+        system._cluster_analysis_fingerprint = system.dataset_fingerprint
+
+    summary['elapsed_ms'] = (time.perf_counter() - start) * 1000
+    return summary
+
+def iter_batches(movies, batch_size):
+    """Agrupa um iterador de filmes em listas de até batch_size"""
+    batch = []
+    for movie in movies:
+        batch.append(movie)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def main():
+    """Inclui os filmes de um arquivo JSON/JSONL/CSV no dataset"""
+    parser = argparse.ArgumentParser(description='Inclui filmes no catálogo sem retreinar')
+    parser.add_argument('input', help='Filmes novos (.json, .jsonl ou .csv)')
+    parser.add_argument('--update-centroids', action='store_true',
+                        help='Atualiza e grava os centroides (partial_fit)')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                        help='Filmes por lote')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='Atribui os clusters sem gravar o CSV nem os modelos')
+    args = parser.parse_args()
+
+    sys.path.append(str(Path(__file__).parent))
+    from ml_model_trained import movie_system as system
+    from movie_stream import iter_movies
+
+    if not system.models_loaded:
+        print("❌ Modelos não carregados")
+        sys.exit(1)
+
+    totals = {'added': 0, 'skipped': 0, 'elapsed_ms': 0.0}
+    updated = set()
+    for batch in iter_batches(iter_movies(args.input), args.batch_size):
+        summary = ingest_movies(system, batch, update_centroids=args.update_centroids,
+                                append_csv=not args.dry_run)
+        for key in totals:
+            totals[key] += summary[key]
+        updated.update(summary['centroids_updated'])
+        print(f"📥 Lote: {summary['added']} incluídos, {summary['skipped']} descartados "
+              f"({summary['elapsed_ms']:.0f} ms) | clusters: {json.dumps(summary['clusters'])}")
+
+    if updated and not args.dry_run:
+        save_cluster_models(system, sorted(updated))
+        print(f"💾 Centroides atualizados: {', '.join(sorted(updated))}")
+
+    target = 'simulação, nada gravado' if args.dry_run else system.dataset_path
+    print(f"✅ {totals['added']} filmes incluídos ({target}), "
+          f"{totals['skipped']} descartados ({totals['elapsed_ms']:.0f} ms)")
+
+if __name__ == "__main__":
+    main()
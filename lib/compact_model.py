@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+Artefato compacto do sistema de recomendação e inferência leve
+
+O export grava em um único arquivo .npz (sem compressão) tudo o que a
+inferência precisa: vocabulário e pesos IDF do TF-IDF, centroides dos dois
+modelos KMeans, parâmetros do StandardScaler, classes do LabelEncoder,
+tabela de filmes, ordenação por cluster e análises dos clusters.
+
+CompactRecommender carrega esse arquivo com memory-map e responde às
+mesmas consultas de MovieRecommendationSystem usando só NumPy, sem
+importar pandas nem scikit-learn, o que torna a inicialização de novos
+processos muito mais barata.
+
+Uso:
+    python3 lib/compact_model.py [--output models/fiapflix_compact.npz]
+"""
+
+import sys
+import json
+import os
+import re
+import zipfile
+import argparse
+from pathlib import Path
+
+import numpy as np
+
+from instrumentation import Metrics
+from kmeans_inference import CentroidPredictor
+from query_cache import LRUCache, QUERY_CACHE_SIZE, synopsis_key
+from result_cache import (ResultCache, RESULT_CACHE_SIZE, RESULT_CACHE_DIR_ENV,
+                          cached_recommendations, file_fingerprint)
+
+# Caminho padrão do artefato, ao lado dos demais modelos
+COMPACT_MODEL_PATH = 'models/fiapflix_compact.npz'
+
+# Versão do formato do artefato
+COMPACT_FORMAT_VERSION = 1
+
+# Mesma limpeza de MovieRecommendationSystem.preprocess_text
+_SPECIAL_CHARS = re.compile(r'[^a-zA-Záàâãéèêíìîóòôõúùûç\s]')
+
+# Colunas de texto da tabela de filmes
+STRING_COLUMNS = ['title_en', 'title_pt', 'genre', 'sinopse']
+
+def preprocess_text(text):
+    """
+    Pré-processa texto para análise (igual a MovieRecommendationSystem)
+    """
+    if not text or (isinstance(text, float) and text != text):
+        return ""
+
+    text = _SPECIAL_CHARS.sub('', str(text).lower())
+    return ' '.join(text.split())
+
+def encode_strings(values):
+    """
+    Codifica uma lista de strings como um blob UTF-8 e um array de offsets
+
+    A string i fica em data[offsets[i]:offsets[i + 1]].
+    """
+    encoded = [str(value).encode('utf-8') for value in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    offsets[1:] = np.cumsum([len(value) for value in encoded])
+    data = np.frombuffer(b''.join(encoded), dtype=np.uint8)
+    return data, offsets
+
+def decode_string(data, offsets, i):
+    """Decodifica a string i de um blob gerado por encode_strings"""
+    return bytes(data[offsets[i]:offsets[i + 1]]).decode('utf-8')
+
+def load_npz_mmap(path):
+    """
+    Abre um .npz sem compressão com memory-map em cada array
+
+    np.load ignora mmap_mode para arquivos .npz; aqui cada membro do zip é
+    mapeado diretamente a partir do seu offset no arquivo.
+    """
+    arrays = {}
+    with zipfile.ZipFile(path) as archive, open(path, 'rb') as f:
+        for info in archive.infolist():
+            if info.compress_type != zipfile.ZIP_STORED:
+                raise ValueError(f'{info.filename} está comprimido; use np.savez')
+
+            # Cabeçalho local do zip: 30 bytes + nome + campo extra
+            f.seek(info.header_offset)
+            local_header = f.read(30)
+            name_length = int.from_bytes(local_header[26:28], 'little')
+            extra_length = int.from_bytes(local_header[28:30], 'little')
+            f.seek(info.header_offset + 30 + name_length + extra_length)
+
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+
+            name = info.filename[:-4] if info.filename.endswith('.npy') else info.filename
+            if int(np.prod(shape)) == 0:
+                arrays[name] = np.empty(shape, dtype=dtype)
+                continue
+
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode='r', offset=f.tell(), shape=shape,
+                order='F' if fortran_order else 'C'
+            )
+    return arrays
+
+def export_compact_model(system, output_path=COMPACT_MODEL_PATH):
+    """
+    Exporta os modelos e o catálogo carregados em system para o artefato
+
+    Args:
+        system: MovieRecommendationSystem com modelos carregados
+        output_path: Arquivo .npz de saída
+    """
+    vectorizer = system.vectorizer
+    if system.featurizer != 'tfidf':
+        raise ValueError('O artefato compacto é exportado apenas no modo tfidf')
+    if vectorizer.analyzer != 'word' or vectorizer.tokenizer is not None or vectorizer.preprocessor is not None:
+        raise ValueError('Apenas vetorizadores com analyzer word padrão podem ser exportados')
+
+    # Vocabulário ordenado (busca por searchsorted, sem dict)
+    terms = sorted(vectorizer.vocabulary_)
+    term_ids = np.array([vectorizer.vocabulary_[term] for term in terms], dtype=np.int64)
+
+    stop_words = vectorizer.get_stop_words()
+
+    meta = {
+        'format_version': COMPACT_FORMAT_VERSION,
+        'dataset_path': system.dataset_path,
+        'dataset_fingerprint': system.dataset_fingerprint,
+        'vectorizer': {
+            'lowercase': bool(vectorizer.lowercase),
+            'token_pattern': vectorizer.token_pattern,
+            'ngram_range': list(vectorizer.ngram_range),
+            'binary': bool(vectorizer.binary),
+            'sublinear_tf': bool(vectorizer.sublinear_tf),
+            'use_idf': bool(vectorizer.use_idf),
+            'norm': vectorizer.norm,
+            'stop_words': sorted(stop_words) if stop_words else []
+        },
+        'cluster_analysis': {}
+    }
+
+    arrays = {
+        'vocab_terms': np.array(terms, dtype=str),
+        'vocab_ids': term_ids,
+        'idf': np.asarray(vectorizer.idf_, dtype=np.float64),
+        'tfidf_centers': np.ascontiguousarray(system.kmeans_tfidf.cluster_centers_),
+        'all_centers': np.ascontiguousarray(system.kmeans_all.cluster_centers_),
+        'scaler_mean': np.asarray(system.scaler.mean_, dtype=np.float64),
+        'scaler_scale': np.asarray(system.scaler.scale_, dtype=np.float64),
+        'genre_classes': np.array(system.le_genre.classes_, dtype=str)
+    }
+
+    # Tabela de filmes (blobs de texto reaproveitados de system.movies)
+    movies = system.movies
+    arrays['movies_rank'] = movies.rank.astype(np.int64)
+    arrays['movies_year'] = movies.year
+    arrays['movies_rating'] = movies.rating.astype(np.float64)
+    for column in STRING_COLUMNS:
+        if column == 'genre':
+            data, offsets = encode_strings([movies.genre(row) for row in range(len(movies))])
+        else:
+            data, offsets = movies.texts[column]
+        arrays[f'movies_{column}_data'] = data
+        arrays[f'movies_{column}_offsets'] = offsets
+
+    # Matriz TF-IDF do catálogo (CSR)
+    tfidf_matrix = system.tfidf_matrix
+    arrays['catalog_tfidf_data'] = tfidf_matrix.data
+    arrays['catalog_tfidf_indices'] = tfidf_matrix.indices.astype(np.int64)
+    arrays['catalog_tfidf_indptr'] = tfidf_matrix.indptr.astype(np.int64)
+
+    # Ordenação por rating do catálogo e de cada cluster
+    arrays['order_catalog'] = np.asarray(system.catalog_index['positions'], dtype=np.int64)
+    for method in ('tfidf', 'all_features'):
+        clusters = sorted(cluster for (m, cluster) in system.cluster_index if m == method)
+        positions = [system.cluster_index[(method, cluster)]['positions'] for cluster in clusters]
+        arrays[f'order_{method}_clusters'] = np.array(clusters, dtype=np.int64)
+        arrays[f'order_{method}_offsets'] = np.concatenate(
+            [[0], np.cumsum([len(p) for p in positions])]
+        ).astype(np.int64)
+        arrays[f'order_{method}_positions'] = (
+            np.concatenate(positions).astype(np.int64) if positions else np.array([], dtype=np.int64)
+        )
+
+        # Análises dos clusters (já calculadas pelo sistema)
+        meta['cluster_analysis'][method] = {
+            str(cluster): system.get_cluster_analysis(cluster, method) for cluster in clusters
+        }
+
+    arrays['meta_json'] = np.frombuffer(
+        json.dumps(meta, ensure_ascii=False).encode('utf-8'), dtype=np.uint8
+    )
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    # Escrita atômica: grava em arquivo temporário e renomeia
+    tmp_path = output_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **arrays)
+    os.replace(tmp_path, output_path)
+
+class CompactRecommender:
+    """
+    Inferência leve a partir do artefato compacto (somente NumPy)
+
+    Oferece a mesma interface usada por run_recommendation.py:
+    get_recommendations, get_recommendations_cached, get_recommendations_batch,
+    get_cluster_analysis e reload_if_changed.
+    """
+
+    def __init__(self, path=COMPACT_MODEL_PATH, metrics=None):
+        """Inicializa carregando o artefato compacto"""
+        self.path = path
+        self.metrics = metrics if metrics is not None else Metrics.from_env()
+        self.models_loaded = False
+        self.query_cache = LRUCache(QUERY_CACHE_SIZE)
+        self.result_cache = ResultCache(RESULT_CACHE_SIZE, cache_dir=os.environ.get(RESULT_CACHE_DIR_ENV))
+        self.dataset_fingerprint = None
+        self.load()
+
+    def load(self):
+        """Carrega o artefato com memory-map"""
+        try:
+            with self.metrics.stage('load_models'):
+                self._load()
+            self.models_loaded = True
+
+        except Exception as e:
+            print(f"Erro ao carregar artefato compacto: {str(e)}")
+            self.models_loaded = False
+
+    def _load(self):
+        """Etapas de load (artefato, vetorizador, centroides e ordenações)"""
+        arrays = load_npz_mmap(self.path)
+        self.meta = json.loads(bytes(arrays.pop('meta_json')).decode('utf-8'))
+        if self.meta.get('format_version') != COMPACT_FORMAT_VERSION:
+            raise ValueError(f"Versão do artefato não suportada: {self.meta.get('format_version')}")
+
+        self.arrays = arrays
+        self.mtime_ns = os.stat(self.path).st_mtime_ns
+        self.dataset_fingerprint = file_fingerprint([self.path])
+        self.result_cache.set_manifest('compact', [self.path], self.dataset_fingerprint)
+
+        config = self.meta['vectorizer']
+        self.token_pattern = re.compile(config['token_pattern'])
+        self.stop_words = frozenset(config['stop_words'])
+        self.n_features = len(arrays['idf'])
+
+        # Centroides dos dois modelos KMeans
+        self.tfidf_predictor = CentroidPredictor(arrays['tfidf_centers'])
+        self.all_predictor = CentroidPredictor(arrays['all_centers'])
+        self.query_cache.clear()
+
+        # Tabela gênero -> código (equivalente a le_genre.transform)
+        self.genre_codes = {str(genre): code for code, genre in enumerate(arrays['genre_classes'])}
+
+        # Cluster -> fatia da ordenação por rating
+        self.cluster_slices = {}
+        for method in ('tfidf', 'all_features'):
+            clusters = arrays[f'order_{method}_clusters']
+            offsets = arrays[f'order_{method}_offsets']
+            for i, cluster in enumerate(clusters):
+                self.cluster_slices[(method, int(cluster))] = (int(offsets[i]), int(offsets[i + 1]))
+
+        self.n_movies = len(arrays['movies_rank'])
+
+    def reload_if_changed(self):
+        """Recarrega o artefato se o arquivo mudou em disco"""
+        try:
+            if os.stat(self.path).st_mtime_ns == getattr(self, 'mtime_ns', None):
+                return False
+        except OSError:
+            return False
+
+        self.load()
+        return True
+
+    def preprocess_text(self, text):
+        """
+        Pré-processa texto para análise (igual a MovieRecommendationSystem)
+        """
+        return preprocess_text(text)
+
+    def _analyze(self, text):
+        """Tokens e n-gramas como no TfidfVectorizer (analyzer word)"""
+        config = self.meta['vectorizer']
+        if config['lowercase']:
+            text = text.lower()
+
+        tokens = self.token_pattern.findall(text)
+        if self.stop_words:
+            tokens = [token for token in tokens if token not in self.stop_words]
+
+        min_n, max_n = config['ngram_range']
+        if max_n == 1:
+            return tokens
+
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(' '.join(tokens[i:i + n]))
+        return ngrams
+
+    def query_entry(self, synopsis):
+        """
+        Entrada do cache de consultas da sinopse (texto pré-processado,
+        linha TF-IDF e clusters já preditos), calculada na primeira consulta
+        """
+        key = synopsis_key(synopsis)
+        entry = self.query_cache.get(key)
+        if entry is None:
+            with self.metrics.stage('preprocess'):
+                processed_text = self.preprocess_text(synopsis)
+            with self.metrics.stage('vectorize'):
+                tfidf_row = self._vectorize_text(processed_text)
+            entry = {
+                'processed_text': processed_text,
+                'tfidf_row': tfidf_row,
+                'clusters': {}
+            }
+            self.query_cache.put(key, entry)
+        return entry
+
+    def vectorize(self, synopsis):
+        """
+        Vetoriza uma sinopse com o TF-IDF exportado (via cache de consultas)
+
+        Returns:
+            Tupla (índices das features, pesos) da linha TF-IDF esparsa
+        """
+        return self.query_entry(synopsis)['tfidf_row']
+
+    def _vectorize_text(self, processed_text):
+        """Vetoriza um texto já pré-processado"""
+        terms = self._analyze(processed_text)
+        if not terms:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        vocab_terms = self.arrays['vocab_terms']
+        terms = np.array(terms, dtype=str)
+        positions = np.searchsorted(vocab_terms, terms)
+        positions[positions >= len(vocab_terms)] = 0
+        found = vocab_terms[positions] == terms
+
+        feature_ids = self.arrays['vocab_ids'][positions[found]]
+        if len(feature_ids) == 0:
+            return np.array([], dtype=np.int64), np.array([], dtype=np.float64)
+
+        feature_ids, counts = np.unique(feature_ids, return_counts=True)
+
+        config = self.meta['vectorizer']
+        values = counts.astype(np.float64)
+        if config['binary']:
+            values[:] = 1.0
+        if config['sublinear_tf']:
+            values = np.log(values) + 1.0
+        if config['use_idf']:
+            values = values * self.arrays['idf'][feature_ids]
+
+        if config['norm'] == 'l2':
+            norm = np.sqrt(np.dot(values, values))
+        elif config['norm'] == 'l1':
+            norm = np.abs(values).sum()
+        else:
+            norm = 0.0
+        if norm > 0:
+            values = values / norm
+
+        return feature_ids, values
+
+    def predict_cluster_tfidf(self, synopsis):
+        """Prediz cluster usando modelo TF-IDF (Modelo 1)"""
+        if not self.models_loaded:
+            return None, 0.0
+
+        entry = self.query_entry(synopsis)
+        if 'tfidf' not in entry['clusters']:
+            with self.metrics.stage('predict'):
+                entry['clusters']['tfidf'] = self.tfidf_predictor.predict_sparse_row(*entry['tfidf_row'])
+        return entry['clusters']['tfidf']
+
+    def predict_cluster_all_features(self, synopsis, year=None, rating=None, genre=None):
+        """Prediz cluster usando modelo com todas as features (Modelo 2)"""
+        if not self.models_loaded:
+            return None, 0.0
+
+        try:
+            year = 2000 if year is None else year
+            rating = 8.0 if rating is None else rating
+            genre = 'Drama' if genre is None else genre
+
+            entry = self.query_entry(synopsis)
+            key = ('all_features', year, rating, genre)
+            if key in entry['clusters']:
+                return entry['clusters'][key]
+
+            with self.metrics.stage('predict'):
+                word_count = len(synopsis.split()) if synopsis else 10
+                numeric = np.array([year, rating, word_count], dtype=np.float64)
+
+                mean = self.arrays['scaler_mean']
+                scale = self.arrays['scaler_scale']
+                if len(mean) != len(numeric):
+                    raise ValueError(f'X has {len(numeric)} features, but StandardScaler is '
+                                     f'expecting {len(mean)} features as input.')
+
+                x = np.append((numeric - mean) / scale, self.genre_codes.get(genre, 0))
+                entry['clusters'][key] = self.all_predictor.predict_one(x)
+            return entry['clusters'][key]
+
+        except Exception as e:
+            print(f"Erro na predição com todas as features: {str(e)}")
+            return None, 0.0
+
+    def _catalog_scores(self, ids, values):
+        """Similaridade cosseno da consulta com todos os filmes do catálogo"""
+        query = np.zeros(self.n_features)
+        query[ids] = values
+
+        data = self.arrays['catalog_tfidf_data']
+        indices = self.arrays['catalog_tfidf_indices']
+        indptr = self.arrays['catalog_tfidf_indptr']
+
+        products = np.asarray(data) * query[indices]
+        scores = np.zeros(self.n_movies)
+        nonempty = indptr[:-1] < indptr[1:]
+        if products.size:
+            scores[nonempty] = np.add.reduceat(products, indptr[:-1][nonempty])
+
+        # Arredondado como em MovieRecommendationSystem._rank_by_similarity
+        return np.round(scores, 12)
+
+    def _top_by_score(self, positions, scores, n):
+        """Top n posições por similaridade (empates mantêm a ordem dada)"""
+        n = min(n, len(positions))
+        if n <= 0:
+            return positions[:0], scores[:0]
+
+        candidate_scores = scores[positions]
+        top = np.argpartition(-candidate_scores, n - 1)[:n]
+        top = top[np.lexsort((top, -candidate_scores[top]))]
+        return positions[top], candidate_scores[top]
+
+    def movie_to_api_dict(self, position, cluster):
+        """Converte um filme da tabela para o formato da API"""
+        arrays = self.arrays
+
+        def text(column):
+            return decode_string(arrays[f'movies_{column}_data'], arrays[f'movies_{column}_offsets'], position)
+
+        rank = int(arrays['movies_rank'][position])
+        return {
+            'id': str(rank),
+            'rank': rank,
+            'title_en': text('title_en'),
+            'title_pt': text('title_pt'),
+            'year': int(arrays['movies_year'][position]),
+            'rating': float(arrays['movies_rating'][position]),
+            'genre': text('genre'),
+            'sinopse': text('sinopse'),
+            'director': 'Diretor não informado',
+            'cast': 'Elenco não informado',
+            'duration': '120 min',
+            'cluster': int(cluster),
+            'poster_url': f'https://image.tmdb.org/t/p/w500/placeholder.jpg',
+            'backdrop_url': f'https://image.tmdb.org/t/p/w1280/placeholder.jpg'
+        }
+
+    def get_recommendations(self, synopsis, method='tfidf', year=None, rating=None, genre=None,
+                            n_recommendations=5, ranking='rating'):
+        """
+        Obtém recomendações baseadas na sinopse (mesmo formato de
+        MovieRecommendationSystem.get_recommendations)
+        """
+        error_response = {
+            'recommendations': [],
+            'cluster': None,
+            'confidence': 0.0,
+            'method': method
+        }
+
+        if not self.models_loaded:
+            return dict(error_response, error='Modelos não carregados')
+
+        if method in ('hybrid', 'ann'):
+            # O artefato não leva o índice IVF nem os dois modelos do
+            # 'hybrid': responder aqui daria resultados diferentes dos do
+            # backend completo
+            return dict(error_response, error=f'Método {method} não disponível no artefato compacto')
+
+        try:
+            ids, values = self.vectorize(synopsis)
+
+            if method == 'tfidf':
+                cluster, confidence = self.predict_cluster_tfidf(synopsis)
+            else:
+                cluster, confidence = self.predict_cluster_all_features(synopsis, year, rating, genre)
+
+            if cluster is None:
+                return dict(error_response, error='Erro na predição do cluster')
+
+            with self.metrics.stage('select'):
+                if (method, cluster) in self.cluster_slices:
+                    start, end = self.cluster_slices[(method, cluster)]
+                    positions = self.arrays[f'order_{method}_positions'][start:end]
+                else:
+                    # Fallback: usar todos os filmes
+                    positions = self.arrays['order_catalog'][:]
+
+                if ranking == 'similarity':
+                    selected, scores = self._top_by_score(
+                        np.asarray(positions), self._catalog_scores(ids, values), n_recommendations
+                    )
+                    selected = list(zip(selected, (float(score) for score in scores)))
+                else:
+                    selected = [(position, None) for position in positions[:n_recommendations]]
+
+                recommendations = []
+                for position, similarity in selected:
+                    api_movie = self.movie_to_api_dict(position, cluster)
+                    if similarity is not None:
+                        api_movie['similarity'] = similarity
+                    recommendations.append(api_movie)
+
+            response = {
+                'recommendations': recommendations,
+                'cluster': int(cluster),
+                'confidence': float(confidence),
+                'method': method,
+                'cluster_size': len(positions),
+                'total_movies': self.n_movies
+            }
+            if ranking == 'similarity':
+                response['ranking'] = 'similarity'
+            return response
+
+        except Exception as e:
+            print(f"Erro ao obter recomendações: {str(e)}")
+            return dict(error_response, error=str(e))
+
+    def get_recommendations_cached(self, synopsis, method='tfidf', year=None, rating=None, genre=None,
+                                   n_recommendations=5, ranking='rating'):
+        """get_recommendations com cache de resultados (ver result_cache.py)"""
+        return cached_recommendations(self, synopsis, method, year, rating, genre,
+                                      n_recommendations, ranking)
+
+    def get_recommendations_batch(self, queries, n_recommendations=5):
+        """Obtém recomendações para várias consultas, na mesma ordem"""
+        return [
+            self.get_recommendations(
+                query.get('synopsis', ''), query.get('method', 'tfidf'),
+                query.get('year'), query.get('rating'), query.get('genre'),
+                query.get('n_recommendations', n_recommendations),
+                query.get('ranking', 'rating')
+            )
+            for query in queries
+        ]
+
+    def get_cluster_analysis(self, cluster_id, method='tfidf'):
+        """Obtém a análise (pré-calculada no export) de um cluster"""
+        if not self.models_loaded:
+            return None
+
+        with self.metrics.stage('cluster_analysis'):
+            analysis = self.meta['cluster_analysis'].get(method, {}).get(str(int(cluster_id)))
+            return json.loads(json.dumps(analysis)) if analysis is not None else None
+
+def main():
+    """Exporta o artefato compacto a partir dos modelos atuais"""
+    parser = argparse.ArgumentParser(description='Exporta o artefato compacto de inferência')
+    parser.add_argument('--output', default=COMPACT_MODEL_PATH, help='Arquivo .npz de saída')
+    args = parser.parse_args()
+
+    sys.path.append(str(Path(__file__).parent))
+    from ml_model_trained import movie_system as system
+
+    if not system.models_loaded:
+        print("❌ Modelos não carregados")
+        sys.exit(1)
+
+    export_compact_model(system, args.output)
+
+    size_kb = os.path.getsize(args.output) / 1024
+    print(f"✅ Artefato compacto salvo em {args.output} ({size_kb:.1f} KB)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Cache persistente de sinopses enriquecidas
+
+Cada resultado da API é guardado em um banco sqlite sob o hash do
+conteúdo que o gerou (título, ano, gênero, sinopse original, estilo,
+modelo e versão do template do prompt). Reexecutar o enriquecimento do
+catálogo só chama a API para filmes novos ou alterados.
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Union
+
+# Verificação do limite de tamanho a cada N gravações
+PRUNE_EVERY = 100
+
+def enhancement_key(title: str, year: int, genre: str, original_synopsis: str,
+                    style: str, model: str, prompt_version: Union[int, str]) -> str:
+    """
+    Chave de conteúdo de uma sinopse enriquecida (sha256); prompt_version
+    distingue também o template (um filme ou lote) que a gerou
+    """
+    payload = json.dumps(
+        [title, year, genre, original_synopsis, style, model, prompt_version],
+        ensure_ascii=False, default=str
+    )
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class EnhancementCache:
+    """
+    Resultados de enriquecimento em sqlite, com expiração (TTL), limite de
+    tamanho (remove os menos usados) e contadores de acerto
+    """
+
+    def __init__(self, path: str,
+                 ttl: Optional[float] = None,
+                 max_entries: Optional[int] = None):
+        """
+        Args:
+            path: Arquivo sqlite do cache
+            ttl: Validade das entradas em segundos (None: sem expiração)
+            max_entries: Quantidade máxima de entradas (None: sem limite)
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.evictions = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+
+        self._conn = sqlite3.connect(path, timeout=5.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS enhancements ('
+                'key TEXT PRIMARY KEY, value TEXT, created REAL, accessed REAL)'
+            )
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Resultado guardado ou None (entradas expiradas são removidas)"""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                'SELECT value, created FROM enhancements WHERE key = ?', (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            if self.ttl is not None and now - row[1] > self.ttl:
+                self._conn.execute('DELETE FROM enhancements WHERE key = ?', (key,))
+                self.expired += 1
+                self.misses += 1
+                return None
+
+            self._conn.execute('UPDATE enhancements SET accessed = ? WHERE key = ?', (now, key))
+            self.hits += 1
+
+        return json.loads(row[0])
+
+    def put(self, key: str, result: Dict):
+        """Guarda um resultado"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO enhancements (key, value, created, accessed) VALUES (?, ?, ?, ?)',
+                (key, json.dumps(result, ensure_ascii=False), now, now)
+            )
+
+            self._puts += 1
+            if self._puts % PRUNE_EVERY == 0:
+                self._prune(now)
+
+    def prune(self):
+        """Remove entradas expiradas e as menos usadas acima do limite"""
+        with self._lock, self._conn:
+            self._prune(time.time())
+
+    def _prune(self, now: float):
+        if self.ttl is not None:
+            cursor = self._conn.execute('DELETE FROM enhancements WHERE created < ?', (now - self.ttl,))
+            self.expired += cursor.rowcount
+
+        if self.max_entries is not None:
+            cursor = self._conn.execute(
+                'DELETE FROM enhancements WHERE key IN ('
+                'SELECT key FROM enhancements ORDER BY accessed DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,)
+            )
+            self.evictions += cursor.rowcount
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM enhancements').fetchone()[0]
+
+    def stats(self) -> Dict:
+        """Contadores do cache"""
+        lookups = self.hits + self.misses
+        return {
+            'path': self.path,
+            'size': len(self),
+            'hits': self.hits,
+            'misses': self.misses,
+            'expired': self.expired,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
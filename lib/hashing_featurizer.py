@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""
+Featurização por hashing das sinopses (alternativa ao TF-IDF pickled)
+
+O tfidf_vectorizer.pkl guarda o vocabulário como um dict de strings (e
+stop_words_), que domina o tempo de unpickle e a memória residente à medida
+que o vocabulário cresce. HashingFeaturizer leva cada termo (mesmos tokens
+e n-gramas do TfidfVectorizer) a uma de n_features colunas por
+zlib.crc32 e pondera as contagens por um array de IDF por coluna, ajustado
+no catálogo: o featurizador inteiro são poucos arrays numéricos, e memória
+e tempo de carga dependem só de n_features, não do vocabulário.
+
+As linhas não são as do TfidfVectorizer: não há vocabulário, então
+max_features não se aplica (todos os termos entram, não só os mais
+frequentes), termos que colidem somam na mesma coluna e max_df zera
+colunas, não termos. Configurações que o hashing não reproduz (stop_words,
+strip_accents, min_df, ...) são recusadas por from_vectorizer_params. A
+comparação de main mede só a concordância dos clusters do catálogo (ARI),
+não a igualdade das features.
+
+Como o espaço de features muda, o modo hashing usa um KMeans próprio
+(models/kmeans_hashing.pkl, treinado por train_models.py --hashing) e
+recalcula os clusters do catálogo na carga. Para usá-lo na inferência:
+FIAPFLIX_FEATURIZER=hashing ou run_recommendation.py --featurizer hashing.
+
+Uso (concordância dos clusters com o TF-IDF atual, ARI):
+    python3 lib/hashing_featurizer.py [--n-features 16384] [--fit] [--save]
+"""
+
+import sys
+import os
+import re
+import json
+import time
+import zlib
+import argparse
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+
+# Variável de ambiente que escolhe o featurizador da inferência
+FEATURIZER_ENV = 'FIAPFLIX_FEATURIZER'
+
+# Featurizadores aceitos
+FEATURIZERS = ('tfidf', 'hashing')
+
+# Artefatos do modo hashing, ao lado dos demais modelos
+HASHING_FEATURIZER_PATH = 'models/hashing_featurizer.npz'
+HASHING_KMEANS_PATH = 'models/kmeans_hashing.pkl'
+
+# Quantidade padrão de colunas (potência de 2)
+DEFAULT_N_FEATURES = 1 << 14
+
+# Mesmo padrão de tokens do TfidfVectorizer
+DEFAULT_TOKEN_PATTERN = r'(?u)\b\w\w+\b'
+
+def featurizer_from_env():
+    """Featurizador pedido em FIAPFLIX_FEATURIZER ('tfidf' por padrão)"""
+    featurizer = os.environ.get(FEATURIZER_ENV, '') or 'tfidf'
+    if featurizer not in FEATURIZERS:
+        raise ValueError(f'{FEATURIZER_ENV} deve ser um de {", ".join(FEATURIZERS)}')
+    return featurizer
+
+class HashingFeaturizer:
+    """
+    TF-IDF com colunas por hashing (zlib.crc32) e IDF por coluna
+
+    transform tem a mesma interface do TfidfVectorizer (lista de textos ->
+    matriz CSR com linhas normalizadas L2).
+    """
+
+    def __init__(self, n_features=DEFAULT_N_FEATURES, ngram_range=(1, 2), max_df=1.0,
+                 sublinear_tf=False, lowercase=True, token_pattern=DEFAULT_TOKEN_PATTERN, idf=None):
+        """
+        Args:
+            n_features: Quantidade de colunas
+            ngram_range: Faixa de n-gramas, como no TfidfVectorizer
+            max_df: Colunas presentes em mais que essa fração dos documentos
+                do ajuste são zeradas (como termos descartados por max_df)
+            sublinear_tf: Usa 1 + log(tf)
+            idf: IDF de cada coluna (definido por fit)
+        """
+        self.n_features = int(n_features)
+        self.ngram_range = tuple(ngram_range)
+        self.max_df = max_df
+        self.sublinear_tf = sublinear_tf
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self._token_re = re.compile(token_pattern)
+        self.idf = idf
+
+    @classmethod
+    def from_vectorizer_params(cls, params, n_features=DEFAULT_N_FEATURES):
+        """
+        Featurizador com a configuração de um TfidfVectorizer (get_params)
+
+        max_features é ignorado (o hashing não tem vocabulário a limitar).
+
+        Raises:
+            ValueError: Configurações que o hashing não reproduz
+        """
+        expected = {
+            'analyzer': 'word', 'tokenizer': None, 'preprocessor': None, 'stop_words': None,
+            'strip_accents': None, 'vocabulary': None, 'binary': False, 'use_idf': True,
+            'smooth_idf': True, 'norm': 'l2'
+        }
+        unsupported = [f'{name}={params[name]!r}' for name, value in expected.items()
+                       if name in params and params[name] != value]
+        if params.get('min_df', 1) not in (1, 1.0):
+            unsupported.append(f"min_df={params['min_df']!r}")
+        max_df = params.get('max_df', 1.0)
+        if not isinstance(max_df, float) or not 0.0 < max_df <= 1.0:
+            unsupported.append(f'max_df={max_df!r} (só frações)')
+        if unsupported:
+            raise ValueError(f'Configurações do vetorizador sem equivalente no hashing: {", ".join(unsupported)}')
+
+        return cls(n_features, params.get('ngram_range', (1, 1)), max_df, params.get('sublinear_tf', False),
+                   params.get('lowercase', True), params.get('token_pattern', DEFAULT_TOKEN_PATTERN))
+
+    def _analyze(self, text):
+        """Tokens e n-gramas como no TfidfVectorizer (analyzer word)"""
+        if self.lowercase:
+            text = text.lower()
+        tokens = self._token_re.findall(text)
+
+        min_n, max_n = self.ngram_range
+        if max_n == 1:
+            return tokens
+
+        ngrams = list(tokens) if min_n == 1 else []
+        for n in range(max(min_n, 2), min(max_n, len(tokens)) + 1):
+            for i in range(len(tokens) - n + 1):
+                ngrams.append(' '.join(tokens[i:i + n]))
+        return ngrams
+
+    def _term_counts(self, texts):
+        """
+        Contagens (documento, coluna) dos termos dos textos, em uma única
+        passada vetorizada
+
+        Returns:
+            Tupla (quantidade de textos, linhas, colunas, contagens), com os
+            pares ordenados por linha e coluna
+        """
+        crc32 = zlib.crc32
+        hashes = []
+        lengths = []
+        for text in texts:
+            terms = self._analyze(text)
+            hashes.extend(crc32(term.encode('utf-8')) for term in terms)
+            lengths.append(len(terms))
+
+        n_texts = len(lengths)
+        rows = np.repeat(np.arange(n_texts, dtype=np.int64), lengths)
+        keys = rows * self.n_features + np.array(hashes, dtype=np.int64) % self.n_features
+        keys, counts = np.unique(keys, return_counts=True)
+        return n_texts, keys // self.n_features, keys % self.n_features, counts
+
+    def fit(self, texts):
+        """Ajusta o IDF de cada coluna (suavizado, como no TfidfVectorizer)"""
+        n_documents, _, columns, _ = self._term_counts(texts)
+        document_frequency = np.bincount(columns, minlength=self.n_features)
+
+        self.idf = np.log((1.0 + n_documents) / (1.0 + document_frequency)) + 1.0
+        if self.max_df < 1.0:
+            self.idf[document_frequency > self.max_df * n_documents] = 0.0
+        return self
+
+    def fit_transform(self, texts):
+        texts = list(texts)
+        return self.fit(texts).transform(texts)
+
+    def transform(self, texts):
+        """Matriz CSR (n_textos, n_features) com linhas normalizadas L2"""
+        import scipy.sparse as sp
+
+        n_texts, rows, columns, counts = self._term_counts(texts)
+        values = counts.astype(np.float64)
+        if self.sublinear_tf:
+            values = np.log(values) + 1.0
+        values *= self.idf[columns]
+
+        keep = values != 0
+        rows, columns, values = rows[keep], columns[keep], values[keep]
+
+        norms = np.sqrt(np.bincount(rows, weights=values * values, minlength=n_texts))
+        values /= norms[rows]
+
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=n_texts))])
+        return sp.csr_matrix((values, columns, indptr), shape=(n_texts, self.n_features))
+
+    def save(self, path):
+        """Grava o featurizador em .npz (escrita atômica)"""
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            np.savez(
+                f,
+                idf=self.idf,
+                config=np.array([self.n_features, self.ngram_range[0], self.ngram_range[1],
+                                 int(self.sublinear_tf), int(self.lowercase)], dtype=np.int64),
+                max_df=np.array([self.max_df], dtype=np.float64),
+                token_pattern=np.frombuffer(self.token_pattern.encode('utf-8'), dtype=np.uint8)
+            )
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            n_features, min_n, max_n, sublinear_tf, lowercase = arrays['config'].tolist()
+            return cls(
+                n_features=n_features,
+                ngram_range=(min_n, max_n),
+                max_df=float(arrays['max_df'][0]),
+                sublinear_tf=bool(sublinear_tf),
+                lowercase=bool(lowercase),
+                token_pattern=arrays['token_pattern'].tobytes().decode('utf-8'),
+                idf=np.array(arrays['idf'])
+            )
+
+def measure_load(load):
+    """Tempo (s) e pico de memória alocada (bytes) de uma carga"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        load()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return elapsed, peak
+
+def cluster_agreement(system, featurizer, kmeans):
+    """
+    Concordância entre os clusters do catálogo pelo TF-IDF atual e pelo
+    modo hashing
+
+    Returns:
+        Dict com o ARI (adjusted_rand_score) e os tamanhos dos clusters
+    """
+    from sklearn.metrics import adjusted_rand_score
+    from kmeans_inference import CentroidPredictor
+    from train_models import catalog_texts
+
+    import pandas as pd
+    df = pd.read_csv(system.dataset_path, sep=';')
+
+    tfidf_labels, _ = system.tfidf_predictor.predict(system.tfidf_matrix)
+    hashing_labels, _ = CentroidPredictor.from_estimator(kmeans).predict(
+        featurizer.transform(catalog_texts(df))
+    )
+
+    return {
+        'adjusted_rand_index': float(adjusted_rand_score(tfidf_labels, hashing_labels)),
+        'tfidf_cluster_sizes': np.bincount(tfidf_labels).tolist(),
+        'hashing_cluster_sizes': np.bincount(hashing_labels).tolist()
+    }
+
+def main():
+    """Compara o modo hashing com o TF-IDF atual (clusters, memória e carga)"""
+    parser = argparse.ArgumentParser(description='Concordância do modo hashing com o TF-IDF atual')
+    parser.add_argument('--n-features', type=int, default=DEFAULT_N_FEATURES, help='Colunas do hashing')
+    parser.add_argument('--fit', action='store_true',
+                        help='Ajusta featurizador e KMeans no catálogo em vez de carregar os salvos')
+    parser.add_argument('--save', action='store_true', help='Grava o que foi ajustado com --fit')
+    args = parser.parse_args()
+
+    sys.path.append(str(Path(__file__).parent))
+    import joblib
+    from ml_model_trained import MODEL_FILES, movie_system as system
+    from train_models import catalog_texts, DEFAULT_N_INIT, RANDOM_STATE
+
+    if not system.models_loaded:
+        print("❌ Modelos não carregados")
+        sys.exit(1)
+
+    if args.fit or not os.path.exists(HASHING_FEATURIZER_PATH):
+        import pandas as pd
+        from sklearn.cluster import KMeans
+
+        try:
+            featurizer = HashingFeaturizer.from_vectorizer_params(system.vectorizer.get_params(), args.n_features)
+        except ValueError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        X = featurizer.fit_transform(catalog_texts(pd.read_csv(system.dataset_path, sep=';')))
+        kmeans = KMeans(n_clusters=system.kmeans_tfidf.n_clusters, n_init=DEFAULT_N_INIT,
+                        random_state=RANDOM_STATE).fit(X)
+        if args.save:
+            featurizer.save(HASHING_FEATURIZER_PATH)
+            joblib.dump(kmeans, HASHING_KMEANS_PATH + '.tmp')
+            os.replace(HASHING_KMEANS_PATH + '.tmp', HASHING_KMEANS_PATH)
+    else:
+        featurizer = HashingFeaturizer.load(HASHING_FEATURIZER_PATH)
+        kmeans = joblib.load(HASHING_KMEANS_PATH)
+
+    report = cluster_agreement(system, featurizer, kmeans)
+
+    tfidf_time, tfidf_peak = measure_load(lambda: joblib.load(MODEL_FILES['vectorizer']))
+    report['tfidf_vectorizer'] = {
+        'vocabulary_size': len(system.vectorizer.vocabulary_),
+        'file_bytes': os.path.getsize(MODEL_FILES['vectorizer']),
+        'load_s': tfidf_time,
+        'load_peak_bytes': tfidf_peak
+    }
+    report['hashing_featurizer'] = {'n_features': featurizer.n_features}
+    if system.vectorizer.max_features is not None:
+        # Diferença esperada: o hashing mantém todos os termos
+        report['hashing_featurizer']['ignored_max_features'] = system.vectorizer.max_features
+    if os.path.exists(HASHING_FEATURIZER_PATH):
+        hashing_time, hashing_peak = measure_load(lambda: HashingFeaturizer.load(HASHING_FEATURIZER_PATH))
+        report['hashing_featurizer'].update({
+            'file_bytes': os.path.getsize(HASHING_FEATURIZER_PATH),
+            'load_s': hashing_time,
+            'load_peak_bytes': hashing_peak
+        })
+
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+if __name__ == "__main__":
+    main()
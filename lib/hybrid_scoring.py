@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Ranking híbrido: os dois modelos KMeans e a similaridade por filme
+
+O método 'hybrid' pontua todos os filmes do catálogo, para um lote de
+consultas de uma só vez, pela soma ponderada de:
+
+    tfidf         afinidade da consulta com o cluster TF-IDF do filme
+    all_features  afinidade da consulta com o cluster do filme no modelo
+                  com todas as features
+    similarity    similaridade cosseno TF-IDF entre a consulta e o filme
+
+A afinidade com um cluster é 1 / (1 + distância ao centroide), a mesma
+escala da confiança da predição; as distâncias a todos os centroides saem
+da mesma passada que prediz o cluster (CentroidPredictor.predict_distances)
+e são levadas aos filmes por indexação do cluster de cada filme. Filmes sem
+cluster (UNASSIGNED_CLUSTER) têm afinidade 0.
+
+Os pesos padrão podem ser trocados por FIAPFLIX_HYBRID_WEIGHTS (ou
+run_recommendation.py --hybrid-weights), no formato
+"tfidf=0.3,all_features=0.2,similarity=0.5"; componentes omitidos valem 0.
+"""
+
+import os
+
+import numpy as np
+
+# Variável de ambiente com os pesos do método 'hybrid'
+HYBRID_WEIGHTS_ENV = 'FIAPFLIX_HYBRID_WEIGHTS'
+
+# Pesos padrão de cada componente
+DEFAULT_HYBRID_WEIGHTS = {
+    'tfidf': 0.3,
+    'all_features': 0.2,
+    'similarity': 0.5
+}
+
+# Células calculadas de uma vez: consultas x filmes (scores) e consultas x
+# colunas (consultas densas na similaridade)
+MAX_BLOCK_CELLS = 1 << 22
+
+def parse_weights(value):
+    """
+    Pesos a partir de "componente=peso,..." (componentes omitidos valem 0)
+
+    Raises:
+        ValueError: Componente desconhecido, peso negativo ou todos zero
+    """
+    weights = dict.fromkeys(DEFAULT_HYBRID_WEIGHTS, 0.0)
+    for item in value.split(','):
+        if not item.strip():
+            continue
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in weights:
+            raise ValueError(f'Componente desconhecido: {name} (use {", ".join(DEFAULT_HYBRID_WEIGHTS)})')
+        weights[name] = float(weight)
+
+    if any(weight < 0 for weight in weights.values()) or not any(weights.values()):
+        raise ValueError('Os pesos devem ser não negativos e ao menos um positivo')
+    return weights
+
+def format_weights(weights):
+    """Pesos no formato de parse_weights (ordem fixa, usado em chaves de cache)"""
+    return ','.join(f'{name}={weights[name]:g}' for name in DEFAULT_HYBRID_WEIGHTS)
+
+def weights_from_env():
+    """Pesos de FIAPFLIX_HYBRID_WEIGHTS ou os padrão"""
+    value = os.environ.get(HYBRID_WEIGHTS_ENV, '')
+    return parse_weights(value) if value.strip() else dict(DEFAULT_HYBRID_WEIGHTS)
+
+def cluster_affinities(distances):
+    """
+    Afinidade 1 / (1 + distância) de cada consulta a cada centroide, com
+    uma coluna final 0 (indexada pelo cluster -1 dos filmes sem cluster)
+    """
+    affinities = np.zeros((distances.shape[0], distances.shape[1] + 1))
+    affinities[:, :-1] = 1.0 / (1.0 + distances)
+    return affinities
+
+def blend_scores(weights, similarity, affinities, movie_clusters):
+    """
+    Scores (consultas x filmes) do método 'hybrid'
+
+    Args:
+        weights: Peso de cada componente
+        similarity: Similaridade cosseno (consultas x filmes)
+        affinities: {componente: cluster_affinities da consulta}; modelos
+            indisponíveis ficam de fora
+        movie_clusters: {componente: cluster de cada filme, mesma ordem das
+            colunas de similarity}
+    """
+    scores = weights['similarity'] * similarity
+    for name, affinity in affinities.items():
+        if weights[name]:
+            scores += weights[name] * affinity[:, movie_clusters[name]]
+    return scores
+
+def top_scores(scores, n):
+    """
+    Os n maiores scores de cada linha, melhores primeiro (empates pela
+    ordem das colunas)
+
+    Returns:
+        Lista de tuplas (colunas, scores), uma por linha
+    """
+    # Arredondado para que empates não dependam da ordem de soma
+    scores = np.round(scores, 12)
+    n = min(n, scores.shape[1])
+    if n <= 0:
+        return [(np.array([], dtype=int), row[:0]) for row in scores]
+
+    ranked = []
+    for row in scores:
+        # Todos os empatados com o n-ésimo maior entram antes do corte,
+        # para que o desempate seja sempre pela ordem das colunas
+        threshold = -np.partition(-row, n - 1)[n - 1]
+        top = np.flatnonzero(row >= threshold)
+        top = top[np.lexsort((top, -row[top]))][:n]
+        ranked.append((top, row[top]))
+    return ranked
+
+def block_rows(n_columns):
+    """Consultas por bloco para limitar matrizes de n_columns colunas a MAX_BLOCK_CELLS"""
+    return max(1, MAX_BLOCK_CELLS // max(1, n_columns))
@@ -0,0 +1,443 @@
+#!/usr/bin/env python3
+"""
+Instrumentação opcional dos caminhos críticos
+
+Metrics mede cada estágio de uma recomendação (carga dos modelos,
+pré-processamento, vetorização, predição, seleção dos filmes, análise do
+cluster, serialização) em histogramas, conta requisições e erros e exporta
+tudo no formato texto do Prometheus. Fica desligada por padrão
+(FIAPFLIX_METRICS=1 ou --metrics em run_recommendation.py liga): sem ela,
+stage() devolve um contexto vazio e não mede nada.
+
+Independentemente das métricas, uma requisição pode pedir o detalhamento
+dos próprios tempos (collect_timings) e um perfil de CPU (cProfile) ou de
+memória (tracemalloc) com profile_request.
+"""
+
+import cProfile
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Variável de ambiente que liga as métricas
+METRICS_ENV = 'FIAPFLIX_METRICS'
+
+# Prefixo dos nomes exportados para o Prometheus
+METRICS_PREFIX = 'fiapflix'
+
+# Content-Type do formato texto do Prometheus
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Limites (em segundos) dos buckets dos histogramas de duração
+DEFAULT_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Modos de perfil aceitos por profile_request
+PROFILE_MODES = ('cpu', 'memory')
+
+# Quantidade de funções/linhas no resumo de um perfil
+PROFILE_TOP = 15
+
+# Descrição das métricas conhecidas (# HELP)
+METRIC_HELP = {
+    'stage_duration_seconds': 'Duração de cada estágio do processamento',
+    'stage_errors_total': 'Estágios interrompidos por exceção',
+    'requests_total': 'Consultas de recomendação recebidas, por método',
+    'request_errors_total': 'Consultas de recomendação com erro, por método',
+    'batches_total': 'Lotes executados pelo agendador de micro-lotes',
+    'batch_size': 'Consultas por lote do agendador de micro-lotes',
+    'batch_queue_wait_seconds': 'Espera de cada consulta na fila do agendador',
+    'batch_queue_depth': 'Consultas aguardando na fila do agendador'
+}
+
+class _RequestState(threading.local):
+    """Tempos da requisição em andamento (collect_timings), por thread"""
+    timings = None
+
+_local = _RequestState()
+
+class RequestTimings:
+    """Tempos acumulados por estágio de uma requisição"""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.end = None
+        self.stages = {}
+        self.calls = {}
+
+    def add(self, stage, seconds):
+        self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def as_dict(self):
+        """Bloco 'timings' da resposta (ms)"""
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            'total_ms': (end - self.start) * 1000,
+            'stages_ms': {stage: seconds * 1000 for stage, seconds in self.stages.items()},
+            'stage_calls': dict(self.calls)
+        }
+
+class _Stage:
+    """Contexto que mede um estágio (ver Metrics.stage)"""
+
+    __slots__ = ('metrics', 'name', 'timings', 'start')
+
+    def __init__(self, metrics, name, timings):
+        self.metrics = metrics
+        self.name = name
+        self.timings = timings
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.start
+        if self.timings is not None:
+            self.timings.add(self.name, elapsed)
+        if self.metrics.enabled:
+            self.metrics.observe('stage_duration_seconds', elapsed, stage=self.name)
+            if exc_type is not None:
+                self.metrics.inc('stage_errors_total', stage=self.name)
+        return False
+
+class _NullStage:
+    """Contexto vazio usado com as métricas desligadas"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_STAGE = _NullStage()
+
+class Histogram:
+    """Histograma cumulativo no modelo do Prometheus"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self):
+        """Contagens acumuladas por bucket (le), sem o +Inf"""
+        total = 0
+        cumulative = []
+        for count in self.counts:
+            total += count
+            cumulative.append(total)
+        return cumulative
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _escape_label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _format_labels(label_key, extra=()):
+    pairs = list(label_key) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Metrics:
+    """
+    Contadores e histogramas com rótulos, thread-safe
+
+    Os nomes são exportados com o prefixo METRICS_PREFIX. Coletores
+    (add_collector) fornecem valores instantâneos (gauges), como os
+    contadores dos caches, calculados só na exportação.
+    """
+
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        """
+        Args:
+            enabled: Liga a coleta (desligada, stage/inc/observe não fazem nada)
+            buckets: Limites dos histogramas, em segundos (ver set_buckets)
+        """
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._metric_buckets = {}
+        self._counters = {}
+        self._histograms = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Métricas ligadas se FIAPFLIX_METRICS=1"""
+        return cls(enabled=os.environ.get(METRICS_ENV, '') not in ('', '0'))
+
+    def stage(self, name):
+        """
+        Contexto que mede um estágio: alimenta o histograma
+        stage_duration_seconds e, se houver, os tempos da requisição em
+        andamento (collect_timings)
+        """
+        timings = _local.timings
+        if not self.enabled and timings is None:
+            return _NULL_STAGE
+        return _Stage(self, name, timings)
+
+    def inc(self, name, value=1, **labels):
+        """Incrementa um contador"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set_buckets(self, name, buckets):
+        """
+        Limites próprios para o histograma name, que deixa de ser tratado
+        como duração (ex.: tamanho de lote)
+        """
+        self._metric_buckets[name] = tuple(buckets)
+
+    def observe(self, name, value, **labels):
+        """Registra uma observação em um histograma"""
+        if not self.enabled:
+            return
+        key = (name, _label_key(labels))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                buckets = self._metric_buckets.get(name, self.buckets)
+                histogram = self._histograms[key] = Histogram(buckets)
+            histogram.observe(value)
+
+    def add_collector(self, collector):
+        """
+        Registra uma função sem argumentos que retorna {nome: valor},
+        exportados como gauges
+        """
+        self._collectors.append(collector)
+
+    def _collect_gauges(self):
+        gauges = {}
+        for collector in self._collectors:
+            try:
+                gauges.update(collector())
+            except Exception as e:
+                print(f"Erro em coletor de métricas: {str(e)}")
+        return gauges
+
+    def snapshot(self):
+        """Contadores e resumo dos histogramas como dict (comando stats)"""
+        with self._lock:
+            counters = {
+                name + _format_labels(labels): value
+                for (name, labels), value in self._counters.items()
+            }
+            histograms = {
+                name + _format_labels(labels): self._summary(name, histogram)
+                for (name, labels), histogram in self._histograms.items()
+            }
+        return {
+            'enabled': self.enabled,
+            'counters': counters,
+            'histograms': histograms,
+            'gauges': self._collect_gauges()
+        }
+
+    def _summary(self, name, histogram):
+        """Resumo de um histograma (durações em ms)"""
+        mean = histogram.sum / histogram.count if histogram.count else 0.0
+        if name in self._metric_buckets:
+            return {'count': histogram.count, 'sum': histogram.sum, 'mean': mean}
+        return {'count': histogram.count, 'sum_ms': histogram.sum * 1000, 'mean_ms': mean * 1000}
+
+    def to_prometheus(self):
+        """Exporta as métricas no formato texto do Prometheus"""
+        lines = []
+
+        def header(name, kind):
+            full_name = f'{METRICS_PREFIX}_{name}'
+            lines.append(f'# HELP {full_name} {METRIC_HELP.get(name, name)}')
+            lines.append(f'# TYPE {full_name} {kind}')
+            return full_name
+
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(
+                ((key, histogram.buckets, histogram.cumulative_counts(), histogram.sum, histogram.count)
+                 for key, histogram in self._histograms.items()),
+                key=lambda item: item[0]
+            )
+
+        current = None
+        for (name, labels), value in counters:
+            if name != current:
+                full_name = header(name, 'counter')
+                current = name
+            lines.append(f'{full_name}{_format_labels(labels)} {_format_value(value)}')
+
+        current = None
+        for (name, labels), buckets, cumulative, total, count in histograms:
+            if name != current:
+                full_name = header(name, 'histogram')
+                current = name
+            for bound, bucket_count in zip(buckets, cumulative):
+                lines.append(f'{full_name}_bucket{_format_labels(labels, [("le", _format_value(bound))])} {bucket_count}')
+            lines.append(f'{full_name}_bucket{_format_labels(labels, [("le", "+Inf")])} {count}')
+            lines.append(f'{full_name}_sum{_format_labels(labels)} {_format_value(total)}')
+            lines.append(f'{full_name}_count{_format_labels(labels)} {count}')
+
+        for name, value in sorted(self._collect_gauges().items()):
+            full_name = header(name, 'gauge')
+            lines.append(f'{full_name} {_format_value(value)}')
+
+        return '\n'.join(lines) + '\n'
+
+@contextmanager
+def collect_timings():
+    """
+    Coleta os tempos por estágio da requisição em andamento (na thread
+    atual), mesmo com as métricas desligadas
+
+    Uso:
+        with collect_timings() as timings:
+            ...
+        timings.as_dict()
+    """
+    previous = _local.timings
+    timings = RequestTimings()
+    _local.timings = timings
+    try:
+        yield timings
+    finally:
+        timings.end = time.perf_counter()
+        _local.timings = previous
+
+def _cpu_profile_summary(profiler):
+    stats = pstats.Stats(profiler)
+    rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+    return {
+        'mode': 'cpu',
+        'total_ms': stats.total_tt * 1000,
+        'top': [
+            {
+                'function': f'{os.path.basename(filename)}:{line}({function})',
+                'calls': calls,
+                'total_ms': total_time * 1000,
+                'cumulative_ms': cumulative_time * 1000
+            }
+            for (filename, line, function), (_, calls, total_time, cumulative_time, _) in rows[:PROFILE_TOP]
+        ]
+    }
+
+def _memory_profile_summary(snapshot, current, peak):
+    stats = snapshot.statistics('lineno')
+    return {
+        'mode': 'memory',
+        'current_kb': current / 1024,
+        'peak_kb': peak / 1024,
+        'top': [
+            {
+                'location': f'{os.path.basename(stat.traceback[0].filename)}:{stat.traceback[0].lineno}',
+                'size_kb': stat.size / 1024,
+                'count': stat.count
+            }
+            for stat in stats[:PROFILE_TOP]
+        ]
+    }
+
+@contextmanager
+def profile_request(mode):
+    """
+    Perfila o bloco: 'cpu' (cProfile, funções com maior tempo acumulado)
+    ou 'memory' (tracemalloc, linhas que mais alocaram). O dict devolvido
+    é preenchido ao sair do bloco; com mode None nada é medido.
+
+    O tracemalloc é global: alocações de outras threads no mesmo período
+    também aparecem no resumo.
+    """
+    result = {}
+    if not mode:
+        yield result
+        return
+
+    if mode not in PROFILE_MODES:
+        result['error'] = f'Modo de perfil desconhecido: {mode} (use {", ".join(PROFILE_MODES)})'
+        yield result
+        return
+
+    if mode == 'cpu':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield result
+        finally:
+            profiler.disable()
+            result.update(_cpu_profile_summary(profiler))
+        return
+
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    try:
+        yield result
+    finally:
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__)
+        ])
+        if started:
+            tracemalloc.stop()
+        result.update(_memory_profile_summary(snapshot, current, peak))
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    """GET /metrics no formato texto do Prometheus"""
+
+    metrics = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+
+        body = self.metrics.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', PROMETHEUS_CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+def start_metrics_server(metrics, port, host='127.0.0.1'):
+    """
+    Expõe GET /metrics em uma thread daemon do processo atual
+
+    Returns:
+        O servidor HTTP (server.server_port tem a porta, útil com port=0)
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
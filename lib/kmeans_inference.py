@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Inferência de KMeans em NumPy puro
+
+CentroidPredictor guarda os centroides como arrays float32 contíguos e
+calcula distâncias, cluster mais próximo e confiança em uma única passada
+vetorizada, para uma ou várias linhas, sem a validação de entrada do
+scikit-learn (que domina o custo em entradas de uma linha).
+
+Linhas ambíguas (dois centroides quase à mesma distância) são recalculadas
+em float64, para que os clusters sejam os mesmos do modelo pickled.
+
+Uso (verifica a concordância com os modelos pickled no catálogo):
+    python3 lib/kmeans_inference.py
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# Diferença relativa entre as duas menores distâncias abaixo da qual a
+# linha é recalculada em float64
+AMBIGUITY_TOLERANCE = 1e-4
+
+class CentroidPredictor:
+    """
+    Atribuição de clusters por centroide mais próximo (distância euclidiana)
+    """
+
+    def __init__(self, centers):
+        """
+        Args:
+            centers: Matriz (n_clusters, n_features) de centroides
+        """
+        self._set_centers(centers)
+
+    def _set_centers(self, centers):
+        self.centers64 = np.ascontiguousarray(centers, dtype=np.float64)
+        self.centers = np.ascontiguousarray(centers, dtype=np.float32)
+        self.centers_sq = np.einsum('ij,ij->i', self.centers, self.centers)
+        self.centers64_sq = np.einsum('ij,ij->i', self.centers64, self.centers64)
+
+    @classmethod
+    def from_estimator(cls, estimator):
+        """Cria o preditor a partir de um KMeans treinado"""
+        return cls(estimator.cluster_centers_)
+
+    @property
+    def n_clusters(self):
+        return self.centers.shape[0]
+
+    @property
+    def n_features(self):
+        return self.centers.shape[1]
+
+    def _squared_distances(self, X, row_sq, centers, centers_sq):
+        """||x||² - 2 x·c + ||c||² para todas as linhas e centroides"""
+        dots = np.asarray(X @ centers.T)
+        return np.maximum(row_sq[:, None] - 2.0 * dots + centers_sq[None, :], 0.0)
+
+    def predict(self, X):
+        """
+        Prediz clusters para várias linhas
+
+        Args:
+            X: Matriz densa (n, n_features) ou matriz esparsa do scipy
+
+        Returns:
+            Tupla (clusters, confidences), com confiança 1 / (1 + distância)
+        """
+        clusters, confidences, _ = self.predict_distances(X)
+        return clusters, confidences
+
+    def predict_distances(self, X):
+        """
+        Como predict, mas devolvendo também as distâncias de cada linha a
+        todos os centroides (mesma passada)
+
+        Returns:
+            Tupla (clusters, confidences, distâncias (n, n_clusters))
+        """
+        if hasattr(X, 'multiply'):
+            row_sq = np.asarray(X.multiply(X).sum(axis=1)).ravel()
+        else:
+            X = np.asarray(X)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+            row_sq = np.einsum('ij,ij->i', X, X)
+
+        if X.shape[1] != self.n_features:
+            raise ValueError(f'X has {X.shape[1]} features, but the model is '
+                             f'expecting {self.n_features} features as input.')
+
+        distances_sq = self._squared_distances(X, row_sq, self.centers, self.centers_sq)
+
+        if self.n_clusters > 1:
+            # Linhas ambíguas: recalcular em float64
+            nearest_two = np.partition(distances_sq, 1, axis=1)[:, :2]
+            ambiguous = (nearest_two[:, 1] - nearest_two[:, 0]) <= AMBIGUITY_TOLERANCE * (nearest_two[:, 1] + 1e-12)
+            if ambiguous.any():
+                rows = np.flatnonzero(ambiguous)
+                distances_sq = distances_sq.astype(np.float64)
+                distances_sq[rows] = self._squared_distances(
+                    X[rows], row_sq[rows], self.centers64, self.centers64_sq
+                )
+
+        clusters = np.argmin(distances_sq, axis=1)
+        distances = np.sqrt(distances_sq)
+        confidences = 1.0 / (1.0 + distances[np.arange(len(clusters)), clusters])
+
+        return clusters, confidences.astype(np.float64), distances
+
+    def partial_fit(self, X, clusters, counts):
+        """
+        Atualiza os centroides com um lote de linhas já atribuídas, como o
+        partial_fit do MiniBatchKMeans: cada centroide passa a ser a média
+        entre ele (com peso counts) e as linhas do lote atribuídas a ele
+
+        Args:
+            X: Linhas do lote (densa ou esparsa do scipy)
+            clusters: Cluster de cada linha
+            counts: Quantidade de linhas já representadas por centroide
+                (atualizado in place)
+        """
+        clusters = np.asarray(clusters)
+        batch_counts = np.bincount(clusters, minlength=self.n_clusters)
+        centers = self.centers64.copy()
+
+        for cluster in np.flatnonzero(batch_counts):
+            batch_sum = np.asarray(X[clusters == cluster].sum(axis=0)).ravel()
+            total = counts[cluster] + batch_counts[cluster]
+            centers[cluster] = (centers[cluster] * counts[cluster] + batch_sum) / total
+
+        counts += batch_counts
+        self._set_centers(centers)
+
+    def predict_one(self, x):
+        """Prediz o cluster de uma única linha densa"""
+        clusters, confidences = self.predict(np.asarray(x).reshape(1, -1))
+        return int(clusters[0]), float(confidences[0])
+
+    def predict_sparse_row(self, feature_ids, values):
+        """
+        Prediz o cluster de uma única linha esparsa dada por
+        (índices das features, pesos), sem montar o vetor denso
+        """
+        values = np.asarray(values, dtype=np.float64)
+        x_sq = np.dot(values, values)
+
+        dots = self.centers[:, feature_ids] @ values.astype(np.float32)
+        distances_sq = np.maximum(self.centers_sq - 2.0 * dots + x_sq, 0.0)
+
+        if self.n_clusters > 1:
+            nearest_two = np.partition(distances_sq, 1)[:2]
+            if nearest_two[1] - nearest_two[0] <= AMBIGUITY_TOLERANCE * (nearest_two[1] + 1e-12):
+                dots = self.centers64[:, feature_ids] @ values
+                distances_sq = np.maximum(self.centers64_sq - 2.0 * dots + x_sq, 0.0)
+
+        cluster = int(np.argmin(distances_sq))
+        return cluster, float(1.0 / (1.0 + np.sqrt(distances_sq[cluster])))
+
+def check_agreement(estimator, X):
+    """
+    Fração de linhas em que CentroidPredictor e o estimador concordam
+    """
+    clusters, _ = CentroidPredictor.from_estimator(estimator).predict(X)
+    return float(np.mean(clusters == estimator.predict(X)))
+
+def main():
+    """Verifica a concordância com os modelos pickled no catálogo"""
+    sys.path.append(str(Path(__file__).parent))
+    from ml_model_trained import movie_system as system
+
+    if not system.models_loaded:
+        print("❌ Modelos não carregados")
+        sys.exit(1)
+
+    agreement = check_agreement(system.kmeans_tfidf, system.tfidf_matrix)
+    print(f"🎯 Concordância TF-IDF no catálogo: {agreement:.2%}")
+
+if __name__ == "__main__":
+    main()
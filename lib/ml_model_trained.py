@@ -4,30 +4,103 @@ Sistema de Recomendação de Filmes usando Modelos Treinados
 Baseado no Notebook2_Modelo_Comparacao_Features.ipynb
 """
 
-import pandas as pd
 import numpy as np
-import joblib
 import os
-from pathlib import Path
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+import sys
+import copy
 import re
 
+from ann_index import AnnIndex, ANN_INDEX_DIR, index_paths, source_fingerprint
+from hashing_featurizer import (HashingFeaturizer, HASHING_FEATURIZER_PATH, HASHING_KMEANS_PATH,
+                                featurizer_from_env)
+from hybrid_scoring import (block_rows, blend_scores, cluster_affinities, top_scores,
+                            weights_from_env)
+from instrumentation import Metrics
+from kmeans_inference import CentroidPredictor
+from movie_store import MovieStore
+from query_cache import LRUCache, QUERY_CACHE_SIZE, synopsis_key
+from result_cache import (ResultCache, RESULT_CACHE_SIZE, RESULT_CACHE_DIR_ENV,
+                          cached_recommendations, file_fingerprint)
+
+# Coluna do dataset com o cluster atribuído por cada método
+CLUSTER_COLUMNS = {
+    'tfidf': 'cluster_tfidf',
+    'all_features': 'cluster_all'
+}
+
+# Arquivos dos modelos treinados
+MODEL_FILES = {
+    'kmeans_tfidf': 'models/kmeans_tfidf.pkl',
+    'vectorizer': 'models/tfidf_vectorizer.pkl',
+    'kmeans_all': 'models/kmeans_all_features.pkl',
+    'scaler': 'models/standard_scaler.pkl',
+    'le_genre': 'models/label_encoder_genre.pkl'
+}
+
+# Arquivos que substituem os do TF-IDF no modo hashing (ver hashing_featurizer.py)
+HASHING_MODEL_FILES = {
+    'kmeans_tfidf': HASHING_KMEANS_PATH,
+    'vectorizer': HASHING_FEATURIZER_PATH
+}
+
+# Datasets com clusters, em ordem de preferência
+DATASET_FILES = [
+    'imdb_100plus_with_clusters.csv',
+    'imdb_real_with_clusters.csv',
+    'imdb_50plus_with_clusters.csv',
+    'imdb_top250_with_clusters.csv'
+]
+
 class MovieRecommendationSystem:
     """
     Sistema de recomendação de filmes usando modelos treinados
     """
     
-    def __init__(self):
-        """Inicializa o sistema carregando os modelos treinados"""
+    def __init__(self, dataset_path=None, metrics=None, featurizer=None, hybrid_weights=None):
+        """
+        Inicializa o sistema carregando os modelos treinados
+        
+        Args:
+            dataset_path: CSV do catálogo (padrão: primeiro de DATASET_FILES
+                disponível)
+            metrics: Métricas dos estágios (padrão: ligadas só com
+                FIAPFLIX_METRICS=1, ver instrumentation.py)
+            featurizer: 'tfidf' (vetorizador treinado) ou 'hashing'
+                (padrão: FIAPFLIX_FEATURIZER, ver hashing_featurizer.py)
+            hybrid_weights: Pesos do método 'hybrid' (padrão:
+                FIAPFLIX_HYBRID_WEIGHTS, ver hybrid_scoring.py)
+        """
+        self.dataset_files = [dataset_path] if dataset_path else DATASET_FILES
+        self.featurizer = featurizer or featurizer_from_env()
+        self.model_files = dict(MODEL_FILES)
+        if self.featurizer == 'hashing':
+            self.model_files.update(HASHING_MODEL_FILES)
+        self.hybrid_weights = hybrid_weights or weights_from_env()
+        # Manifesto do cache de resultados (modelos diferentes por modo)
+        self.manifest_name = 'full' if self.featurizer == 'tfidf' else self.featurizer
+        self.metrics = metrics if metrics is not None else Metrics.from_env()
         self.models_loaded = False
-        self.df_movies = None
+        self.movies = None
         self.kmeans_tfidf = None
         self.vectorizer = None
         self.kmeans_all = None
         self.scaler = None
         self.le_genre = None
+        self.tfidf_predictor = None
+        self.all_predictor = None
+        self.all_features_error = None
+        self.genre_codes = {}
+        self.cluster_index = {}
+        self.catalog_index = None
+        self.tfidf_matrix = None
+        self.ann_index = None
+        self.query_cache = LRUCache(QUERY_CACHE_SIZE)
+        self.result_cache = ResultCache(RESULT_CACHE_SIZE, cache_dir=os.environ.get(RESULT_CACHE_DIR_ENV))
+        self.dataset_path = None
+        self.dataset_fingerprint = None
+        self.files_fingerprint = None
+        self._cluster_analysis_cache = {}
+        self._cluster_analysis_fingerprint = None
         
         # Carregar modelos
         self.load_models()
@@ -35,35 +108,121 @@ class MovieRecommendationSystem:
     def load_models(self):
         """Carrega os modelos treinados"""
         try:
+            with self.metrics.stage('load_models'):
+                self._load_models()
+            self.models_loaded = True
+            
+        except Exception as e:
+            self.models_loaded = False
+    
+    def _load_models(self):
+        """Etapas de load_models, cada uma medida como um estágio"""
+        # Imports pesados só quando os modelos são de fato carregados
+        # (o joblib importa os módulos do scikit-learn ao deserializar)
+        import joblib
+        import pandas as pd
+        
+        with self.metrics.stage('load_model_files'):
             # Carregar modelos
-            self.kmeans_tfidf = joblib.load('models/kmeans_tfidf.pkl')
-            self.vectorizer = joblib.load('models/tfidf_vectorizer.pkl')
-            self.kmeans_all = joblib.load('models/kmeans_all_features.pkl')
-            self.scaler = joblib.load('models/standard_scaler.pkl')
-            self.le_genre = joblib.load('models/label_encoder_genre.pkl')
+            self.kmeans_tfidf = joblib.load(self.model_files['kmeans_tfidf'])
+            if self.featurizer == 'hashing':
+                self.vectorizer = HashingFeaturizer.load(self.model_files['vectorizer'])
+            else:
+                self.vectorizer = joblib.load(self.model_files['vectorizer'])
+            self.kmeans_all = joblib.load(self.model_files['kmeans_all'])
+            self.scaler = joblib.load(self.model_files['scaler'])
+            self.le_genre = joblib.load(self.model_files['le_genre'])
             
-            # Carregar dataset
-            try:
-                self.df_movies = pd.read_csv('imdb_100plus_with_clusters.csv', sep=';')
-            except:
+            # Centroides em NumPy para a predição (sem o overhead do sklearn)
+            self.tfidf_predictor = CentroidPredictor.from_estimator(self.kmeans_tfidf)
+            self.all_predictor = CentroidPredictor.from_estimator(self.kmeans_all)
+            
+            # Linhas TF-IDF e clusters em cache dependem dos modelos
+            self.query_cache.clear()
+            
+            # Tabela gênero -> código (equivalente a le_genre.transform)
+            self.genre_codes = {genre: code for code, genre in enumerate(self.le_genre.classes_)}
+            
+            # Modelo 2 incompatível com as features da inferência: avisado uma
+            # vez aqui, e o método 'hybrid' o deixa de fora
+            self.all_features_error = self.check_all_features_model()
+            if self.all_features_error:
+                print(f"⚠️ Modelo com todas as features indisponível ({self.all_features_error}); "
+                      f"o método 'hybrid' usa só tfidf e similaridade", file=sys.stderr)
+        
+        with self.metrics.stage('load_dataset'):
+            # Carregar dataset (primeiro arquivo disponível)
+            for dataset_path in self.dataset_files:
                 try:
-                    self.df_movies = pd.read_csv('imdb_real_with_clusters.csv', sep=';')
-                except:
-                    try:
-                        self.df_movies = pd.read_csv('imdb_50plus_with_clusters.csv', sep=';')
-                    except:
-                        self.df_movies = pd.read_csv('imdb_top250_with_clusters.csv', sep=';')
+                    df_movies = pd.read_csv(dataset_path, sep=';')
+                    self.dataset_path = dataset_path
+                    break
+                except Exception:
+                    if dataset_path == self.dataset_files[-1]:
+                        raise
             
-            self.models_loaded = True
+            # Impressão digital de dataset + modelos (invalida caches derivados)
+            self.files_fingerprint = file_fingerprint(self.fingerprint_paths())
+            self.dataset_fingerprint = self.files_fingerprint
+            self.result_cache.set_manifest(self.manifest_name, self.fingerprint_paths(), self.dataset_fingerprint)
+        
+        # Matriz TF-IDF do catálogo (ranking por similaridade)
+        with self.metrics.stage('build_tfidf_matrix'):
+            self.build_tfidf_matrix(df_movies)
             
-        except Exception as e:
-            self.models_loaded = False
+            # O cluster_tfidf do CSV vem do KMeans TF-IDF; no modo hashing
+            # os clusters do catálogo são os do KMeans do hashing
+            if self.featurizer == 'hashing':
+                df_movies['cluster_tfidf'], _ = self.tfidf_predictor.predict(self.tfidf_matrix)
+        
+        # Catálogo em colunas (o DataFrame não é mantido em memória)
+        with self.metrics.stage('build_movie_store'):
+            self.movies = MovieStore.from_dataframe(df_movies, tuple(CLUSTER_COLUMNS.values()))
+            del df_movies
+        
+        # Índice por cluster (ordenado por rating)
+        with self.metrics.stage('build_cluster_index'):
+            self.build_cluster_index()
+        
+        # Estatísticas de todos os clusters
+        with self.metrics.stage('build_cluster_analysis'):
+            self.build_cluster_analysis_cache()
+        
+        # Índice ANN (opcional, construído offline por ann_index.py)
+        with self.metrics.stage('load_ann_index'):
+            self.load_ann_index()
+    
+    def fingerprint_paths(self):
+        """
+        Arquivos cuja impressão digital invalida caches (dataset, modelos e
+        índice ANN)
+        """
+        return [self.dataset_path] + list(self.model_files.values()) + index_paths()
+    
+    def reload_if_changed(self):
+        """
+        Recarrega modelos e dataset se os arquivos mudaram em disco
+        
+        Returns:
+            True se houve recarga
+        """
+        if self.dataset_path is None:
+            return False
+        
+        # Comparado com os arquivos carregados (dataset_fingerprint também
+        # muda com filmes incluídos só em memória, ver catalog_ingest.py)
+        current = file_fingerprint(self.fingerprint_paths())
+        if current == self.files_fingerprint:
+            return False
+        
+        self.load_models()
+        return True
     
     def preprocess_text(self, text):
         """
         Pré-processa texto para análise
         """
-        if not text or pd.isna(text):
+        if not text or (isinstance(text, float) and text != text):
             return ""
         
         # Converter para minúsculas
@@ -77,83 +236,235 @@ class MovieRecommendationSystem:
         
         return text
     
+    def vectorize_synopses(self, synopses):
+        """
+        Pré-processa e vetoriza sinopses com o TF-IDF treinado
+        
+        Returns:
+            Matriz esparsa CSR com uma linha (normalizada L2) por sinopse
+        """
+        processed_texts = [self.preprocess_text(synopsis) for synopsis in synopses]
+        return self.vectorizer.transform(processed_texts).tocsr()
+    
+    def query_features(self, synopses, vectorize=True):
+        """
+        Entradas do cache de consultas (query_cache) para cada sinopse
+        
+        Cada entrada guarda o texto pré-processado, a linha TF-IDF e os
+        clusters já preditos ({'tfidf': ..., ('all_features', year, rating,
+        genre): ...}). As entradas que faltam são criadas e, se vectorize,
+        as linhas TF-IDF ausentes são calculadas em uma única chamada ao
+        vetorizador.
+        """
+        entries = []
+        with self.metrics.stage('preprocess'):
+            for synopsis in synopses:
+                key = synopsis_key(synopsis)
+                entry = self.query_cache.get(key)
+                if entry is None:
+                    entry = {
+                        'processed_text': self.preprocess_text(synopsis),
+                        'tfidf_row': None,
+                        'clusters': {}
+                    }
+                    self.query_cache.put(key, entry)
+                entries.append(entry)
+        
+        if vectorize:
+            missing = list({id(entry): entry for entry in entries if entry['tfidf_row'] is None}.values())
+            if missing:
+                with self.metrics.stage('vectorize'):
+                    X = self.vectorizer.transform([entry['processed_text'] for entry in missing]).tocsr()
+                    for row, entry in enumerate(missing):
+                        entry['tfidf_row'] = X[row]
+        
+        return entries
+    
+    def vectorize_queries(self, synopses):
+        """
+        Como vectorize_synopses, mas passando pelo cache de consultas
+        """
+        return self._stack_rows([entry['tfidf_row'] for entry in self.query_features(synopses)])
+    
+    def _stack_rows(self, rows):
+        """Empilha linhas esparsas em uma matriz CSR"""
+        if len(rows) == 1:
+            return rows[0]
+        
+        import scipy.sparse as sp
+        return sp.vstack(rows, format='csr')
+    
     def predict_cluster_tfidf(self, synopsis):
         """
         Prediz cluster usando modelo TF-IDF (Modelo 1)
         """
-        if not self.models_loaded:
+        clusters, confidences = self.predict_clusters_tfidf_batch([synopsis])
+        if clusters is None:
+            return None, 0.0
+        
+        return int(clusters[0]), float(confidences[0])
+    
+    def predict_cluster_all_features(self, synopsis, year=None, rating=None, genre=None):
+        """
+        Prediz cluster usando modelo com todas as features (Modelo 2)
+        """
+        clusters, confidences = self.predict_clusters_all_features_batch([(synopsis, year, rating, genre)])
+        if clusters is None:
             return None, 0.0
         
+        return int(clusters[0]), float(confidences[0])
+    
+    def predict_clusters_tfidf_batch(self, synopses, X=None):
+        """
+        Prediz clusters usando modelo TF-IDF (Modelo 1) para várias sinopses
+        em uma única passada (uma matriz esparsa para todo o lote)
+        
+        Args:
+            synopses: Lista de sinopses
+            X: Matriz TF-IDF já calculada para as sinopses (opcional)
+        
+        Returns:
+            Tupla (clusters, confidences) com um valor por sinopse,
+            ou (None, None) em caso de erro
+        """
+        if not self.models_loaded:
+            return None, None
+        
         try:
-            # Pré-processar texto
-            processed_text = self.preprocess_text(synopsis)
+            entries = self.query_features(synopses, vectorize=X is None)
             
-            # Vetorizar
-            X = self.vectorizer.transform([processed_text])
-            
-            # Predizer cluster
-            cluster = self.kmeans_tfidf.predict(X)[0]
+            # Só as sinopses sem cluster em cache passam pelo KMeans
+            pending = [i for i, entry in enumerate(entries) if 'tfidf' not in entry['clusters']]
+            if pending:
+                if X is None:
+                    X_pending = self._stack_rows([entries[i]['tfidf_row'] for i in pending])
+                else:
+                    X_pending = X[pending]
+                
+                with self.metrics.stage('predict'):
+                    clusters, confidences = self.tfidf_predictor.predict(X_pending)
+                for i, cluster, confidence in zip(pending, clusters, confidences):
+                    entries[i]['clusters']['tfidf'] = (int(cluster), float(confidence))
             
-            # Calcular confiança (distância ao centroide)
-            distances = self.kmeans_tfidf.transform(X)[0]
-            confidence = 1.0 / (1.0 + distances[cluster])
-            
-            return cluster, confidence
+            predictions = [entry['clusters']['tfidf'] for entry in entries]
+            return (np.array([cluster for cluster, _ in predictions], dtype=np.int64),
+                    np.array([confidence for _, confidence in predictions]))
             
         except Exception as e:
-            print(f"Erro na predição TF-IDF: {str(e)}")
-            return None, 0.0
+            print(f"Erro na predição TF-IDF em lote: {str(e)}")
+            return None, None
     
-    def predict_cluster_all_features(self, synopsis, year=None, rating=None, genre=None):
+    def standardize(self, X_numeric):
         """
-        Prediz cluster usando modelo com todas as features (Modelo 2)
+        Equivalente a scaler.transform (StandardScaler) em NumPy puro
         """
-        if not self.models_loaded:
-            return None, 0.0
+        n_expected = len(self.scaler.scale_)
+        if X_numeric.shape[1] != n_expected:
+            raise ValueError(f'X has {X_numeric.shape[1]} features, but StandardScaler is '
+                             f'expecting {n_expected} features as input.')
+        
+        mean = self.scaler.mean_ if self.scaler.with_mean else 0.0
+        scale = self.scaler.scale_ if self.scaler.with_std else 1.0
+        return (X_numeric - mean) / scale
+    
+    def check_all_features_model(self):
+        """
+        Aplica o Modelo 2 a uma consulta de teste
         
+        Returns:
+            Mensagem do erro se o modelo não aceita as features da
+            inferência, None se aceita
+        """
         try:
-            # Valores padrão
-            if year is None:
-                year = 2000
-            if rating is None:
-                rating = 8.0
-            if genre is None:
-                genre = 'Drama'
-            
-            # Contar palavras na sinopse
-            word_count = len(synopsis.split()) if synopsis else 10
-            
-            # Preparar features numéricas
-            numeric_features = np.array([[year, rating, word_count]])
-            X_numeric = self.scaler.transform(numeric_features)
-            
-            # Preparar features categóricas
-            try:
-                genre_encoded = self.le_genre.transform([genre])[0]
-            except:
-                genre_encoded = 0  # Valor padrão
+            self.all_predictor.predict_distances(self.all_features_rows([('', None, None, None)]))
+        except ValueError as e:
+            return str(e)
+        return None
+    
+    def all_features_rows(self, queries):
+        """
+        Matriz de entrada do Modelo 2: ano, rating e quantidade de palavras
+        da sinopse padronizados, mais o código do gênero
+        
+        Args:
+            queries: Lista de tuplas (synopsis, year, rating, genre); valores
+                None usam os padrões (2000, 8.0, 'Drama')
+        """
+        numeric_rows = []
+        genre_codes = []
+        for synopsis, year, rating, genre in queries:
+            year = 2000 if year is None else year
+            rating = 8.0 if rating is None else rating
+            genre = 'Drama' if genre is None else genre
             
-            X_genre = np.array([[genre_encoded]])
+            numeric_rows.append([year, rating, len(synopsis.split()) if synopsis else 10])
+            genre_codes.append(self.genre_codes.get(genre, 0))
+        
+        X_numeric = self.standardize(np.array(numeric_rows, dtype=np.float64))
+        X_genre = np.array(genre_codes, dtype=np.float64).reshape(-1, 1)
+        return np.hstack([X_numeric, X_genre])
+    
+    def predict_clusters_all_features_batch(self, queries):
+        """
+        Prediz clusters usando modelo com todas as features (Modelo 2) para
+        várias consultas em uma única passada
+        
+        Args:
+            queries: Lista de tuplas (synopsis, year, rating, genre)
             
-            # Combinar features
-            X_all = np.hstack([X_numeric, X_genre])
+        Returns:
+            Tupla (clusters, confidences) com um valor por consulta,
+            ou (None, None) em caso de erro
+        """
+        if not self.models_loaded:
+            return None, None
+        
+        try:
+            entries = self.query_features([query[0] for query in queries], vectorize=False)
             
-            # Predizer cluster
-            cluster = self.kmeans_all.predict(X_all)[0]
+            keys = []
+            pending = []
+            pending_queries = []
+            for i, (synopsis, year, rating, genre) in enumerate(queries):
+                year = 2000 if year is None else year
+                rating = 8.0 if rating is None else rating
+                genre = 'Drama' if genre is None else genre
+                
+                key = ('all_features', year, rating, genre)
+                keys.append(key)
+                if key in entries[i]['clusters']:
+                    continue
+                
+                pending.append(i)
+                pending_queries.append((synopsis, year, rating, genre))
             
-            # Calcular confiança
-            distances = self.kmeans_all.transform(X_all)[0]
-            confidence = 1.0 / (1.0 + distances[cluster])
+            if pending:
+                with self.metrics.stage('predict'):
+                    X_all = self.all_features_rows(pending_queries)
+                    clusters, confidences = self.all_predictor.predict(X_all)
+                for i, cluster, confidence in zip(pending, clusters, confidences):
+                    entries[i]['clusters'][keys[i]] = (int(cluster), float(confidence))
             
-            return cluster, confidence
+            predictions = [entry['clusters'][key] for entry, key in zip(entries, keys)]
+            return (np.array([cluster for cluster, _ in predictions], dtype=np.int64),
+                    np.array([confidence for _, confidence in predictions]))
             
         except Exception as e:
-            print(f"Erro na predição com todas as features: {str(e)}")
-            return None, 0.0
+            print(f"Erro na predição com todas as features em lote: {str(e)}")
+            return None, None
     
-    def get_recommendations(self, synopsis, method='tfidf', year=None, rating=None, genre=None, n_recommendations=5):
+    def get_recommendations(self, synopsis, method='tfidf', year=None, rating=None, genre=None,
+                            n_recommendations=5, ranking='rating'):
         """
         Obtém recomendações baseadas na sinopse
+        
+        Args:
+            method: 'tfidf', 'all_features', 'ann' (vizinhos mais próximos
+                em todo o catálogo, ver get_nearest_movies) ou 'hybrid'
+                (os dois modelos e a similaridade, ver
+                get_hybrid_recommendations_batch)
+            ranking: 'rating' (melhores avaliados do cluster) ou 'similarity'
+                (filmes do cluster mais similares à sinopse, por cosseno TF-IDF)
         """
         if not self.models_loaded:
             return {
@@ -164,6 +475,14 @@ class MovieRecommendationSystem:
                 'error': 'Modelos não carregados'
             }
         
+        if method == 'ann':
+            return self.get_nearest_movies(synopsis, n_recommendations)
+        
+        if method == 'hybrid':
+            return self.get_hybrid_recommendations_batch([{
+                'synopsis': synopsis, 'year': year, 'rating': rating, 'genre': genre
+            }], n_recommendations)[0]
+        
         try:
             # Predizer cluster
             if method == 'tfidf':
@@ -180,95 +499,585 @@ class MovieRecommendationSystem:
                     'error': 'Erro na predição do cluster'
                 }
             
-            # Filtrar filmes do mesmo cluster
-            cluster_movies = self.df_movies[self.df_movies[f'cluster_{method}'] == cluster]
-            
-            if len(cluster_movies) == 0:
-                # Fallback: usar todos os filmes
-                cluster_movies = self.df_movies
-            
-            # Ordenar por rating (melhores primeiro)
-            cluster_movies = cluster_movies.sort_values('rating', ascending=False)
-            
-            # Selecionar top N
-            recommendations = cluster_movies.head(n_recommendations)
-            
-            # Converter para formato da API
-            api_recommendations = []
-            for _, movie in recommendations.iterrows():
-                api_movie = {
-                    'id': str(movie.get('rank', 0)),
-                    'rank': int(movie.get('rank', 0)),
-                    'title_en': movie.get('title_en', 'N/A'),
-                    'title_pt': movie.get('title_pt', movie.get('title_en', 'N/A')),
-                    'year': int(movie.get('year', 2000)),
-                    'rating': float(movie.get('rating', 8.0)),
-                    'genre': movie.get('genre', 'Drama'),
-                    'sinopse': movie.get('sinopse', 'Sinopse não disponível'),
-                    'director': 'Diretor não informado',
-                    'cast': 'Elenco não informado',
-                    'duration': '120 min',
-                    'cluster': int(cluster),
-                    'poster_url': f'https://image.tmdb.org/t/p/w500/placeholder.jpg',
-                    'backdrop_url': f'https://image.tmdb.org/t/p/w1280/placeholder.jpg'
+            query_vector = None
+            if ranking == 'similarity':
+                query_vector = self.vectorize_queries([synopsis])
+            
+            return self._build_recommendation_response(
+                cluster, confidence, method, n_recommendations, query_vector
+            )
+            
+        except Exception as e:
+            print(f"Erro ao obter recomendações: {str(e)}")
+            return {
+                'recommendations': [],
+                'cluster': None,
+                'confidence': 0.0,
+                'method': method,
+                'error': str(e)
+            }
+    
+    def get_recommendations_cached(self, synopsis, method='tfidf', year=None, rating=None, genre=None,
+                                   n_recommendations=5, ranking='rating'):
+        """
+        get_recommendations com cache de resultados (memória e, se
+        configurado, disco), invalidado quando modelos ou dataset mudam
+        """
+        return cached_recommendations(self, synopsis, method, year, rating, genre,
+                                      n_recommendations, ranking)
+    
+    def ingest_movies(self, movies, update_centroids=False, append_csv=False):
+        """
+        Inclui filmes novos no catálogo sem retreinar (ver catalog_ingest.py)
+        """
+        from catalog_ingest import ingest_movies
+        return ingest_movies(self, movies, update_centroids, append_csv)
+    
+    def build_tfidf_matrix(self, df_movies):
+        """
+        Vetoriza as sinopses do catálogo uma única vez (matriz CSR)
+        
+        As linhas seguem a ordem do CSV (a mesma de self.movies) e são
+        normalizadas (L2), então o produto escalar com o vetor de uma
+        consulta é a similaridade cosseno.
+        """
+        if 'sinopse_clean' in df_movies.columns:
+            texts = df_movies['sinopse_clean'].fillna(df_movies['sinopse'])
+        else:
+            texts = df_movies['sinopse']
+        
+        self.tfidf_matrix = self.vectorize_synopses(texts.tolist())
+    
+    def build_cluster_index(self):
+        """
+        Constrói o índice (method, cluster) -> filmes ordenados por rating
+        
+        Cada entrada guarda as posições dos filmes em self.movies (ordenadas
+        por rating, melhores primeiro) e as linhas correspondentes da matriz
+        TF-IDF, de modo que uma consulta custe O(n_recommendations). Os
+        filmes no formato da API são montados só para os selecionados. Deve
+        ser chamado novamente sempre que self.movies mudar.
+        """
+        self.build_catalog_index()
+        
+        self.cluster_index = {}
+        for method, column in CLUSTER_COLUMNS.items():
+            if column not in self.movies.clusters:
+                continue
+            
+            for cluster, cluster_positions in self.movies.cluster_positions(column).items():
+                positions = self.movies.rating_order(cluster_positions)
+                self.cluster_index[(method, cluster)] = {
+                    'positions': positions,
+                    'tfidf': self.tfidf_matrix[positions]
+                }
+    
+    def build_catalog_index(self):
+        """
+        Catálogo completo ordenado por rating (fallback quando o cluster não
+        tem filmes, busca exata e método 'hybrid'), com o cluster de cada
+        filme por método na mesma ordem
+        """
+        order = self.movies.rating_order()
+        self.catalog_index = {
+            'positions': order,
+            'tfidf': self.tfidf_matrix[order],
+            'clusters': {
+                method: self.movies.clusters[column][order]
+                for method, column in CLUSTER_COLUMNS.items()
+                if column in self.movies.clusters
+            }
+        }
+    
+    def load_ann_index(self, index_dir=ANN_INDEX_DIR):
+        """
+        Carrega o índice ANN (memory-map) se ele existir e tiver sido
+        construído com o dataset e os modelos carregados
+        """
+        self.ann_index = None
+        
+        if not os.path.exists(os.path.join(index_dir, 'meta.json')):
+            return
+        
+        try:
+            index = AnnIndex.load(index_dir)
+            if index.meta.get('dataset_path', self.dataset_path) != self.dataset_path:
+                print(f"Índice ANN de outro dataset ({index.meta['dataset_path']}); usando busca exata", file=sys.stderr)
+                return
+            if index.meta.get('n_features', self.tfidf_matrix.shape[1]) != self.tfidf_matrix.shape[1]:
+                print("Índice ANN de outro espaço de features; usando busca exata", file=sys.stderr)
+                return
+            if index.meta.get('source_fingerprint') != source_fingerprint(self):
+                print("Índice ANN construído com outros modelos ou outro dataset; usando busca "
+                      "exata (reconstrua com lib/ann_index.py)", file=sys.stderr)
+                return
+            if index.n_rows != len(self.movies):
+                print(f"Índice ANN desatualizado ({index.n_rows} filmes, dataset com "
+                      f"{len(self.movies)}); usando busca exata", file=sys.stderr)
+                return
+            self.ann_index = index
+        except Exception as e:
+            print(f"Erro ao carregar índice ANN: {str(e)}", file=sys.stderr)
+    
+    def get_nearest_movies(self, synopsis, n_recommendations=5, nprobe=2, query_vector=None):
+        """
+        Obtém os filmes mais similares à sinopse em todo o catálogo
+        
+        Usa o índice ANN quando disponível (varrendo só as nprobe listas mais
+        próximas); sem índice, faz a busca exata na matriz TF-IDF.
+        """
+        if not self.models_loaded:
+            return {
+                'recommendations': [],
+                'cluster': None,
+                'confidence': 0.0,
+                'method': 'ann',
+                'error': 'Modelos não carregados'
+            }
+        
+        try:
+            if query_vector is None:
+                query_vector = self.vectorize_queries([synopsis])
+            
+            # Cluster TF-IDF da consulta (mantém o formato da resposta)
+            clusters, confidences = self.predict_clusters_tfidf_batch([synopsis], X=query_vector)
+            if clusters is None:
+                return {
+                    'recommendations': [],
+                    'cluster': None,
+                    'confidence': 0.0,
+                    'method': 'ann',
+                    'error': 'Erro na predição do cluster'
                 }
-                api_recommendations.append(api_movie)
+            
+            with self.metrics.stage('select'):
+                if self.ann_index is not None:
+                    positions, scores, scanned = self.ann_index.search(
+                        query_vector, n_recommendations, nprobe
+                    )
+                else:
+                    # Busca exata em todo o catálogo (empates pela ordem de rating)
+                    top, scores = self._rank_by_similarity(self.catalog_index, query_vector, n_recommendations)
+                    positions = self.catalog_index['positions'][top]
+                    scanned = len(self.catalog_index['positions'])
+                
+                # Cluster TF-IDF de cada filme (como no CSV)
+                movie_clusters = self.movies.clusters.get(CLUSTER_COLUMNS['tfidf'])
+                api_recommendations = []
+                for position, score in zip(positions, scores):
+                    cluster = movie_clusters[position] if movie_clusters is not None else 0
+                    api_movie = self.movies.to_api_dict(position, cluster)
+                    api_movie['similarity'] = float(score)
+                    api_recommendations.append(api_movie)
             
             return {
                 'recommendations': api_recommendations,
-                'cluster': int(cluster),
-                'confidence': float(confidence),
-                'method': method,
-                'cluster_size': len(cluster_movies),
-                'total_movies': len(self.df_movies)
+                'cluster': int(clusters[0]),
+                'confidence': float(confidences[0]),
+                'method': 'ann',
+                'ranking': 'similarity',
+                'cluster_size': int(scanned),
+                'total_movies': len(self.movies)
             }
             
         except Exception as e:
-            print(f"Erro ao obter recomendações: {str(e)}")
+            print(f"Erro na busca por vizinhos: {str(e)}")
             return {
                 'recommendations': [],
                 'cluster': None,
                 'confidence': 0.0,
-                'method': method,
+                'method': 'ann',
                 'error': str(e)
             }
     
+    def get_hybrid_recommendations_batch(self, queries, n_recommendations=5, X=None):
+        """
+        Recomendações do método 'hybrid' para várias consultas
+        
+        As distâncias aos centroides dos dois modelos e a similaridade com
+        cada filme do catálogo são calculadas para o lote inteiro de uma vez
+        e combinadas com self.hybrid_weights (ver hybrid_scoring.py). Se o
+        modelo com todas as features não aceita as features da inferência
+        (avisado na carga, ver check_all_features_model), a componente dele
+        fica de fora (e de 'weights' na resposta).
+        
+        Args:
+            queries: Lista de dicts com 'synopsis' e, opcionalmente, 'year',
+                'rating', 'genre' e 'n_recommendations'
+            n_recommendations: Quantidade padrão de recomendações por consulta
+            X: Matriz TF-IDF já calculada para as sinopses (opcional)
+        """
+        if not self.models_loaded:
+            return [{
+                'recommendations': [],
+                'cluster': None,
+                'confidence': 0.0,
+                'method': 'hybrid',
+                'error': 'Modelos não carregados'
+            } for _ in queries]
+        
+        try:
+            synopses = [query.get('synopsis', '') for query in queries]
+            if X is None:
+                X = self.vectorize_queries(synopses)
+            
+            weights = dict(self.hybrid_weights)
+            catalog = self.catalog_index
+            
+            with self.metrics.stage('predict'):
+                clusters, confidences, distances = self.tfidf_predictor.predict_distances(X)
+                affinities = {'tfidf': cluster_affinities(distances)}
+                
+                all_clusters = [None] * len(queries)
+                if (weights['all_features'] and not self.all_features_error
+                        and 'all_features' in catalog['clusters']):
+                    X_all = self.all_features_rows([
+                        (synopsis, query.get('year'), query.get('rating'), query.get('genre'))
+                        for synopsis, query in zip(synopses, queries)
+                    ])
+                    all_clusters, _, all_distances = self.all_predictor.predict_distances(X_all)
+                    affinities['all_features'] = cluster_affinities(all_distances)
+                if 'all_features' not in affinities:
+                    weights['all_features'] = 0.0
+            
+            results = []
+            with self.metrics.stage('select'):
+                counts = [query.get('n_recommendations', n_recommendations) for query in queries]
+                # O bloco limita tanto os scores (consultas x filmes) quanto
+                # as consultas densas (consultas x colunas, 16384 no hashing)
+                step = block_rows(max(len(catalog['positions']), X.shape[1]))
+                for start in range(0, len(queries), step):
+                    end = min(start + step, len(queries))
+                    
+                    # Similaridade com todos os filmes (ordem por rating): matriz
+                    # esparsa do catálogo x consultas densas
+                    similarity = (catalog['tfidf'] @ X[start:end].toarray().T).T
+                    scores = blend_scores(
+                        weights, similarity,
+                        {name: affinity[start:end] for name, affinity in affinities.items()},
+                        catalog['clusters']
+                    )
+                    
+                    ranked = top_scores(scores, max(counts[start:end]))
+                    for offset, (top, top_values) in enumerate(ranked):
+                        i = start + offset
+                        results.append(self._hybrid_response(
+                            top[:counts[i]], top_values[:counts[i]], similarity[offset],
+                            clusters[i], confidences[i], all_clusters[i], weights
+                        ))
+            
+            return results
+            
+        except Exception as e:
+            print(f"Erro nas recomendações híbridas: {str(e)}")
+            return [{
+                'recommendations': [],
+                'cluster': None,
+                'confidence': 0.0,
+                'method': 'hybrid',
+                'error': str(e)
+            } for _ in queries]
+    
+    def _hybrid_response(self, top, scores, similarity, cluster, confidence, all_cluster, weights):
+        """Resposta da API de uma consulta do método 'hybrid'"""
+        catalog = self.catalog_index
+        movie_clusters = catalog['clusters'].get('tfidf')
+        
+        api_recommendations = []
+        for column, score in zip(top, scores):
+            position = catalog['positions'][column]
+            movie_cluster = movie_clusters[column] if movie_clusters is not None else 0
+            api_movie = self.movies.to_api_dict(position, movie_cluster)
+            api_movie['similarity'] = float(round(similarity[column], 12))
+            api_movie['score'] = float(score)
+            api_recommendations.append(api_movie)
+        
+        return {
+            'recommendations': api_recommendations,
+            'cluster': int(cluster),
+            'confidence': float(confidence),
+            'clusters': {
+                'tfidf': int(cluster),
+                'all_features': int(all_cluster) if all_cluster is not None else None
+            },
+            'method': 'hybrid',
+            'ranking': 'hybrid',
+            'weights': weights,
+            'cluster_size': len(catalog['positions']),
+            'total_movies': len(self.movies)
+        }
+    
+    def _rank_by_similarity(self, entry, query_vector, n_recommendations):
+        """
+        Ordena os filmes de uma entrada do índice por similaridade cosseno
+        com a consulta
+        
+        Returns:
+            Tupla (índices na entrada, similaridades), melhores primeiro
+        """
+        # Um produto matriz esparsa x vetor denso (arredondado para que
+        # empates não dependam da ordem de soma em ponto flutuante)
+        scores = np.round(entry['tfidf'].dot(query_vector.toarray().ravel()), 12)
+        
+        n = min(n_recommendations, len(scores))
+        if n <= 0:
+            return np.array([], dtype=int), scores[:0]
+        
+        top = np.argpartition(-scores, n - 1)[:n]
+        
+        # Empates mantêm a ordem por rating do índice
+        top = top[np.lexsort((top, -scores[top]))]
+        return top, scores[top]
+    
+    def _build_recommendation_response(self, cluster, confidence, method, n_recommendations,
+                                       query_vector=None):
+        """
+        Monta a resposta da API a partir do índice de clusters
+        
+        Se query_vector (linha TF-IDF da consulta) for informado, os filmes
+        do cluster são ordenados por similaridade com a consulta em vez de
+        por rating.
+        """
+        with self.metrics.stage('select'):
+            return self._select_recommendations(cluster, confidence, method, n_recommendations, query_vector)
+    
+    def _select_recommendations(self, cluster, confidence, method, n_recommendations, query_vector):
+        entry = self.cluster_index.get((method, int(cluster)))
+        
+        if entry is None:
+            # Fallback: usar todos os filmes
+            entry = self.catalog_index
+        
+        if query_vector is None:
+            selected = [(position, None) for position in entry['positions'][:n_recommendations]]
+        else:
+            top, scores = self._rank_by_similarity(entry, query_vector, n_recommendations)
+            selected = [(entry['positions'][i], float(score)) for i, score in zip(top, scores)]
+        
+        api_recommendations = []
+        for position, similarity in selected:
+            api_movie = self.movies.to_api_dict(position, cluster)
+            if similarity is not None:
+                api_movie['similarity'] = similarity
+            api_recommendations.append(api_movie)
+        
+        response = {
+            'recommendations': api_recommendations,
+            'cluster': int(cluster),
+            'confidence': float(confidence),
+            'method': method,
+            'cluster_size': len(entry['positions']),
+            'total_movies': len(self.movies)
+        }
+        
+        if query_vector is not None:
+            response['ranking'] = 'similarity'
+        
+        return response
+    
+    def get_recommendations_batch(self, queries, n_recommendations=5):
+        """
+        Obtém recomendações para várias sinopses de uma só vez
+        
+        As sinopses são vetorizadas e preditas em lote (uma chamada ao
+        vetorizador e ao KMeans por método) e os filmes de cada cluster vêm
+        do índice pré-calculado em build_cluster_index.
+        
+        Args:
+            queries: Lista de dicts com 'synopsis' e, opcionalmente, 'method',
+                'year', 'rating', 'genre', 'n_recommendations' e 'ranking'
+            n_recommendations: Quantidade padrão de recomendações por consulta
+            
+        Returns:
+            Lista de resultados no formato de get_recommendations, na mesma
+            ordem das consultas
+        """
+        if not self.models_loaded:
+            return [self.get_recommendations(query.get('synopsis', ''), query.get('method', 'tfidf'))
+                    for query in queries]
+        
+        predictions = {}
+        
+        # Predição em lote por método
+        tfidf_indices = [i for i, query in enumerate(queries) if query.get('method', 'tfidf') == 'tfidf']
+        hybrid_indices = [i for i, query in enumerate(queries) if query.get('method') == 'hybrid']
+        other_indices = [i for i, query in enumerate(queries)
+                         if query.get('method', 'tfidf') not in ('tfidf', 'ann', 'hybrid')]
+        
+        # Uma única vetorização para todas as sinopses que precisam de TF-IDF
+        text_indices = [i for i, query in enumerate(queries)
+                        if query.get('method', 'tfidf') in ('tfidf', 'ann', 'hybrid')
+                        or query.get('ranking') == 'similarity']
+        X_text = None
+        text_rows = {}
+        if text_indices:
+            try:
+                X_text = self.vectorize_queries([queries[i].get('synopsis', '') for i in text_indices])
+                text_rows = {i: row for row, i in enumerate(text_indices)}
+            except Exception as e:
+                print(f"Erro na vetorização em lote: {str(e)}")
+        
+        if tfidf_indices and X_text is not None:
+            clusters, confidences = self.predict_clusters_tfidf_batch(
+                [queries[i].get('synopsis', '') for i in tfidf_indices],
+                X=X_text[[text_rows[i] for i in tfidf_indices]]
+            )
+            if clusters is not None:
+                for i, cluster, confidence in zip(tfidf_indices, clusters, confidences):
+                    predictions[i] = (cluster, confidence)
+        
+        if other_indices:
+            clusters, confidences = self.predict_clusters_all_features_batch([
+                (queries[i].get('synopsis', ''), queries[i].get('year'),
+                 queries[i].get('rating'), queries[i].get('genre'))
+                for i in other_indices
+            ])
+            if clusters is not None:
+                for i, cluster, confidence in zip(other_indices, clusters, confidences):
+                    predictions[i] = (cluster, confidence)
+        
+        hybrid_results = {}
+        if hybrid_indices and X_text is not None:
+            hybrid_results = dict(zip(hybrid_indices, self.get_hybrid_recommendations_batch(
+                [queries[i] for i in hybrid_indices], n_recommendations,
+                X=X_text[[text_rows[i] for i in hybrid_indices]]
+            )))
+        
+        results = []
+        for i, query in enumerate(queries):
+            method = query.get('method', 'tfidf')
+            
+            if i in hybrid_results:
+                results.append(hybrid_results[i])
+                continue
+            
+            if method == 'ann':
+                results.append(self.get_nearest_movies(
+                    query.get('synopsis', ''),
+                    query.get('n_recommendations', n_recommendations),
+                    query_vector=X_text[text_rows[i]] if i in text_rows else None
+                ))
+                continue
+            
+            if i not in predictions:
+                results.append({
+                    'recommendations': [],
+                    'cluster': None,
+                    'confidence': 0.0,
+                    'method': method,
+                    'error': 'Erro na predição do cluster'
+                })
+                continue
+            
+            cluster, confidence = predictions[i]
+            
+            try:
+                query_vector = None
+                if query.get('ranking') == 'similarity':
+                    query_vector = X_text[text_rows[i]]
+                
+                results.append(self._build_recommendation_response(
+                    cluster, confidence, method,
+                    query.get('n_recommendations', n_recommendations),
+                    query_vector
+                ))
+                
+            except Exception as e:
+                print(f"Erro ao obter recomendações: {str(e)}")
+                results.append({
+                    'recommendations': [],
+                    'cluster': None,
+                    'confidence': 0.0,
+                    'method': method,
+                    'error': str(e)
+                })
+        
+        return results
+    
+    def _analyze_cluster(self, cluster_id, positions):
+        """
+        Calcula as estatísticas de um cluster a partir das posições dos
+        seus filmes em self.movies
+        """
+        movies = self.movies
+        ratings = movies.rating[positions]
+        years = movies.year[positions]
+        
+        # Gêneros na ordem em que aparecem no cluster
+        genre_ids, first = np.unique(movies.genre_ids[positions], return_index=True)
+        genres = [movies.genres[code] for code in genre_ids[np.argsort(first)]]
+        
+        analysis = {
+            'cluster_id': int(cluster_id),
+            'movie_count': len(positions),
+            'avg_rating': float(ratings.mean()),
+            'genres': genres,
+            'years': {
+                'min': int(years.min()),
+                'max': int(years.max()),
+                'avg': float(years.mean())
+            },
+            'representative_movies': []
+        }
+        
+        # Filmes representativos (top 3 por rating, empates na ordem do catálogo)
+        for i in np.argsort(-ratings, kind='stable')[:3]:
+            analysis['representative_movies'].append({
+                'title': movies.text('title_en', positions[i]),
+                'rating': float(ratings[i]),
+                'year': int(years[i])
+            })
+        
+        return analysis
+    
+    def build_cluster_analysis_cache(self):
+        """
+        Pré-calcula a análise de todos os clusters de cluster_tfidf e
+        cluster_all para a impressão digital atual do dataset
+        """
+        self._cluster_analysis_cache = {}
+        self._cluster_analysis_fingerprint = self.dataset_fingerprint
+        
+        for column in CLUSTER_COLUMNS.values():
+            if column not in self.movies.clusters:
+                continue
+            
+            for cluster_id, positions in self.movies.cluster_positions(column).items():
+                self._cluster_analysis_cache[(column, cluster_id)] = self._analyze_cluster(
+                    cluster_id, positions
+                )
+    
     def get_cluster_analysis(self, cluster_id, method='tfidf'):
         """
         Obtém análise de um cluster específico
+        
+        As análises ficam em cache e só são recalculadas quando a impressão
+        digital do dataset/modelos muda.
         """
         if not self.models_loaded:
             return None
         
+        with self.metrics.stage('cluster_analysis'):
+            return self._get_cluster_analysis(cluster_id, method)
+    
+    def _get_cluster_analysis(self, cluster_id, method):
         try:
-            cluster_movies = self.df_movies[self.df_movies[f'cluster_{method}'] == cluster_id]
-            
-            if len(cluster_movies) == 0:
-                return None
-            
-            analysis = {
-                'cluster_id': int(cluster_id),
-                'movie_count': len(cluster_movies),
-                'avg_rating': float(cluster_movies['rating'].mean()),
-                'genres': cluster_movies['genre'].unique().tolist(),
-                'years': {
-                    'min': int(cluster_movies['year'].min()),
-                    'max': int(cluster_movies['year'].max()),
-                    'avg': float(cluster_movies['year'].mean())
-                },
-                'representative_movies': []
-            }
+            if self._cluster_analysis_fingerprint != self.dataset_fingerprint:
+                self.build_cluster_analysis_cache()
             
-            # Filmes representativos (top 3 por rating)
-            top_movies = cluster_movies.nlargest(3, 'rating')
-            for _, movie in top_movies.iterrows():
-                analysis['representative_movies'].append({
-                    'title': movie.get('title_en', 'N/A'),
-                    'rating': float(movie.get('rating', 8.0)),
-                    'year': int(movie.get('year', 2000))
-                })
+            column = CLUSTER_COLUMNS.get(method, f'cluster_{method}')
+            key = (column, int(cluster_id))
+            
+            if key not in self._cluster_analysis_cache:
+                positions = np.flatnonzero(self.movies.clusters[column] == cluster_id)
+                
+                if len(positions) == 0:
+                    return None
+                
+                self._cluster_analysis_cache[key] = self._analyze_cluster(cluster_id, positions)
             
-            return analysis
+            # Cópia, para que quem chama possa alterar o resultado
+            return copy.deepcopy(self._cluster_analysis_cache[key])
             
         except Exception as e:
             print(f"Erro na análise do cluster: {str(e)}")
@@ -277,11 +1086,19 @@ class MovieRecommendationSystem:
 # Instância global do sistema
 movie_system = MovieRecommendationSystem()
 
-def get_recommendations_for_synopsis(synopsis, method='tfidf', year=None, rating=None, genre=None):
+def get_recommendations_for_synopsis(synopsis, method='tfidf', year=None, rating=None, genre=None,
+                                     n_recommendations=5, ranking='rating'):
+    """
+    Função principal para obter recomendações (com cache de resultados)
+    """
+    return movie_system.get_recommendations_cached(synopsis, method, year, rating, genre,
+                                                   n_recommendations, ranking)
+
+def get_recommendations_batch(queries, n_recommendations=5):
     """
-    Função principal para obter recomendações
+    Função para obter recomendações para várias sinopses de uma só vez
     """
-    return movie_system.get_recommendations(synopsis, method, year, rating, genre)
+    return movie_system.get_recommendations_batch(queries, n_recommendations)
 
 def get_cluster_analysis(cluster_id, method='tfidf'):
     """
@@ -289,3 +1106,9 @@ def get_cluster_analysis(cluster_id, method='tfidf'):
     """
     return movie_system.get_cluster_analysis(cluster_id, method)
 
+def reload_if_changed():
+    """
+    Função para recarregar modelos e dataset se os arquivos mudaram
+    """
+    return movie_system.reload_if_changed()
+
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+"""
+Catálogo de filmes em colunas NumPy, no lugar do DataFrame do pandas
+
+Rank, ano, rating e clusters ficam em arrays tipados, o gênero é
+codificado por dicionário (um código por filme + lista de gêneros) e os
+textos usados pela API (títulos e sinopse) ficam em blobs UTF-8 com
+offsets (encode_strings de compact_model.py). Colunas que a API não usa
+(diretor, elenco, URLs, sinopse_clean, features normalizadas) não são
+mantidas em memória.
+
+to_api_dict monta o filme no formato da API direto dessas colunas, sem
+DataFrame nem dicts por filme pré-montados.
+"""
+
+import numpy as np
+
+from compact_model import encode_strings, decode_string
+
+# Colunas de cluster mantidas (uma por método)
+CLUSTER_COLUMNS = ('cluster_tfidf', 'cluster_all')
+
+# Cluster de filmes que o modelo não conseguiu atribuir (fora dos índices)
+UNASSIGNED_CLUSTER = -1
+
+# Valores usados quando o dataset não tem a coluna (ou o valor)
+DEFAULT_YEAR = 2000
+DEFAULT_RATING = 8.0
+DEFAULT_GENRE = 'Drama'
+DEFAULT_TITLE = 'N/A'
+DEFAULT_SYNOPSIS = 'Sinopse não disponível'
+
+class MovieStore:
+    """
+    Tabela de filmes em colunas; a linha i corresponde à linha i do CSV
+    (e da matriz TF-IDF do catálogo)
+    """
+
+    def __init__(self, rank, year, rating, genre_ids, genres, texts, clusters):
+        """
+        Args:
+            rank: Rank de cada filme (int32)
+            year: Ano (float64, como no CSV; a API usa a parte inteira)
+            rating: Rating (float64, exatamente como no CSV)
+            genre_ids: Código do gênero de cada filme (int16)
+            genres: Lista de gêneros (código -> nome)
+            texts: {coluna: (blob, offsets)} de encode_strings
+            clusters: {coluna: cluster de cada filme (int32)}
+        """
+        self.rank = rank
+        self.year = year
+        self.rating = rating
+        self.genre_ids = genre_ids
+        self.genres = genres
+        self.texts = texts
+        self.clusters = clusters
+
+    @classmethod
+    def from_dataframe(cls, df, cluster_columns=CLUSTER_COLUMNS):
+        """Converte o DataFrame do CSV do catálogo"""
+        n_rows = len(df)
+
+        def numeric(column, default, dtype):
+            if column not in df.columns:
+                return np.full(n_rows, default, dtype=dtype)
+            return df[column].fillna(default).to_numpy().astype(dtype)
+
+        genre_values = df['genre'].fillna(DEFAULT_GENRE) if 'genre' in df.columns else None
+        if genre_values is None:
+            genre_ids, genres = np.zeros(n_rows, dtype=np.int16), [DEFAULT_GENRE]
+        else:
+            codes, uniques = genre_values.astype(str).factorize()
+            genre_ids, genres = codes.astype(np.int16), list(uniques)
+
+        def text_values(column, default):
+            if column not in df.columns:
+                return [default] * n_rows
+            return df[column].fillna(default).astype(str).tolist()
+
+        title_en = text_values('title_en', DEFAULT_TITLE)
+        texts = {'title_en': encode_strings(title_en)}
+        if 'title_pt' in df.columns:
+            # Sem título em português: usar o título em inglês
+            title_pt = [en if pt != pt else str(pt) for pt, en in zip(df['title_pt'].tolist(), title_en)]
+            texts['title_pt'] = encode_strings(title_pt)
+        else:
+            texts['title_pt'] = texts['title_en']
+        texts['sinopse'] = encode_strings(text_values('sinopse', DEFAULT_SYNOPSIS))
+
+        clusters = {
+            column: df[column].to_numpy().astype(np.int32)
+            for column in cluster_columns if column in df.columns
+        }
+
+        return cls(
+            rank=numeric('rank', 0, np.int32),
+            year=numeric('year', DEFAULT_YEAR, np.float64),
+            rating=numeric('rating', DEFAULT_RATING, np.float64),
+            genre_ids=genre_ids,
+            genres=genres,
+            texts=texts,
+            clusters=clusters
+        )
+
+    def extend(self, other):
+        """
+        Acrescenta ao fim da tabela as linhas de outra MovieStore
+
+        Gêneros novos entram no fim da lista de gêneros; colunas de
+        cluster que other não tem ficam com UNASSIGNED_CLUSTER.
+
+        Returns:
+            Posições das linhas acrescentadas
+        """
+        codes = {genre: code for code, genre in enumerate(self.genres)}
+        for genre in other.genres:
+            if genre not in codes:
+                codes[genre] = len(self.genres)
+                self.genres.append(genre)
+        remap = np.array([codes[genre] for genre in other.genres], dtype=np.int16)
+
+        start = len(self)
+        self.rank = np.concatenate([self.rank, other.rank.astype(self.rank.dtype)])
+        self.year = np.concatenate([self.year, other.year.astype(self.year.dtype)])
+        self.rating = np.concatenate([self.rating, other.rating.astype(self.rating.dtype)])
+        self.genre_ids = np.concatenate([self.genre_ids, remap[other.genre_ids]])
+
+        for column, (data, offsets) in self.texts.items():
+            other_data, other_offsets = other.texts[column]
+            self.texts[column] = (
+                np.concatenate([data, other_data]),
+                np.concatenate([offsets, other_offsets[1:] + offsets[-1]])
+            )
+
+        for column, values in self.clusters.items():
+            other_values = other.clusters.get(column)
+            if other_values is None:
+                other_values = np.full(len(other), UNASSIGNED_CLUSTER, dtype=np.int32)
+            self.clusters[column] = np.concatenate([values, other_values.astype(np.int32)])
+
+        return np.arange(start, len(self))
+
+    def __len__(self):
+        return len(self.rank)
+
+    def text(self, column, row):
+        """Texto de uma coluna (title_en, title_pt ou sinopse) na linha"""
+        data, offsets = self.texts[column]
+        return decode_string(data, offsets, row)
+
+    def texts_of(self, column, rows=None):
+        """Lista de textos de uma coluna (todas as linhas ou só rows)"""
+        data, offsets = self.texts[column]
+        rows = range(len(self)) if rows is None else rows
+        return [decode_string(data, offsets, row) for row in rows]
+
+    def genre(self, row):
+        return self.genres[self.genre_ids[row]]
+
+    def to_api_dict(self, row, cluster):
+        """Filme da linha no formato da API"""
+        rank = int(self.rank[row])
+        return {
+            'id': str(rank),
+            'rank': rank,
+            'title_en': self.text('title_en', row),
+            'title_pt': self.text('title_pt', row),
+            'year': int(self.year[row]),
+            'rating': float(self.rating[row]),
+            'genre': self.genres[self.genre_ids[row]],
+            'sinopse': self.text('sinopse', row),
+            'director': 'Diretor não informado',
+            'cast': 'Elenco não informado',
+            'duration': '120 min',
+            'cluster': int(cluster),
+            'poster_url': f'https://image.tmdb.org/t/p/w500/placeholder.jpg',
+            'backdrop_url': f'https://image.tmdb.org/t/p/w1280/placeholder.jpg'
+        }
+
+    def rating_order(self, positions=None):
+        """
+        Posições ordenadas por rating, melhores primeiro
+
+        Reproduz a ordem de DataFrame.sort_values('rating', ascending=False)
+        (mesmo algoritmo, então os empates ficam na mesma ordem).
+        """
+        positions = np.arange(len(self)) if positions is None else np.asarray(positions)
+        reversed_positions = positions[::-1]
+        order = self.rating[reversed_positions].argsort(kind='quicksort')
+        return reversed_positions[order][::-1]
+
+    def cluster_positions(self, column):
+        """
+        {cluster: posições dos filmes do cluster}, clusters em ordem
+        crescente e posições na ordem do catálogo (como groupby), sem os
+        filmes com UNASSIGNED_CLUSTER
+        """
+        values = self.clusters[column]
+        order = np.argsort(values, kind='stable')
+        boundaries = np.flatnonzero(np.diff(values[order])) + 1
+        return {
+            int(values[group[0]]): group
+            for group in np.split(order, boundaries)
+            if len(group) and values[group[0]] != UNASSIGNED_CLUSTER
+        }
+
+    def memory_bytes(self):
+        """Memória ocupada pelos arrays da tabela"""
+        arrays = [self.rank, self.year, self.rating, self.genre_ids]
+        arrays += list(self.clusters.values())
+        for data, offsets in {id(blob): blob for blob in self.texts.values()}.values():
+            arrays += [data, offsets]
+        return sum(array.nbytes for array in arrays)
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Leitura preguiçosa de catálogos de filmes e checkpoints JSONL
+
+Os leitores devolvem um filme (dict) por vez, sem carregar o arquivo
+inteiro em memória, para JSON (lista de objetos), JSONL e CSV (separador
+detectado automaticamente, ';' nos datasets do projeto).
+"""
+
+import csv
+import json
+import os
+from typing import Dict, Iterator
+
+# Tamanho dos blocos lidos do JSON
+JSON_CHUNK_SIZE = 1 << 16
+
+def iter_json_array(path: str) -> Iterator[Dict]:
+    """
+    Objetos de um arquivo JSON com uma lista no topo, um por vez
+    """
+    decoder = json.JSONDecoder()
+    separators = ' \t\r\n,'
+
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer = f.read(JSON_CHUNK_SIZE)
+        position = len(buffer) - len(buffer.lstrip())
+        if not buffer[position:position + 1] == '[':
+            raise ValueError(f'{path} não contém uma lista JSON')
+        position += 1
+        eof = False
+
+        while True:
+            # Pular espaços e vírgulas entre os objetos
+            while position < len(buffer) and buffer[position] in separators:
+                position += 1
+
+            if position < len(buffer):
+                if buffer[position] == ']':
+                    return
+                try:
+                    movie, position = decoder.raw_decode(buffer, position)
+                    yield movie
+                    continue
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+
+            if eof:
+                raise ValueError(f'JSON incompleto em {path}')
+
+            # Objeto incompleto: descartar o que já foi lido e ler mais um bloco
+            chunk = f.read(JSON_CHUNK_SIZE)
+            eof = not chunk
+            buffer = buffer[position:] + chunk
+            position = 0
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    """Objetos de um arquivo JSONL (um por linha)"""
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def iter_csv(path: str) -> Iterator[Dict]:
+    """Linhas de um CSV como dicts (separador detectado pelo cabeçalho)"""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        header = f.readline()
+        delimiter = ';' if header.count(';') > header.count(',') else ','
+        f.seek(0)
+
+        for row in csv.DictReader(f, delimiter=delimiter):
+            # Ano como inteiro, como nos catálogos JSON (no CSV é texto e
+            # pode vir como "1994.0")
+            year = row.get('year')
+            if year:
+                try:
+                    value = float(year)
+                    if value.is_integer():
+                        row['year'] = int(value)
+                except ValueError:
+                    pass
+            yield row
+
+def iter_movies(path: str) -> Iterator[Dict]:
+    """
+    Filmes de um arquivo JSON, JSONL ou CSV (pela extensão), um por vez
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.jsonl':
+        return iter_jsonl(path)
+    if extension == '.csv':
+        return iter_csv(path)
+    if extension == '.json':
+        return iter_json_array(path)
+    raise ValueError(f'Formato não suportado: {path}')
+
+def truncate_partial_line(path: str):
+    """
+    Remove uma última linha sem quebra de linha (escrita interrompida) de
+    um arquivo JSONL, para que novas linhas possam ser anexadas
+    """
+    if not os.path.exists(path):
+        return
+
+    with open(path, 'rb+') as f:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return
+        f.seek(size - 1)
+        if f.read(1) == b'\n':
+            return
+
+        # Procurar a última quebra de linha, de trás para frente
+        end = size
+        while end > 0:
+            start = max(0, end - JSON_CHUNK_SIZE)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b'\n')
+            if newline >= 0:
+                f.truncate(start + newline + 1)
+                return
+            end = start
+        f.truncate(0)
+
+def count_checkpoint_records(path: str) -> int:
+    """
+    Quantidade de filmes já gravados em um checkpoint JSONL
+
+    Como o checkpoint é escrito na ordem de entrada, essa contagem é a
+    posição do catálogo de onde o processamento continua. Uma última linha
+    incompleta (processo interrompido no meio da escrita) não conta.
+    """
+    if not os.path.exists(path):
+        return 0
+
+    count = 0
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.endswith('\n') and line.strip():
+                count += 1
+    return count
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Cache LRU das consultas de recomendação
+
+O frontend reenvia as mesmas sinopses com frequência (por exemplo, ao
+clicar em "similares a este filme" no catálogo). O cache guarda, por
+sinopse normalizada, o texto pré-processado, a linha TF-IDF e o cluster
+predito por cada método, de modo que consultas repetidas não passem de
+novo pelo pré-processamento, pelo vetorizador e pelo KMeans.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+# Quantidade máxima de sinopses mantidas em memória
+QUERY_CACHE_SIZE = 1024
+
+def normalize_synopsis(synopsis):
+    """
+    Normalização barata usada na chave (minúsculas e espaços colapsados)
+
+    Sinopses com a mesma forma normalizada têm o mesmo texto pré-processado.
+    """
+    if not synopsis or (isinstance(synopsis, float) and synopsis != synopsis):
+        return ""
+    return ' '.join(str(synopsis).lower().split())
+
+def synopsis_key(synopsis):
+    """Chave do cache: hash da sinopse normalizada"""
+    return hashlib.sha1(normalize_synopsis(synopsis).encode('utf-8')).hexdigest()
+
+class LRUCache:
+    """
+    Cache LRU limitado e thread-safe, com contadores de acertos, falhas e
+    remoções
+    """
+
+    def __init__(self, maxsize=QUERY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        """Retorna o valor (marcando-o como recente) ou default"""
+        with self._lock:
+            if key in self._data:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return self._data[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """Insere o valor, removendo o menos recente se o cache estiver cheio"""
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """Esvazia o cache (os contadores são mantidos)"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        """Contadores do cache"""
+        lookups = self.hits + self.misses
+        return {
+            'size': len(self._data),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
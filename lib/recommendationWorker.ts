@@ -0,0 +1,142 @@
+import { spawn, ChildProcessWithoutNullStreams } from 'child_process'
+import os from 'os'
+import path from 'path'
+
+// Cliente dos workers Python de recomendação (lib/run_recommendation.py --worker).
+// Mantém um pool de processos vivos com os modelos carregados (até um por
+// núcleo, ou FIAPFLIX_RECOMMENDATION_WORKERS) e troca mensagens em JSON por
+// linha, evitando re-importar pandas/scikit-learn a cada requisição. Os
+// workers são criados sob demanda: um novo só sobe quando todos os
+// existentes já têm requisições em andamento.
+
+interface PendingRequest {
+  resolve: (value: any) => void
+  reject: (reason: Error) => void
+  timer: ReturnType<typeof setTimeout>
+}
+
+interface Worker {
+  proc: ChildProcessWithoutNullStreams
+  stdoutBuffer: string
+  pending: Map<number, PendingRequest>
+}
+
+const DEFAULT_TIMEOUT_MS = 10000
+
+const POOL_SIZE = Math.max(
+  1,
+  parseInt(process.env.FIAPFLIX_RECOMMENDATION_WORKERS || '', 10) || os.cpus().length
+)
+
+const workers: Worker[] = []
+let nextRequestId = 1
+
+function rejectAll(worker: Worker, error: Error) {
+  worker.pending.forEach((request) => {
+    clearTimeout(request.timer)
+    request.reject(error)
+  })
+  worker.pending.clear()
+}
+
+function removeWorker(worker: Worker, reason: string) {
+  // Um worker que falhou sai do pool; o próximo pedido sobe outro no lugar
+  const index = workers.indexOf(worker)
+  if (index !== -1) workers.splice(index, 1)
+  worker.stdoutBuffer = ''
+  rejectAll(worker, new Error(reason))
+}
+
+function failWorker(worker: Worker, error: Error) {
+  removeWorker(worker, `Worker Python indisponível: ${error.message}`)
+  worker.proc.kill()
+}
+
+function handleLine(worker: Worker, line: string) {
+  if (!line.trim()) return
+
+  let message: any
+  try {
+    message = JSON.parse(line)
+  } catch (parseError) {
+    console.error('❌ Resposta inválida do worker Python:', line)
+    return
+  }
+
+  const request = worker.pending.get(message.id)
+  if (!request) return
+
+  worker.pending.delete(message.id)
+  clearTimeout(request.timer)
+  delete message.id
+  request.resolve(message)
+}
+
+function startWorker(): Worker {
+  console.log(`🐍 Iniciando worker Python de recomendação (${workers.length + 1}/${POOL_SIZE})...`)
+  const proc = spawn('python3', [
+    path.join(process.cwd(), 'lib', 'run_recommendation.py'),
+    '--worker'
+  ], {
+    cwd: process.cwd()
+  })
+  const worker: Worker = { proc, stdoutBuffer: '', pending: new Map() }
+
+  proc.stdout.on('data', (data) => {
+    worker.stdoutBuffer += data.toString()
+    let newlineIndex = worker.stdoutBuffer.indexOf('\n')
+    while (newlineIndex !== -1) {
+      handleLine(worker, worker.stdoutBuffer.slice(0, newlineIndex))
+      worker.stdoutBuffer = worker.stdoutBuffer.slice(newlineIndex + 1)
+      newlineIndex = worker.stdoutBuffer.indexOf('\n')
+    }
+  })
+
+  proc.stderr.on('data', (data) => {
+    console.log('🐍 Python stderr:', data.toString())
+  })
+
+  // Escrever em um worker que já morreu gera EPIPE no stdin: sem este
+  // listener o erro derrubaria o servidor Next.js
+  proc.stdin.on('error', (error) => failWorker(worker, error))
+
+  proc.on('error', (error) => removeWorker(worker, `Worker Python falhou: ${error.message}`))
+  proc.on('close', (code) => removeWorker(worker, `Worker Python finalizado com código: ${code}`))
+
+  workers.push(worker)
+  return worker
+}
+
+function getWorker(): Worker {
+  // Worker com menos requisições em andamento; um novo se todos estão
+  // ocupados e o pool ainda não está cheio
+  let selected: Worker | null = null
+  for (const worker of workers) {
+    if (!worker.proc.stdin.writable) continue
+    if (!selected || worker.pending.size < selected.pending.size) selected = worker
+  }
+
+  if (!selected || (selected.pending.size > 0 && workers.length < POOL_SIZE)) {
+    return startWorker()
+  }
+  return selected
+}
+
+export function runRecommendation(payload: Record<string, any>, timeoutMs: number = DEFAULT_TIMEOUT_MS): Promise<any> {
+  return new Promise((resolve, reject) => {
+    const worker = getWorker()
+    const id = nextRequestId++
+
+    const timer = setTimeout(() => {
+      worker.pending.delete(id)
+      reject(new Error(`Timeout de ${timeoutMs}ms aguardando o worker Python`))
+    }, timeoutMs)
+
+    worker.pending.set(id, { resolve, reject, timer })
+    // Com o stdin já fechado (worker morto antes do 'close') o erro só
+    // chega pelo callback
+    worker.proc.stdin.write(JSON.stringify({ ...payload, id }) + '\n', (error) => {
+      if (error) failWorker(worker, error)
+    })
+  })
+}
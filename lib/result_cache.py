@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Cache de respostas de recomendação
+
+As respostas de get_recommendations são guardadas por (sinopse
+normalizada, método, ano, rating, gênero, quantidade, ranking) junto com a
+impressão digital dos modelos e do dataset, de modo que uma resposta nunca
+é reaproveitada depois que esses arquivos mudam.
+
+Há dois níveis: um LRU em memória e, opcionalmente, um banco sqlite em um
+diretório de cache, para que resultados sobrevivam ao fim do processo. O
+banco também guarda um manifesto (arquivos e impressão digital de cada
+backend), o que permite consultar o cache antes de carregar os modelos.
+"""
+
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+
+from hybrid_scoring import format_weights
+from query_cache import LRUCache, normalize_synopsis
+
+# Quantidade de respostas mantidas em memória
+RESULT_CACHE_SIZE = 512
+
+# Variável de ambiente com o diretório do cache em disco (opcional)
+RESULT_CACHE_DIR_ENV = 'FIAPFLIX_RESULT_CACHE_DIR'
+
+# Arquivo do cache dentro do diretório
+RESULT_CACHE_FILE = 'results.sqlite3'
+
+# Quantidade máxima de respostas guardadas em disco
+RESULT_CACHE_MAX_ENTRIES = 100000
+
+def file_fingerprint(paths):
+    """
+    Calcula uma impressão digital (sha1) dos arquivos a partir de caminho,
+    tamanho e data de modificação, sem ler o conteúdo
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            digest.update(f'{path}:{stat.st_size}:{stat.st_mtime_ns};'.encode('utf-8'))
+        except OSError:
+            digest.update(f'{path}:missing;'.encode('utf-8'))
+    return digest.hexdigest()
+
+def content_fingerprint(paths):
+    """
+    Impressão digital (sha256) do conteúdo dos arquivos, independente de
+    caminho e data de modificação (igual em um clone novo do repositório)
+    """
+    digest = hashlib.sha256()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+            digest.update(b';')
+        except OSError:
+            digest.update(b'missing;')
+    return digest.hexdigest()
+
+def result_key(kind, fingerprint, synopsis, method, year, rating, genre, n_recommendations, ranking,
+               weights=None):
+    """
+    Chave de uma resposta no cache
+
+    Args:
+        kind: Tipo de resposta ('recommendations' ou 'request')
+        fingerprint: Impressão digital de modelos + dataset
+        weights: Pesos do método 'hybrid' (ver hybrid_weights_key)
+    """
+    fields = [kind, fingerprint, normalize_synopsis(synopsis), method, year, rating, genre,
+              n_recommendations, ranking]
+    if weights is not None:
+        fields.append(weights)
+    payload = json.dumps(fields, ensure_ascii=False, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+class SqliteResultStore:
+    """
+    Respostas serializadas (JSON) em um banco sqlite, compartilhável entre
+    processos
+    """
+
+    def __init__(self, cache_dir, max_entries=RESULT_CACHE_MAX_ENTRIES):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, RESULT_CACHE_FILE)
+        self.max_entries = max_entries
+        self._puts = 0
+        self._connect()
+
+    def _connect(self):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=5.0, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute('PRAGMA journal_mode=WAL')
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS results ('
+                'key TEXT PRIMARY KEY, fingerprint TEXT, value TEXT, created REAL)'
+            )
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS manifest ('
+                'name TEXT PRIMARY KEY, paths TEXT, fingerprint TEXT)'
+            )
+
+    def after_fork(self):
+        """
+        Abre uma conexão própria no processo filho (uma conexão sqlite não
+        pode ser usada dos dois lados de um fork)
+        """
+        # A conexão herdada nunca é fechada aqui: fechá-la no filho poderia
+        # mexer nos locks e no WAL ainda em uso pelo processo pai
+        self._inherited_conn = self._conn
+        self._connect()
+
+    def get(self, key):
+        """Resposta serializada ou None"""
+        with self._lock:
+            row = self._conn.execute('SELECT value FROM results WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else None
+
+    def put(self, key, fingerprint, value):
+        """Grava a resposta serializada, descartando as mais antigas se necessário"""
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO results (key, fingerprint, value, created) VALUES (?, ?, ?, ?)',
+                (key, fingerprint, value, time.time())
+            )
+
+            # Limite de tamanho verificado a cada 100 gravações
+            self._puts += 1
+            if self._puts % 100 == 0:
+                self._conn.execute(
+                    'DELETE FROM results WHERE key IN ('
+                    'SELECT key FROM results ORDER BY created DESC LIMIT -1 OFFSET ?)',
+                    (self.max_entries,)
+                )
+
+    def set_manifest(self, name, paths, fingerprint):
+        """
+        Registra os arquivos e a impressão digital atuais de um backend e
+        descarta as respostas de impressões digitais que não estão em uso
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO manifest (name, paths, fingerprint) VALUES (?, ?, ?)',
+                (name, json.dumps(list(paths)), fingerprint)
+            )
+            self._conn.execute(
+                'DELETE FROM results WHERE fingerprint NOT IN (SELECT fingerprint FROM manifest)'
+            )
+
+    def get_manifest(self, name):
+        """Lista de arquivos registrada para o backend, ou None"""
+        with self._lock:
+            row = self._conn.execute('SELECT paths FROM manifest WHERE name = ?', (name,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+class ResultCache:
+    """
+    Cache de respostas em dois níveis: LRU em memória e sqlite opcional
+
+    As respostas são guardadas serializadas em JSON, então cada acerto
+    devolve uma cópia independente (o chamador pode alterá-la).
+    """
+
+    def __init__(self, maxsize=RESULT_CACHE_SIZE, cache_dir=None):
+        """
+        Args:
+            maxsize: Quantidade de respostas no LRU em memória
+            cache_dir: Diretório do cache em disco (None: só memória)
+        """
+        self.memory = LRUCache(maxsize)
+        self.disk = SqliteResultStore(cache_dir) if cache_dir else None
+        self.disk_hits = 0
+        self.disk_misses = 0
+
+    def after_fork(self):
+        """Prepara o cache para uso em um processo filho (ver serving_pool.py)"""
+        if self.disk is not None:
+            self.disk.after_fork()
+
+    def get(self, key):
+        """Resposta (dict) ou None"""
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is None:
+                self.disk_misses += 1
+            else:
+                self.disk_hits += 1
+                self.memory.put(key, value)
+
+        return json.loads(value) if value is not None else None
+
+    def put(self, key, fingerprint, response):
+        """Guarda a resposta nos dois níveis"""
+        value = json.dumps(response, ensure_ascii=False)
+        self.memory.put(key, value)
+        if self.disk is not None:
+            try:
+                self.disk.put(key, fingerprint, value)
+            except sqlite3.Error as e:
+                print(f"Erro ao gravar no cache de resultados: {str(e)}")
+
+    def set_manifest(self, name, paths, fingerprint):
+        """Registra a impressão digital atual do backend (ver SqliteResultStore)"""
+        if self.disk is not None:
+            try:
+                self.disk.set_manifest(name, paths, fingerprint)
+            except sqlite3.Error as e:
+                print(f"Erro ao gravar no cache de resultados: {str(e)}")
+
+    def manifest_fingerprint(self, name):
+        """
+        Impressão digital atual dos arquivos registrados para o backend,
+        calculada sem carregar modelos (None se não houver manifesto)
+        """
+        if self.disk is None:
+            return None
+
+        paths = self.disk.get_manifest(name)
+        return file_fingerprint(paths) if paths else None
+
+    def stats(self):
+        """Contadores dos dois níveis"""
+        stats = {
+            'memory': self.memory.stats()
+        }
+        if self.disk is not None:
+            stats['disk'] = {
+                'path': self.disk.path,
+                'size': len(self.disk),
+                'hits': self.disk_hits,
+                'misses': self.disk_misses
+            }
+        return stats
+
+def hybrid_weights_key(system, method):
+    """Pesos que entram na chave (só no método 'hybrid', cujo resultado depende deles)"""
+    if method != 'hybrid' or getattr(system, 'hybrid_weights', None) is None:
+        return None
+    return format_weights(system.hybrid_weights)
+
+def cached_recommendations(system, synopsis, method='tfidf', year=None, rating=None, genre=None,
+                           n_recommendations=5, ranking='rating'):
+    """
+    get_recommendations passando pelo cache de resultados do sistema
+
+    Só respostas sem erro são guardadas.
+    """
+    key = result_key('recommendations', system.dataset_fingerprint, synopsis, method,
+                     year, rating, genre, n_recommendations, ranking,
+                     hybrid_weights_key(system, method))
+    with system.metrics.stage('result_cache'):
+        response = system.result_cache.get(key)
+    if response is not None:
+        return response
+
+    response = system.get_recommendations(synopsis, method, year, rating, genre,
+                                          n_recommendations, ranking)
+    if 'error' not in response:
+        system.result_cache.put(key, system.dataset_fingerprint, response)
+    return response
+
+def cached_recommendations_batch(system, queries):
+    """
+    get_recommendations_batch passando pelo cache de resultados: só as
+    consultas sem resposta em cache vão para o lote
+
+    Args:
+        queries: Lista de dicts com os parâmetros de get_recommendations
+            ('synopsis' e, opcionalmente, 'method', 'year', 'rating',
+            'genre', 'n_recommendations' e 'ranking')
+    """
+    keys = [
+        result_key('recommendations', system.dataset_fingerprint, query.get('synopsis', ''),
+                   query.get('method', 'tfidf'), query.get('year'), query.get('rating'),
+                   query.get('genre'), query.get('n_recommendations', 5), query.get('ranking', 'rating'),
+                   hybrid_weights_key(system, query.get('method', 'tfidf')))
+        for query in queries
+    ]
+
+    with system.metrics.stage('result_cache'):
+        responses = [system.result_cache.get(key) for key in keys]
+
+    missing = [i for i, response in enumerate(responses) if response is None]
+    if missing:
+        results = system.get_recommendations_batch([queries[i] for i in missing])
+        for i, response in zip(missing, results):
+            responses[i] = response
+            if 'error' not in response:
+                system.result_cache.put(keys[i], system.dataset_fingerprint, response)
+
+    return responses
@@ -1,61 +1,564 @@
 #!/usr/bin/env python3
 """
 Script para executar recomendações usando modelos treinados
+
+Modos de execução:
+    python3 run_recommendation.py '<json_data>'    # uma requisição e sai
+    python3 run_recommendation.py '{"queries": [...]}'  # várias sinopses em lote
+    python3 run_recommendation.py --worker          # JSON por linha via stdin/stdout
+    python3 run_recommendation.py --socket <path>   # JSON por linha via Unix socket
+    python3 run_recommendation.py --socket <path> --workers N  # pool pré-fork de N processos
+    python3 run_recommendation.py --compact ...     # usa models/fiapflix_compact.npz (ou --compact-path)
+
+Nos modos worker e socket os modelos são carregados uma única vez e o
+processo atende várias requisições, evitando o custo de inicialização
+(imports + load_models) a cada chamada. A requisição {"command": "reload"}
+recarrega modelos e dataset caso os arquivos tenham mudado em disco e
+{"command": "stats"} retorna os contadores dos caches.
+
+Instrumentação (ver instrumentation.py): com --metrics cada estágio
+(carga, pré-processamento, vetorização, predição, seleção, análise do
+cluster, serialização) alimenta histogramas exportados no formato do
+Prometheus por {"command": "metrics"} ou, com --metrics-port, em
+GET /metrics. Qualquer requisição pode incluir "timings": true (bloco
+'timings' com o tempo de cada estágio na resposta) e "profile": "cpu" ou
+"memory" (resumo de cProfile/tracemalloc no bloco 'profile').
+
+Com --workers N o modo socket usa o pool pré-fork de serving_pool.py: os
+modelos são carregados uma vez e compartilhados (copy-on-write) por N
+processos, cada requisição tem um tempo limite (--request-timeout) e as
+conexões excedentes aguardam na fila do socket (--max-pending).
+
+No modo socket com um único processo, as consultas de conexões
+concorrentes passam pelo agendador de micro-lotes (batch_scheduler.py):
+as que chegam dentro de --batch-window-ms (até --max-batch-size) são
+atendidas em um único get_recommendations_batch. --max-batch-size 1
+desliga o agendador.
+
+Com --cache-dir (ou a variável FIAPFLIX_RESULT_CACHE_DIR) as respostas
+ficam também em um cache sqlite em disco; no modo de execução única uma
+resposta já em cache é devolvida sem carregar os modelos.
+
+Com --featurizer hashing (ou FIAPFLIX_FEATURIZER=hashing) as sinopses são
+vetorizadas pelo HashingFeaturizer (hashing_featurizer.py), sem carregar o
+vocabulário do tfidf_vectorizer.pkl.
+
+O método "hybrid" combina os dois modelos e a similaridade com cada filme
+(hybrid_scoring.py), com pesos definidos por --hybrid-weights.
 """
 
 import sys
 import json
 import os
+import argparse
+import socketserver
+import time
 from pathlib import Path
 
 # Adicionar o diretório atual ao path
 sys.path.append(str(Path(__file__).parent))
 
-try:
-    from ml_model_trained import get_recommendations_for_synopsis, get_cluster_analysis
-except ImportError:
-    print(json.dumps({"error": "Não foi possível importar o sistema de recomendação"}))
-    sys.exit(1)
+from batch_scheduler import DEFAULT_MAX_BATCH_SIZE, DEFAULT_WINDOW_MS, MicroBatchScheduler
+from hashing_featurizer import FEATURIZER_ENV, FEATURIZERS, featurizer_from_env
+from hybrid_scoring import HYBRID_WEIGHTS_ENV, format_weights, parse_weights, weights_from_env
+from instrumentation import (METRICS_ENV, PROMETHEUS_CONTENT_TYPE, collect_timings,
+                             profile_request, start_metrics_server)
+from result_cache import ResultCache, RESULT_CACHE_DIR_ENV, cached_recommendations_batch, result_key
+from serving_pool import DEFAULT_MAX_PENDING, DEFAULT_REQUEST_TIMEOUT, serve_prefork
+
+# Sistema de recomendação em uso (ver load_backend)
+backend = None
+
+# Agendador de micro-lotes das consultas únicas (modo socket, ver serve_socket)
+scheduler = None
+
+def load_backend(compact_path=None):
+    """
+    Carrega o sistema de recomendação
+
+    Args:
+        compact_path: Artefato compacto (compact_model.py). Se informado, a
+            inferência usa só NumPy, sem importar pandas nem scikit-learn.
+    """
+    global backend
+
+    if compact_path:
+        from compact_model import CompactRecommender
+        backend = CompactRecommender(compact_path)
+    else:
+        from ml_model_trained import movie_system
+        backend = movie_system
+
+    register_cache_metrics(backend)
+    return backend
+
+def register_cache_metrics(system):
+    """Exporta os contadores dos caches do sistema como gauges"""
+    def numeric_stats(prefix, stats):
+        gauges = {}
+        for stat, value in stats.items():
+            if isinstance(value, dict):
+                gauges.update(numeric_stats(f'{prefix}_{stat}', value))
+            elif isinstance(value, (int, float)) and not isinstance(value, bool):
+                gauges[f'{prefix}_{stat}'] = value
+        return gauges
+
+    def cache_gauges():
+        gauges = numeric_stats('query_cache', system.query_cache.stats())
+        gauges.update(numeric_stats('result_cache', system.result_cache.stats()))
+        return gauges
+
+    system.metrics.add_collector(cache_gauges)
+
+def analysis_method(method):
+    """
+    Método cujos clusters descrevem o resultado (a busca 'ann' e o método
+    'hybrid' usam o cluster TF-IDF da consulta)
+    """
+    return 'tfidf' if method in ('ann', 'hybrid') else method
+
+def request_params(input_data):
+    """Parâmetros de uma requisição única, com os valores padrão"""
+    return {
+        'synopsis': input_data.get('synopsis', ''),
+        'method': input_data.get('method', 'tfidf'),
+        'year': input_data.get('year', 2000),
+        'rating': input_data.get('rating', 8.0),
+        'genre': input_data.get('genre', 'Drama'),
+        'n_recommendations': input_data.get('n_recommendations', 5),
+        'ranking': input_data.get('ranking', 'rating')
+    }
+
+def process_request(input_data, batched=True):
+    """
+    Processa uma requisição de recomendação e retorna o resultado (dict)
+
+    Requisições com o campo 'queries' (lista de consultas) são atendidas em
+    lote por process_batch_request. Com o agendador ativo (e batched), a
+    consulta entra no próximo micro-lote.
+    """
+    if input_data.get('command') == 'reload':
+        return {
+            'reloaded': backend.reload_if_changed()
+        }
+
+    if input_data.get('command') == 'stats':
+        return {
+            'query_cache': backend.query_cache.stats(),
+            'result_cache': backend.result_cache.stats(),
+            'metrics': backend.metrics.snapshot()
+        }
+
+    if input_data.get('command') == 'metrics':
+        return {
+            'content_type': PROMETHEUS_CONTENT_TYPE,
+            'metrics': backend.metrics.to_prometheus()
+        }
+
+    if 'queries' in input_data:
+        return process_batch_request(input_data)
+
+    params = request_params(input_data)
+
+    if not params['synopsis']:
+        return {
+            'error': 'Sinopse é obrigatória'
+        }
+
+    # Obter recomendações
+    if batched and scheduler is not None:
+        result = scheduler(params)
+    else:
+        result = backend.get_recommendations_cached(**params)
+    count_request(params['method'], result)
+
+    # Obter análise do cluster se disponível
+    if result.get('cluster') is not None:
+        cluster_analysis = backend.get_cluster_analysis(result['cluster'], analysis_method(params['method']))
+        result['cluster_analysis'] = cluster_analysis
+
+    return result
+
+def process_batch_request(input_data):
+    """
+    Processa uma requisição em lote: {"queries": [{...}, ...]}
+
+    Retorna {"results": [...]} com um resultado por consulta, na mesma ordem.
+    """
+    queries = input_data.get('queries')
+    if not isinstance(queries, list):
+        return {
+            'error': 'O campo queries deve ser uma lista'
+        }
+
+    results = [None] * len(queries)
+    valid_indices = []
+    valid_queries = []
+    for i, query in enumerate(queries):
+        if not isinstance(query, dict) or not query.get('synopsis'):
+            results[i] = {
+                'error': 'Sinopse é obrigatória'
+            }
+            continue
+
+        valid_indices.append(i)
+        valid_queries.append({
+            'synopsis': query['synopsis'],
+            'method': query.get('method', 'tfidf'),
+            'year': query.get('year', 2000),
+            'rating': query.get('rating', 8.0),
+            'genre': query.get('genre', 'Drama'),
+            'ranking': query.get('ranking', 'rating'),
+            'n_recommendations': query.get('n_recommendations', input_data.get('n_recommendations', 5))
+        })
+
+    batch_results = backend.get_recommendations_batch(valid_queries) if valid_queries else []
+
+    for i, query, result in zip(valid_indices, valid_queries, batch_results):
+        count_request(query['method'], result)
+
+        # Obter análise do cluster se disponível
+        if result.get('cluster') is not None:
+            result['cluster_analysis'] = backend.get_cluster_analysis(result['cluster'], analysis_method(query['method']))
+        results[i] = result
+
+    return {
+        'results': results
+    }
+
+def count_request(method, result):
+    """Contadores de consultas e de erros por método"""
+    backend.metrics.inc('requests_total', method=method)
+    if result.get('error'):
+        backend.metrics.inc('request_errors_total', method=method)
+
+def process_instrumented(input_data):
+    """
+    process_request com os blocos opcionais 'timings' ("timings": true) e
+    'profile' ("profile": "cpu" ou "memory") pedidos na requisição
+
+    Requisições instrumentadas não passam pelo agendador de micro-lotes,
+    para que os tempos e o perfil sejam medidos na própria thread.
+    """
+    want_timings = bool(input_data.get('timings'))
+    profile_mode = input_data.get('profile')
+    if not want_timings and not profile_mode:
+        return process_request(input_data)
+
+    with collect_timings() as timings, profile_request(profile_mode) as profile:
+        response = process_request(input_data, batched=False)
+
+    if want_timings:
+        response['timings'] = timings.as_dict()
+    if profile_mode:
+        response['profile'] = profile
+    return response
+
+def encode_response(response, indent=None):
+    """
+    Serializa a resposta em JSON, medindo o estágio 'serialize'
+
+    Se a resposta tiver o bloco 'timings', o tempo de serialização é
+    incluído nele (a resposta é então serializada uma segunda vez).
+    """
+    start = time.perf_counter()
+    text = json.dumps(response, ensure_ascii=False, indent=indent)
+    elapsed = time.perf_counter() - start
+
+    if backend is not None and backend.metrics.enabled:
+        backend.metrics.observe('stage_duration_seconds', elapsed, stage='serialize')
+
+    timings = response.get('timings')
+    if isinstance(timings, dict) and 'stages_ms' in timings:
+        timings['stages_ms']['serialize'] = elapsed * 1000
+        text = json.dumps(response, ensure_ascii=False, indent=indent)
+
+    return text
+
+def single_request_key(input_data, fingerprint):
+    """
+    Chave da resposta completa de uma requisição única no cache de
+    resultados (None para comandos, lotes e requisições inválidas)
+    """
+    if not isinstance(input_data, dict) or 'command' in input_data or 'queries' in input_data:
+        return None
+    if not input_data.get('synopsis') or not fingerprint:
+        return None
+
+    params = request_params(input_data)
+    weights = format_weights(weights_from_env()) if params['method'] == 'hybrid' else None
+    return result_key('request', fingerprint, weights=weights, **params)
+
+def cached_response(json_data, backend_name):
+    """
+    Resposta do cache em disco para o modo de execução única, consultada
+    antes de carregar os modelos (a impressão digital vem do manifesto)
+    """
+    cache_dir = os.environ.get(RESULT_CACHE_DIR_ENV)
+    if not cache_dir:
+        return None
+
+    try:
+        input_data = json.loads(json_data)
+    except json.JSONDecodeError:
+        return None
+
+    cache = ResultCache(cache_dir=cache_dir)
+    key = single_request_key(input_data, cache.manifest_fingerprint(backend_name))
+    return cache.get(key) if key else None
+
+def store_response(input_data, result):
+    """Guarda a resposta completa de uma requisição única no cache"""
+    if 'error' in result:
+        return
+
+    key = single_request_key(input_data, backend.dataset_fingerprint)
+    if key:
+        # Tempos e perfil são desta execução, não da resposta
+        cached = {name: value for name, value in result.items() if name not in ('timings', 'profile')}
+        backend.result_cache.put(key, backend.dataset_fingerprint, cached)
+
+def handle_line(line):
+    """
+    Processa uma linha JSON do protocolo do worker e retorna a resposta (dict)
+
+    O campo opcional 'id' da requisição é devolvido na resposta para que o
+    cliente possa casar respostas com requisições.
+    """
+    try:
+        input_data = json.loads(line)
+    except json.JSONDecodeError as e:
+        return {
+            'error': f'Erro ao fazer parse do JSON: {str(e)}'
+        }
+
+    if not isinstance(input_data, dict):
+        return {
+            'error': 'Requisição deve ser um objeto JSON'
+        }
+
+    try:
+        response = process_instrumented(input_data)
+    except Exception as e:
+        response = {
+            'error': f'Erro interno: {str(e)}'
+        }
+
+    if 'id' in input_data:
+        response['id'] = input_data['id']
+
+    return response
+
+def serve_stdio():
+    """
+    Modo worker: lê uma requisição JSON por linha do stdin e escreve uma
+    resposta JSON por linha no stdout
+    """
+    # Mensagens de diagnóstico do sistema de recomendação (print) não podem
+    # se misturar ao protocolo, então vão para o stderr
+    protocol_out = sys.stdout
+    sys.stdout = sys.stderr
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        response = handle_line(line)
+        protocol_out.write(encode_response(response) + '\n')
+        protocol_out.flush()
+
+class RecommendationRequestHandler(socketserver.StreamRequestHandler):
+    """
+    Atende uma conexão do Unix socket: uma requisição JSON por linha
+    """
+
+    def handle(self):
+        for raw_line in self.rfile:
+            line = raw_line.decode('utf-8').strip()
+            if not line:
+                continue
+
+            response = handle_line(line)
+            self.wfile.write((encode_response(response) + '\n').encode('utf-8'))
+            self.wfile.flush()
+
+class RecommendationSocketServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Servidor Unix socket com uma thread por conexão"""
+    daemon_threads = True
+
+def recommend_batch(queries):
+    """
+    Executa um micro-lote de consultas únicas (parâmetros de request_params)
+
+    Lotes de uma consulta (tráfego ocioso) usam o caminho de consulta única,
+    mais barato que get_recommendations_batch para uma sinopse.
+    """
+    if len(queries) == 1:
+        return [backend.get_recommendations_cached(**queries[0])]
+    return cached_recommendations_batch(backend, queries)
+
+def serve_socket(socket_path, batch_window_ms=DEFAULT_WINDOW_MS, max_batch_size=DEFAULT_MAX_BATCH_SIZE):
+    """
+    Modo socket: atende requisições JSON por linha em um Unix socket local
+
+    Com max_batch_size > 1, as consultas únicas das conexões concorrentes
+    são agrupadas pelo agendador de micro-lotes.
+    """
+    global scheduler
+
+    sys.stdout = sys.stderr
+
+    if max_batch_size > 1:
+        scheduler = MicroBatchScheduler(
+            recommend_batch,
+            window_ms=batch_window_ms,
+            max_batch_size=max_batch_size,
+            metrics=backend.metrics
+        )
+
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    with RecommendationSocketServer(socket_path, RecommendationRequestHandler) as server:
+        print(f"🐍 Worker de recomendação ouvindo em {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            if scheduler is not None:
+                scheduler.close()
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+
+def serve_socket_pool(socket_path, n_workers, request_timeout, max_pending, metrics_port=None):
+    """
+    Modo socket com pool pré-fork: N processos compartilhando os modelos
+    já carregados (ver serving_pool.py)
+
+    Com metrics_port, o worker i expõe suas métricas em metrics_port + i.
+    """
+    sys.stdout = sys.stderr
+
+    def on_worker_start(index):
+        backend.result_cache.after_fork()
+        if metrics_port is not None:
+            server = start_metrics_server(backend.metrics, metrics_port + index)
+            print(f"📈 Métricas do worker {index} em http://127.0.0.1:{server.server_port}/metrics")
+
+    serve_prefork(
+        socket_path,
+        lambda line: encode_response(handle_line(line)),
+        n_workers,
+        request_timeout=request_timeout,
+        max_pending=max_pending,
+        reload=backend.reload_if_changed,
+        on_worker_start=on_worker_start
+    )
 
 def main():
     """Função principal"""
-    if len(sys.argv) < 2:
-        print("Uso: python3 run_recommendation.py <json_data>")
+    parser = argparse.ArgumentParser(description='Recomendações usando modelos treinados')
+    parser.add_argument('json_data', nargs='?', help='Requisição JSON (modo de execução única)')
+    parser.add_argument('--worker', action='store_true',
+                        help='Atende requisições JSON por linha via stdin/stdout')
+    parser.add_argument('--socket', metavar='PATH',
+                        help='Atende requisições JSON por linha em um Unix socket')
+    parser.add_argument('--workers', type=int, default=1, metavar='N',
+                        help='Processos do pool pré-fork no modo socket (padrão: 1, sem pool)')
+    parser.add_argument('--request-timeout', type=float, default=DEFAULT_REQUEST_TIMEOUT, metavar='SEC',
+                        help='Tempo limite por requisição no pool pré-fork')
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING, metavar='N',
+                        help='Conexões aguardando um worker livre no pool pré-fork')
+    parser.add_argument('--batch-window-ms', type=float, default=DEFAULT_WINDOW_MS, metavar='MS',
+                        help='Janela do agendador de micro-lotes no modo socket')
+    parser.add_argument('--max-batch-size', type=int, default=DEFAULT_MAX_BATCH_SIZE, metavar='N',
+                        help='Consultas por micro-lote no modo socket (1 desliga o agendador)')
+    parser.add_argument('--compact', action='store_true',
+                        help='Usa o artefato compacto (inferência sem pandas/scikit-learn)')
+    parser.add_argument('--compact-path', metavar='NPZ',
+                        help='Artefato compacto usado (padrão: models/fiapflix_compact.npz; implica --compact)')
+    parser.add_argument('--featurizer', choices=FEATURIZERS,
+                        help='Featurização das sinopses (hashing: sem o vocabulário do TF-IDF)')
+    parser.add_argument('--hybrid-weights', metavar='PESOS',
+                        help='Pesos do método hybrid (ex.: tfidf=0.3,all_features=0.2,similarity=0.5)')
+    parser.add_argument('--cache-dir', metavar='DIR',
+                        help='Diretório do cache de resultados em disco')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Liga as métricas por estágio (comando {"command": "metrics"})')
+    parser.add_argument('--metrics-port', type=int, metavar='PORT',
+                        help='Expõe as métricas em http://127.0.0.1:PORT/metrics (implica --metrics)')
+    args = parser.parse_args()
+
+    compact_path = args.compact_path or ('models/fiapflix_compact.npz' if args.compact else None)
+
+    if args.cache_dir:
+        os.environ[RESULT_CACHE_DIR_ENV] = args.cache_dir
+
+    if args.metrics or args.metrics_port is not None:
+        os.environ[METRICS_ENV] = '1'
+
+    if args.featurizer:
+        os.environ[FEATURIZER_ENV] = args.featurizer
+
+    if args.hybrid_weights:
+        try:
+            parse_weights(args.hybrid_weights)
+        except ValueError as e:
+            parser.error(str(e))
+        os.environ[HYBRID_WEIGHTS_ENV] = args.hybrid_weights
+
+    # Execução única: resposta já em cache dispensa carregar os modelos
+    if args.json_data and not (args.worker or args.socket):
+        featurizer = featurizer_from_env()
+        cached = cached_response(args.json_data, 'compact' if compact_path
+                                 else 'full' if featurizer == 'tfidf' else featurizer)
+        if cached is not None:
+            print(json.dumps(cached, ensure_ascii=False, indent=2))
+            return
+
+    try:
+        load_backend(compact_path)
+    except ImportError:
+        print(json.dumps({"error": "Não foi possível importar o sistema de recomendação"}))
+        sys.exit(1)
+
+    if args.socket and args.workers > 1:
+        serve_socket_pool(args.socket, args.workers, args.request_timeout,
+                          args.max_pending, args.metrics_port)
+        return
+
+    if args.metrics_port is not None:
+        server = start_metrics_server(backend.metrics, args.metrics_port)
+        print(f"📈 Métricas em http://127.0.0.1:{server.server_port}/metrics", file=sys.stderr)
+
+    if args.worker:
+        serve_stdio()
+        return
+
+    if args.socket:
+        serve_socket(args.socket, args.batch_window_ms, args.max_batch_size)
+        return
+
+    if not args.json_data:
+        print("Uso: python3 run_recommendation.py <json_data> | --worker | --socket <path>")
         sys.exit(1)
-    
+
     try:
         # Parse dos dados de entrada
-        input_data = json.loads(sys.argv[1])
-        
-        synopsis = input_data.get('synopsis', '')
-        method = input_data.get('method', 'tfidf')
-        year = input_data.get('year', 2000)
-        rating = input_data.get('rating', 8.0)
-        genre = input_data.get('genre', 'Drama')
-        
-        if not synopsis:
-            print(json.dumps({
-                'error': 'Sinopse é obrigatória'
-            }))
+        input_data = json.loads(args.json_data)
+
+        result = process_instrumented(input_data)
+        store_response(input_data, result)
+
+        if 'error' in result and 'recommendations' not in result:
+            print(json.dumps(result))
             sys.exit(1)
-        
-        # Obter recomendações
-        result = get_recommendations_for_synopsis(
-            synopsis=synopsis,
-            method=method,
-            year=year,
-            rating=rating,
-            genre=genre
-        )
-        
-        # Obter análise do cluster se disponível
-        if result.get('cluster') is not None:
-            cluster_analysis = get_cluster_analysis(result['cluster'], method)
-            result['cluster_analysis'] = cluster_analysis
-        
+
         # Retornar resultado em JSON
-        print(json.dumps(result, ensure_ascii=False, indent=2))
-        
+        print(encode_response(result, indent=2))
+
     except json.JSONDecodeError as e:
         print(json.dumps({
             'error': f'Erro ao fazer parse do JSON: {str(e)}'
@@ -69,4 +572,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
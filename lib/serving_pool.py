@@ -0,0 +1,341 @@
+#!/usr/bin/env python3
+"""
+Pool pré-fork para atender recomendações em vários processos
+
+O processo pai carrega modelos e catálogo uma única vez, congela o heap
+(gc.freeze) e faz fork de N workers. Arrays NumPy, matriz TF-IDF e índices
+ficam compartilhados copy-on-write (e o artefato compacto, mapeado com
+mmap, fica no page cache), então a memória residente não se multiplica
+pela quantidade de workers.
+
+Todos os workers aceitam conexões do mesmo Unix socket, criado pelo pai:
+cada worker atende uma conexão por vez (uma requisição JSON por linha) e
+as conexões excedentes esperam na fila do listen (max_pending). Cada
+requisição tem um tempo limite (SIGALRM); o worker que estoura o limite
+responde com erro e é substituído, já que seu estado pode ter ficado
+inconsistente. Workers que morrem são recriados pelo pai.
+
+Sinais no pai: SIGTERM/SIGINT encerram o pool; SIGHUP recarrega modelos
+e dataset se os arquivos mudaram e troca os workers (cada um termina a
+requisição em andamento antes de sair).
+
+Uso (ver run_recommendation.py):
+    python3 lib/run_recommendation.py --socket /tmp/fiapflix.sock --workers 4
+"""
+
+import gc
+import json
+import os
+import signal
+import socket
+import sys
+import time
+import traceback
+
+# Conexões aguardando um worker livre (backlog do listen)
+DEFAULT_MAX_PENDING = 64
+
+# Tempo limite de uma requisição, em segundos
+DEFAULT_REQUEST_TIMEOUT = 10.0
+
+# Conexão sem novas requisições por esse tempo (s) é fechada, liberando o worker
+DEFAULT_IDLE_TIMEOUT = 60.0
+
+# Tempo (s) para os workers terminarem a requisição atual ao encerrar o pool
+SHUTDOWN_GRACE = 10.0
+
+# Worker que morre antes disso (s) é recriado só após uma pausa
+MIN_WORKER_LIFETIME = 1.0
+
+# Sinais tratados pelo pai (bloqueados e lidos com sigwaitinfo)
+PARENT_SIGNALS = {getattr(signal, name) for name in ('SIGCHLD', 'SIGTERM', 'SIGINT', 'SIGHUP')
+                  if hasattr(signal, name)}
+
+class RequestTimeout(BaseException):
+    """
+    Tempo limite da requisição excedido (BaseException para não ser
+    capturada pelos tratamentos de Exception do processamento)
+    """
+
+class _Shutdown(BaseException):
+    """Encerramento do worker pedido pelo pai enquanto ocioso"""
+
+def request_id(line):
+    """Campo 'id' de uma requisição JSON, se houver"""
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return data.get('id') if isinstance(data, dict) else None
+
+def is_reload_request(line):
+    """Se a linha é o comando {"command": "reload"}"""
+    if 'reload' not in line:
+        return False
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return False
+    return isinstance(data, dict) and data.get('command') == 'reload'
+
+def create_listener(socket_path, max_pending=DEFAULT_MAX_PENDING):
+    """Unix socket de escuta compartilhado pelos workers"""
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(max_pending)
+    return listener
+
+class PreforkServer:
+    """
+    Processo pai do pool: cria o socket, faz fork dos workers e os
+    supervisiona
+    """
+
+    def __init__(self, socket_path, handle_line, n_workers,
+                 request_timeout=DEFAULT_REQUEST_TIMEOUT,
+                 idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 max_pending=DEFAULT_MAX_PENDING,
+                 reload=None, on_worker_start=None):
+        """
+        Args:
+            socket_path: Caminho do Unix socket
+            handle_line: Função linha JSON (str) -> resposta JSON (str)
+            n_workers: Quantidade de processos workers
+            request_timeout: Tempo limite por requisição (s, None: sem limite)
+            idle_timeout: Conexão ociosa por mais que isso é fechada (s)
+            max_pending: Conexões aguardando na fila do socket
+            reload: Função chamada no pai em SIGHUP/{"command": "reload"};
+                retorna True se recarregou (os workers são então trocados)
+            on_worker_start: Função chamada em cada worker logo após o fork,
+                com o índice do worker (0..n_workers-1)
+        """
+        if not hasattr(signal, 'sigwaitinfo') or not hasattr(os, 'fork'):
+            raise RuntimeError('O pool pré-fork requer Linux')
+
+        self.socket_path = socket_path
+        self.handle_line = handle_line
+        self.n_workers = n_workers
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self.max_pending = max_pending
+        self.reload = reload
+        self.on_worker_start = on_worker_start
+        self.listener = None
+        self.workers = {}
+        self.stopping = False
+
+    def serve_forever(self):
+        """Atende até receber SIGTERM/SIGINT"""
+        self.listener = create_listener(self.socket_path, self.max_pending)
+
+        # Sinais ignorados (ex.: SIGINT em processos em background) seriam
+        # descartados em vez de ficarem pendentes para o sigwaitinfo
+        for signum in PARENT_SIGNALS:
+            signal.signal(signum, signal.SIG_DFL)
+        signal.pthread_sigmask(signal.SIG_BLOCK, PARENT_SIGNALS)
+
+        try:
+            self._freeze_heap()
+            for index in range(self.n_workers):
+                self._spawn(index)
+
+            print(f"🐍 Pool de {self.n_workers} workers ouvindo em {self.socket_path}")
+            self._supervise()
+        finally:
+            self.listener.close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, PARENT_SIGNALS)
+
+    def _freeze_heap(self):
+        """
+        Move os objetos já carregados para a geração permanente do GC, para
+        que as coletas nos workers não escrevam nessas páginas (o que
+        desfaria o compartilhamento copy-on-write)
+        """
+        gc.unfreeze()
+        gc.collect()
+        gc.freeze()
+
+    def _spawn(self, index):
+        pid = os.fork()
+        if pid:
+            self.workers[pid] = (index, time.monotonic())
+            return
+
+        # Processo filho
+        code = 0
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.pthread_sigmask(signal.SIG_UNBLOCK, PARENT_SIGNALS)
+
+            if self.on_worker_start is not None:
+                self.on_worker_start(index)
+
+            PreforkWorker(self.listener, self.handle_line, self.request_timeout,
+                          self.idle_timeout).run()
+        except BaseException:
+            traceback.print_exc()
+            code = 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _supervise(self):
+        deadline = None
+        while self.workers:
+            if deadline is None:
+                info = signal.sigwaitinfo(PARENT_SIGNALS)
+            else:
+                info = signal.sigtimedwait(PARENT_SIGNALS, max(0.0, deadline - time.monotonic()))
+                if info is None:
+                    # Workers que não terminaram a tempo
+                    self._signal_workers(signal.SIGKILL)
+                    deadline = time.monotonic() + SHUTDOWN_GRACE
+
+            signum = info.si_signo if info is not None else None
+            if signum in (signal.SIGTERM, signal.SIGINT) and not self.stopping:
+                print("🛑 Encerrando pool de workers")
+                self.stopping = True
+                deadline = time.monotonic() + SHUTDOWN_GRACE
+                self._signal_workers(signal.SIGTERM)
+            elif signum == signal.SIGHUP and not self.stopping:
+                self._reload()
+
+            self._reap()
+
+    def _reap(self):
+        """Recolhe os workers encerrados e recria os que faltam"""
+        while self.workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.workers.clear()
+                return
+            if pid == 0:
+                return
+
+            index, started = self.workers.pop(pid, (None, None))
+            if index is None or self.stopping:
+                continue
+
+            if os.waitstatus_to_exitcode(status) != 0:
+                print(f"⚠️ Worker {index} (pid {pid}) terminou com status "
+                      f"{os.waitstatus_to_exitcode(status)}; recriando")
+            if time.monotonic() - started < MIN_WORKER_LIFETIME:
+                time.sleep(MIN_WORKER_LIFETIME)
+            self._spawn(index)
+
+    def _reload(self):
+        """Recarrega no pai e troca os workers (graciosamente, via SIGTERM)"""
+        if self.reload is None:
+            return
+
+        try:
+            reloaded = self.reload()
+        except Exception as e:
+            print(f"Erro ao recarregar modelos: {str(e)}")
+            return
+
+        if reloaded:
+            print("🔄 Modelos recarregados; trocando workers")
+            self._freeze_heap()
+            self._signal_workers(signal.SIGTERM)
+
+    def _signal_workers(self, signum):
+        for pid in list(self.workers):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+class PreforkWorker:
+    """Laço de um worker: aceita conexões e atende uma linha por vez"""
+
+    def __init__(self, listener, handle_line, request_timeout, idle_timeout):
+        self.listener = listener
+        self.handle_line = handle_line
+        self.request_timeout = request_timeout
+        self.idle_timeout = idle_timeout
+        self.busy = False
+        self.stopping = False
+        self.timed_out = False
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._on_terminate)
+        signal.signal(signal.SIGALRM, self._on_alarm)
+
+        try:
+            while not self.stopping and not self.timed_out:
+                conn, _ = self.listener.accept()
+                with conn:
+                    self._serve_connection(conn)
+        except _Shutdown:
+            pass
+
+    def _on_terminate(self, signum, frame):
+        # Com uma requisição em andamento, termina após respondê-la
+        self.stopping = True
+        if not self.busy:
+            raise _Shutdown()
+
+    def _on_alarm(self, signum, frame):
+        raise RequestTimeout()
+
+    def _serve_connection(self, conn):
+        conn.settimeout(self.idle_timeout)
+        reader = conn.makefile('rb')
+        try:
+            for raw_line in reader:
+                line = raw_line.decode('utf-8').strip()
+                if not line:
+                    continue
+
+                # SIGTERM durante a requisição só encerra após a resposta
+                self.busy = True
+                try:
+                    response = self._handle(line)
+                    conn.sendall((response + '\n').encode('utf-8'))
+                finally:
+                    self.busy = False
+
+                if self.stopping or self.timed_out:
+                    return
+        except (socket.timeout, ConnectionError):
+            pass
+        finally:
+            reader.close()
+
+    def _handle(self, line):
+        """Processa uma linha com tempo limite"""
+        if is_reload_request(line):
+            # Recarga feita pelo pai, que depois troca todos os workers
+            os.kill(os.getppid(), signal.SIGHUP)
+            response = {'reloaded': None, 'reload_scheduled': True}
+            if request_id(line) is not None:
+                response['id'] = request_id(line)
+            return json.dumps(response)
+
+        try:
+            if self.request_timeout:
+                signal.setitimer(signal.ITIMER_REAL, self.request_timeout)
+            try:
+                return self.handle_line(line)
+            finally:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        except RequestTimeout:
+            self.timed_out = True
+            response = {'error': f'Tempo limite de {self.request_timeout:g}s excedido'}
+            if request_id(line) is not None:
+                response['id'] = request_id(line)
+            return json.dumps(response, ensure_ascii=False)
+
+def serve_prefork(socket_path, handle_line, n_workers, **options):
+    """Atende handle_line em um pool pré-fork (ver PreforkServer)"""
+    PreforkServer(socket_path, handle_line, n_workers, **options).serve_forever()
@@ -0,0 +1,559 @@
+#!/usr/bin/env python3
+"""
+Treinamento e comparação dos modelos KMeans do sistema de recomendação
+
+Substitui a execução manual dos notebooks (Notebook2/Notebook3): varre
+valores de k, os dois conjuntos de features (TF-IDF das sinopses e todas
+as features) e configurações do vetorizador em um pool de processos,
+registra silhouette, inércia e tempo de ajuste de cada combinação e, com
+--publish, publica os artefatos vencedores em models/. Sem --k, o vencedor
+de cada conjunto de features mantém o k dos modelos já publicados (o
+frontend conta com esse número de clusters); os outros k só entram no
+relatório. Com --hashing entram também configurações do HashingFeaturizer
+(hashing_featurizer.py), comparadas como um terceiro conjunto de features
+('hashing') e publicadas em models/hashing_featurizer.npz +
+models/kmeans_hashing.pkl, sem alterar os modelos TF-IDF.
+
+Cada configuração do vetorizador é ajustada uma única vez e sua matriz
+TF-IDF fica em cache (.cache/train_models, por impressão digital do
+dataset + configuração), reaproveitada por todos os valores de k e por
+execuções seguintes. Cada processo do pool usa uma única thread de
+BLAS/OpenMP, para que as combinações ocupem todos os núcleos sem disputar
+por eles.
+
+As features do Modelo 2 são as mesmas da inferência
+(MovieRecommendationSystem.all_features_rows): ano, rating e quantidade de
+palavras da sinopse padronizados, mais o código do gênero.
+
+Na publicação, todos os artefatos (modelos, CSV do dataset com as colunas
+cluster_tfidf/cluster_all recalculadas e relatório) são gravados primeiro
+em arquivos de preparação e só então renomeados sobre os publicados com
+os.replace, em sequência, de modo que nenhum arquivo é lido pela metade;
+models/ e o CSV continuam arquivos comuns, versionáveis no git. Uma carga
+que cruze as renomeações vê impressões digitais diferentes na próxima
+verificação (reload_if_changed) e recarrega. O índice ANN e o artefato
+compacto, que descrevem os modelos, são reconstruídos logo depois (até lá
+a busca usa o ranking exato e o modo compacto falha ao carregar, em vez de
+usar artefatos dos modelos anteriores). Servidores em execução passam a
+usar os novos arquivos com {"command": "reload"}.
+
+Uso:
+    python3 lib/train_models.py [--k 3,4,5,6,8] [--max-features 300,1000]
+        [--ngrams 1-1,1-2] [--hashing 4096,16384] [--jobs N] [--publish]
+"""
+
+import sys
+import os
+import json
+import time
+import hashlib
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from compact_model import preprocess_text
+from hashing_featurizer import HashingFeaturizer, HASHING_FEATURIZER_PATH, HASHING_KMEANS_PATH
+from result_cache import file_fingerprint
+
+# Valores de k testados por padrão
+DEFAULT_K_VALUES = (3, 4, 5, 6, 8)
+
+# Configurações do vetorizador testadas por padrão (produto cartesiano)
+DEFAULT_MAX_FEATURES = (300, 1000)
+DEFAULT_NGRAM_RANGES = ((1, 2),)
+DEFAULT_MAX_DF = 0.9
+
+# Parâmetros do KMeans
+DEFAULT_N_INIT = 10
+RANDOM_STATE = 42
+
+# Amostra usada no silhouette (O(n²) no catálogo inteiro)
+SILHOUETTE_SAMPLE_SIZE = 5000
+
+# Cache das matrizes TF-IDF e relatório do treinamento
+TRAIN_CACHE_DIR = '.cache/train_models'
+REPORT_FILE = 'training_report.json'
+
+# Conjuntos de features comparados ('hashing' só com --hashing)
+FEATURE_SETS = ('tfidf', 'hashing', 'all_features')
+
+# Matrizes já carregadas neste processo do pool (caminho -> matriz)
+_matrices = {}
+
+def catalog_texts(df):
+    """Sinopses do catálogo como na inferência (build_tfidf_matrix)"""
+    if 'sinopse_clean' in df.columns:
+        texts = df['sinopse_clean'].fillna(df['sinopse'])
+    else:
+        texts = df['sinopse']
+    return [preprocess_text(text) for text in texts.tolist()]
+
+def vectorizer_configs(max_features, ngram_ranges, max_df=DEFAULT_MAX_DF):
+    """Configurações do TfidfVectorizer a testar"""
+    return [
+        {'max_features': n_features, 'ngram_range': tuple(ngram_range), 'max_df': max_df}
+        for n_features, ngram_range in itertools.product(max_features, ngram_ranges)
+    ]
+
+def hashing_configs(n_features, ngram_ranges, max_df=DEFAULT_MAX_DF):
+    """Configurações do HashingFeaturizer a testar"""
+    return [
+        {'featurizer': 'hashing', 'n_features': width, 'ngram_range': tuple(ngram_range), 'max_df': max_df}
+        for width, ngram_range in itertools.product(n_features, ngram_ranges)
+    ]
+
+def config_feature_set(config):
+    """Conjunto de features de uma configuração ('tfidf' ou 'hashing')"""
+    return config.get('featurizer', 'tfidf')
+
+def config_key(config, fingerprint):
+    """Chave do cache de uma configuração para o dataset atual"""
+    payload = json.dumps([fingerprint, config], sort_keys=True, default=list)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:16]
+
+def _write_atomic(path, write):
+    """Grava com write(arquivo temporário aberto) e renomeia para path"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def fit_vectorizer(texts, config, cache_dir, fingerprint):
+    """
+    Ajusta o vetorizador de uma configuração e guarda a matriz TF-IDF do
+    catálogo no cache (ou reaproveita a já guardada)
+
+    Returns:
+        Tupla (caminho do vetorizador, caminho da matriz, se veio do cache)
+    """
+    import joblib
+    import scipy.sparse as sp
+
+    key = config_key(config, fingerprint)
+    hashing = config_feature_set(config) == 'hashing'
+    vectorizer_path = os.path.join(cache_dir, f'featurizer_{key}.npz' if hashing else f'vectorizer_{key}.pkl')
+    matrix_path = os.path.join(cache_dir, f'tfidf_{key}.npz')
+    if os.path.exists(vectorizer_path) and os.path.exists(matrix_path):
+        return vectorizer_path, matrix_path, True
+
+    if hashing:
+        params = {name: value for name, value in config.items() if name != 'featurizer'}
+        featurizer = HashingFeaturizer(**params)
+        X = featurizer.fit_transform(texts).tocsr()
+    else:
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        vectorizer = TfidfVectorizer(**config)
+        X = vectorizer.fit_transform(texts).tocsr()
+
+    _write_atomic(matrix_path, lambda f: sp.save_npz(f, X))
+    if hashing:
+        featurizer.save(vectorizer_path)
+    else:
+        _write_atomic(vectorizer_path, lambda f: joblib.dump(vectorizer, f))
+    return vectorizer_path, matrix_path, False
+
+def all_features_matrix(df):
+    """
+    Features do Modelo 2, como na inferência: [ano, rating, palavras]
+    padronizados + código do gênero
+
+    Returns:
+        Tupla (matriz, StandardScaler, LabelEncoder)
+    """
+    from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+    synopses = df['sinopse'].fillna('').astype(str)
+    numeric = np.column_stack([
+        df['year'].fillna(2000).to_numpy(dtype=np.float64),
+        df['rating'].fillna(8.0).to_numpy(dtype=np.float64),
+        [len(text.split()) if text else 10 for text in synopses]
+    ])
+
+    scaler = StandardScaler()
+    X_numeric = scaler.fit_transform(numeric)
+
+    le_genre = LabelEncoder()
+    genre_codes = le_genre.fit_transform(df['genre'].fillna('Drama').astype(str))
+
+    return np.hstack([X_numeric, genre_codes.reshape(-1, 1).astype(np.float64)]), scaler, le_genre
+
+def _load_matrix(path):
+    """Matriz de features (CSR .npz ou densa .npy), uma vez por processo"""
+    if path not in _matrices:
+        if path.endswith('.npz'):
+            import scipy.sparse as sp
+            _matrices[path] = sp.load_npz(path).tocsr()
+        else:
+            _matrices[path] = np.load(path)
+    return _matrices[path]
+
+def fit_kmeans(task):
+    """
+    Ajusta um KMeans e calcula suas métricas (executado no pool)
+
+    Args:
+        task: Dict com feature_set, matrix_path, k, n_init e, no TF-IDF e
+            no hashing, vectorizer (configuração) e vectorizer_path
+
+    Returns:
+        Resultado com as métricas e o estimador ajustado
+    """
+    from sklearn.cluster import KMeans
+    from sklearn.metrics import silhouette_score
+    from threadpoolctl import threadpool_limits
+
+    X = _load_matrix(task['matrix_path'])
+
+    with threadpool_limits(limits=1):
+        start = time.perf_counter()
+        kmeans = KMeans(n_clusters=task['k'], n_init=task['n_init'], random_state=RANDOM_STATE)
+        kmeans.fit(X)
+        fit_time = time.perf_counter() - start
+
+        labels = kmeans.labels_
+        silhouette = None
+        if 1 < len(np.unique(labels)) < X.shape[0]:
+            silhouette = float(silhouette_score(
+                X, labels, sample_size=min(SILHOUETTE_SAMPLE_SIZE, X.shape[0]),
+                random_state=RANDOM_STATE
+            ))
+
+    return {
+        'feature_set': task['feature_set'],
+        'vectorizer': task.get('vectorizer'),
+        'vectorizer_path': task.get('vectorizer_path'),
+        'k': task['k'],
+        'silhouette': silhouette,
+        'inertia': float(kmeans.inertia_),
+        'n_iter': int(kmeans.n_iter_),
+        'fit_time_s': fit_time,
+        'estimator': kmeans
+    }
+
+def run_pool(function, tasks, jobs):
+    """Executa function(task) para cada tarefa, em um pool de jobs processos"""
+    if jobs <= 1 or len(tasks) <= 1:
+        return [function(task) for task in tasks]
+
+    with ProcessPoolExecutor(max_workers=min(jobs, len(tasks))) as executor:
+        return list(executor.map(function, tasks))
+
+def _fit_vectorizer_task(args):
+    return fit_vectorizer(*args)
+
+def best_run(results, feature_set, k=None):
+    """
+    Melhor combinação do conjunto de features: maior silhouette, depois
+    menor inércia (só entre as com esse k, se informado)
+    """
+    candidates = [result for result in results
+                  if result['feature_set'] == feature_set and result['silhouette'] is not None
+                  and k in (None, result['k'])]
+    if not candidates:
+        return None
+    return max(candidates, key=lambda result: (result['silhouette'], -result['inertia']))
+
+def current_k(output_dir):
+    """
+    k dos modelos publicados em output_dir, por conjunto de features
+    (conjuntos sem modelo publicado ficam de fora)
+    """
+    import joblib
+    from ml_model_trained import MODEL_FILES
+
+    paths = {
+        'tfidf': MODEL_FILES['kmeans_tfidf'],
+        'hashing': HASHING_KMEANS_PATH,
+        'all_features': MODEL_FILES['kmeans_all']
+    }
+    k_values = {}
+    for feature_set, path in paths.items():
+        path = os.path.join(output_dir, os.path.basename(path))
+        if os.path.exists(path):
+            k_values[feature_set] = int(joblib.load(path).n_clusters)
+    return k_values
+
+def train(df, fingerprint, k_values, configs, jobs, n_init=DEFAULT_N_INIT, cache_dir=TRAIN_CACHE_DIR,
+          fixed_k=None):
+    """
+    Varre as combinações e retorna (resultados, vencedores por conjunto de
+    features, scaler, label encoder)
+
+    fixed_k ({conjunto de features: k}) restringe o vencedor desses
+    conjuntos ao k informado; os demais k só entram no relatório.
+    """
+    fixed_k = fixed_k or {}
+    os.makedirs(cache_dir, exist_ok=True)
+    texts = catalog_texts(df)
+
+    # Uma matriz TF-IDF por configuração do vetorizador (em paralelo)
+    vectorizers = run_pool(_fit_vectorizer_task,
+                           [(texts, config, cache_dir, fingerprint) for config in configs], jobs)
+    for config, (_, _, cached) in zip(configs, vectorizers):
+        label = 'Hashing' if config_feature_set(config) == 'hashing' else 'TF-IDF'
+        print(f"🔤 {label} {json.dumps(config, default=list)}: {'cache' if cached else 'ajustado'}")
+
+    X_all, scaler, le_genre = all_features_matrix(df)
+    all_path = os.path.join(cache_dir, f'all_features_{config_key("all_features", fingerprint)}.npy')
+    _write_atomic(all_path, lambda f: np.save(f, X_all))
+
+    tasks = [
+        {'feature_set': config_feature_set(config), 'vectorizer': config, 'vectorizer_path': vectorizer_path,
+         'matrix_path': matrix_path, 'k': k, 'n_init': n_init}
+        for config, (vectorizer_path, matrix_path, _) in zip(configs, vectorizers)
+        for k in k_values
+    ]
+    tasks += [
+        {'feature_set': 'all_features', 'matrix_path': all_path, 'k': k, 'n_init': n_init}
+        for k in k_values
+    ]
+
+    start = time.perf_counter()
+    results = run_pool(fit_kmeans, tasks, jobs)
+    print(f"⏱️ {len(tasks)} combinações em {time.perf_counter() - start:.1f}s ({jobs} processos)")
+
+    winners = {feature_set: best_run(results, feature_set, fixed_k.get(feature_set))
+               for feature_set in FEATURE_SETS}
+    return results, winners, scaler, le_genre
+
+def report_rows(results, winners):
+    """Resultados sem os estimadores, para o relatório JSON"""
+    rows = []
+    for result in results:
+        row = {key: value for key, value in result.items()
+               if key not in ('estimator', 'vectorizer_path')}
+        row['selected'] = result is winners.get(result['feature_set'])
+        rows.append(row)
+    return rows
+
+def print_report(results, winners):
+    print(f"{'features':<13} {'vetorizador':<32} {'k':>3} {'silhouette':>10} {'inércia':>12} {'tempo':>8}")
+    for row in report_rows(results, winners):
+        config = row['vectorizer']
+        if not config:
+            vectorizer = '-'
+        elif config_feature_set(config) == 'hashing':
+            vectorizer = f"{config['n_features']} colunas, ngram {config['ngram_range'][0]}-{config['ngram_range'][1]}"
+        else:
+            vectorizer = (f"{config['max_features']} termos, ngram {config['ngram_range'][0]}-"
+                          f"{config['ngram_range'][1]}")
+        silhouette = f"{row['silhouette']:.4f}" if row['silhouette'] is not None else '-'
+        marker = ' ✅' if row['selected'] else ''
+        print(f"{row['feature_set']:<13} {vectorizer:<32} {row['k']:>3} {silhouette:>10} "
+              f"{row['inertia']:>12.2f} {row['fit_time_s']:>7.2f}s{marker}")
+
+def rebuild_derived(dataset_path, rebuild_ann, rebuild_compact):
+    """
+    Reconstrói o índice ANN e o artefato compacto a partir dos modelos
+    recém-publicados (caminhos de MODEL_FILES), para que nenhum dos dois
+    continue descrevendo os modelos anteriores
+
+    Returns:
+        Caminhos reconstruídos
+    """
+    from ann_index import ANN_INDEX_DIR, build_ann_index
+    from compact_model import COMPACT_MODEL_PATH, export_compact_model
+    from ml_model_trained import MovieRecommendationSystem
+
+    system = MovieRecommendationSystem(dataset_path=dataset_path)
+    if not system.models_loaded:
+        raise RuntimeError('Modelos publicados não carregam; índice ANN e artefato compacto não reconstruídos')
+
+    rebuilt = []
+    if rebuild_ann:
+        build_ann_index(system).save(ANN_INDEX_DIR)
+        # O índice faz parte da impressão digital gravada no artefato compacto
+        system.reload_if_changed()
+        rebuilt.append(ANN_INDEX_DIR)
+    if rebuild_compact:
+        export_compact_model(system)
+        rebuilt.append(COMPACT_MODEL_PATH)
+    return rebuilt
+
+def publish(winners, scaler, le_genre, df, dataset_path, output_dir, report):
+    """
+    Publica os artefatos vencedores em output_dir e o dataset em dataset_path
+
+    Tudo (modelos, CSV do dataset e relatório) é gravado antes em um
+    diretório de preparação dentro de output_dir (o CSV, ao lado dele) e só
+    então cada arquivo toma o lugar do publicado com os.replace, em
+    sequência; os caminhos continuam arquivos comuns, versionáveis no git.
+    O artefato compacto é removido antes da troca (o modo compacto falha ao
+    carregar em vez de usar os modelos anteriores) e o índice ANN, cuja
+    impressão digital deixa de corresponder, é ignorado até ser
+    reconstruído (ver rebuild_derived).
+
+    O vencedor do hashing (se houver) é publicado à parte, nos arquivos do
+    modo hashing; os clusters do CSV continuam os do KMeans TF-IDF.
+
+    Returns:
+        Tupla (arquivos publicados, nomes dos derivados que existiam em
+        output_dir)
+    """
+    import shutil
+    import joblib
+    from ann_index import ANN_INDEX_DIR
+    from compact_model import COMPACT_MODEL_PATH
+    from ml_model_trained import CLUSTER_COLUMNS, MODEL_FILES
+
+    os.makedirs(output_dir, exist_ok=True)
+    staging_dir = os.path.join(output_dir, f'.publish-{os.getpid()}')
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    os.makedirs(staging_dir)
+
+    try:
+        tfidf, all_features = winners['tfidf'], winners['all_features']
+        artifacts = {
+            'kmeans_tfidf': tfidf['estimator'],
+            'vectorizer': joblib.load(tfidf['vectorizer_path']),
+            'kmeans_all': all_features['estimator'],
+            'scaler': scaler,
+            'le_genre': le_genre
+        }
+
+        staged = []
+        for name, artifact in artifacts.items():
+            filename = os.path.basename(MODEL_FILES[name])
+            joblib.dump(artifact, os.path.join(staging_dir, filename))
+            staged.append((os.path.join(staging_dir, filename), os.path.join(output_dir, filename)))
+
+        hashing = winners.get('hashing')
+        if hashing is not None:
+            filename = os.path.basename(HASHING_FEATURIZER_PATH)
+            shutil.copyfile(hashing['vectorizer_path'], os.path.join(staging_dir, filename))
+            staged.append((os.path.join(staging_dir, filename), os.path.join(output_dir, filename)))
+            filename = os.path.basename(HASHING_KMEANS_PATH)
+            joblib.dump(hashing['estimator'], os.path.join(staging_dir, filename))
+            staged.append((os.path.join(staging_dir, filename), os.path.join(output_dir, filename)))
+
+        with open(os.path.join(staging_dir, REPORT_FILE), 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2, default=list)
+        staged.append((os.path.join(staging_dir, REPORT_FILE), os.path.join(output_dir, REPORT_FILE)))
+
+        # Dataset com os clusters dos novos modelos (ao lado do publicado,
+        # para que os.replace não cruze sistemas de arquivos)
+        df = df.copy()
+        df[CLUSTER_COLUMNS['tfidf']] = tfidf['estimator'].labels_
+        df[CLUSTER_COLUMNS['all_features']] = all_features['estimator'].labels_
+        if 'genre_encoded' in df.columns:
+            df['genre_encoded'] = le_genre.transform(df['genre'].fillna('Drama').astype(str))
+        df.to_csv(dataset_path + '.tmp', sep=';', index=False)
+        staged.append((dataset_path + '.tmp', dataset_path))
+
+        derived = {os.path.basename(ANN_INDEX_DIR), os.path.basename(COMPACT_MODEL_PATH)}
+        had_derived = sorted(name for name in derived if os.path.exists(os.path.join(output_dir, name)))
+        compact_path = os.path.join(output_dir, os.path.basename(COMPACT_MODEL_PATH))
+        if os.path.exists(compact_path):
+            os.remove(compact_path)
+
+        # Tudo já gravado: só renomeações daqui em diante
+        for staged_path, path in staged:
+            os.replace(staged_path, path)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        if os.path.exists(dataset_path + '.tmp'):
+            os.remove(dataset_path + '.tmp')
+
+    return [path for _, path in staged], had_derived
+
+def _parse_list(value, parse):
+    return [parse(item) for item in value.split(',') if item.strip()]
+
+def _parse_ngram(value):
+    low, _, high = value.partition('-')
+    return (int(low), int(high or low))
+
+def main():
+    """Treina, compara e publica os modelos"""
+    parser = argparse.ArgumentParser(description='Treina e compara os modelos KMeans')
+    parser.add_argument('--dataset', help='CSV do catálogo (padrão: o usado pelo sistema)')
+    parser.add_argument('--k', help='Valores de k (ex.: 3,4,5; padrão: %s, e o vencedor '
+                                    'mantém o k dos modelos publicados)' % ','.join(map(str, DEFAULT_K_VALUES)))
+    parser.add_argument('--max-features', default=','.join(map(str, DEFAULT_MAX_FEATURES)),
+                        help='Tamanhos do vocabulário TF-IDF (ex.: 300,1000)')
+    parser.add_argument('--ngrams', default=','.join(f'{low}-{high}' for low, high in DEFAULT_NGRAM_RANGES),
+                        help='Faixas de n-gramas (ex.: 1-1,1-2)')
+    parser.add_argument('--max-df', type=float, default=DEFAULT_MAX_DF, help='max_df do TF-IDF')
+    parser.add_argument('--hashing', default='',
+                        help='Colunas do HashingFeaturizer a comparar também (ex.: 4096,16384)')
+    parser.add_argument('--n-init', type=int, default=DEFAULT_N_INIT, help='Inicializações do KMeans')
+    parser.add_argument('--jobs', type=int, default=os.cpu_count() or 1, help='Processos do pool')
+    parser.add_argument('--output-dir', default='models', help='Diretório dos modelos publicados')
+    parser.add_argument('--dataset-output', help='CSV publicado com os novos clusters (padrão: --dataset)')
+    parser.add_argument('--cache-dir', default=TRAIN_CACHE_DIR, help='Cache das matrizes TF-IDF')
+    parser.add_argument('--publish', action='store_true',
+                        help='Publica os vencedores (sem isso, só compara)')
+    args = parser.parse_args()
+
+    import pandas as pd
+
+    sys.path.append(str(Path(__file__).parent))
+    from ml_model_trained import DATASET_FILES
+
+    dataset_path = args.dataset or next((path for path in DATASET_FILES if os.path.exists(path)), None)
+    if dataset_path is None:
+        print("❌ Nenhum dataset encontrado")
+        sys.exit(1)
+
+    df = pd.read_csv(dataset_path, sep=';')
+    print(f"📚 {len(df)} filmes de {dataset_path}")
+
+    configs = vectorizer_configs(_parse_list(args.max_features, int),
+                                 _parse_list(args.ngrams, _parse_ngram), args.max_df)
+    configs += hashing_configs(_parse_list(args.hashing, int), _parse_list(args.ngrams, _parse_ngram),
+                               args.max_df)
+    # Sem --k, o número de clusters publicado (do qual o frontend depende)
+    # não muda: os demais k só aparecem no relatório
+    if args.k:
+        k_values, fixed_k = _parse_list(args.k, int), {}
+    else:
+        fixed_k = current_k(args.output_dir)
+        if not args.hashing:
+            fixed_k.pop('hashing', None)
+        k_values = sorted(set(DEFAULT_K_VALUES) | set(fixed_k.values()))
+        for feature_set, k in fixed_k.items():
+            print(f"📌 {feature_set}: mantendo k={k} dos modelos publicados (use --k para alterar)")
+
+    results, winners, scaler, le_genre = train(
+        df, file_fingerprint([dataset_path]), k_values, configs,
+        args.jobs, args.n_init, args.cache_dir, fixed_k
+    )
+    print_report(results, winners)
+
+    if not args.publish:
+        print("ℹ️ Nada publicado (use --publish para publicar os vencedores)")
+        return
+    if winners['tfidf'] is None or winners['all_features'] is None:
+        print("❌ Nenhuma combinação válida para publicar")
+        sys.exit(1)
+
+    report = {
+        'dataset_path': dataset_path,
+        'n_movies': len(df),
+        'created': time.time(),
+        'runs': report_rows(results, winners)
+    }
+    dataset_output = args.dataset_output or dataset_path
+    published, had_derived = publish(winners, scaler, le_genre, df, dataset_output, args.output_dir, report)
+    for path in published:
+        print(f"💾 {path}")
+    print(f"✅ Modelos publicados em {args.output_dir}")
+
+    from ml_model_trained import MODEL_FILES
+    if not had_derived:
+        return
+    if os.path.realpath(args.output_dir) != os.path.realpath(os.path.dirname(MODEL_FILES['vectorizer'])):
+        print(f"⚠️ {', '.join(had_derived)} não reconstruídos: {args.output_dir} não é o diretório "
+              f"dos modelos da inferência")
+        return
+    from ann_index import ANN_INDEX_DIR
+    from compact_model import COMPACT_MODEL_PATH
+    for path in rebuild_derived(dataset_output, os.path.basename(ANN_INDEX_DIR) in had_derived,
+                                os.path.basename(COMPACT_MODEL_PATH) in had_derived):
+        print(f"🔁 {path} reconstruído")
+
+if __name__ == "__main__":
+    main()